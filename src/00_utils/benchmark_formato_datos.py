@@ -0,0 +1,113 @@
+import pandas as pd
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add src to path to import config_paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_dir)
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from config_paths import RAW_DIR, PROCESSED_DIR, TELEMETRIA_DIR
+from capa_datos import cargar_tabla, guardar_tabla, ruta_existente, PARQUET_DISPONIBLE, COMPRESION_PARQUET
+
+# Tablas de las capas RAW y PROCESSED que se comparan
+TABLAS = [
+    (RAW_DIR, "metadata_tablas"),
+    (RAW_DIR, "dependencias_sql"),
+    (RAW_DIR, "codigo_fuente"),
+    (PROCESSED_DIR, "relaciones_finales"),
+    (PROCESSED_DIR, "maestro_sp"),
+    (PROCESSED_DIR, "maestro_tablas"),
+    (PROCESSED_DIR, "dependencias_normalizadas"),
+]
+
+def medir_lectura(funcion, repeticiones):
+    """Mejor tiempo (s) de varias lecturas, para descontar ruido de disco/caché"""
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor
+
+def comparar_formatos(repeticiones=3):
+    """Escribe cada tabla en CSV y en Parquet y compara tamaño en disco y tiempo de carga"""
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for directorio, nombre in TABLAS:
+            if ruta_existente(directorio, nombre) is None:
+                continue
+            df = cargar_tabla(directorio, nombre)
+
+            ruta_csv = os.path.join(tmp, nombre + ".csv")
+            ruta_parquet = os.path.join(tmp, nombre + ".parquet")
+            df.to_csv(ruta_csv, index=False)
+            df.to_parquet(ruta_parquet, index=False, compression=COMPRESION_PARQUET)
+
+            seg_csv = medir_lectura(lambda: pd.read_csv(ruta_csv), repeticiones)
+            seg_parquet = medir_lectura(lambda: pd.read_parquet(ruta_parquet), repeticiones)
+            mb_csv = os.path.getsize(ruta_csv) / 1024 ** 2
+            mb_parquet = os.path.getsize(ruta_parquet) / 1024 ** 2
+
+            resultados.append({
+                "tabla": nombre,
+                "filas": len(df),
+                "mb_csv": round(mb_csv, 3),
+                "mb_parquet": round(mb_parquet, 3),
+                "reduccion_tamano": round(mb_csv / mb_parquet, 2) if mb_parquet else None,
+                "seg_carga_csv": round(seg_csv, 4),
+                "seg_carga_parquet": round(seg_parquet, 4),
+                "aceleracion_carga": round(seg_csv / seg_parquet, 2) if seg_parquet else None
+            })
+    return pd.DataFrame(resultados)
+
+def convertir_a_parquet():
+    """Migra las tablas CSV existentes a Parquet (el CSV se elimina al guardar)"""
+    for directorio, nombre in TABLAS:
+        ruta = ruta_existente(directorio, nombre)
+        if ruta and ruta.endswith(".csv"):
+            df = pd.read_csv(ruta)
+            print(f"   🔁 {nombre}: {os.path.basename(ruta)} -> {os.path.basename(guardar_tabla(df, directorio, nombre))}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara CSV vs Parquet en las capas RAW/PROCESSED")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Lecturas por formato (se toma la mejor)")
+    parser.add_argument("--convertir", action="store_true",
+                        help="Además migra a Parquet las tablas que sigan en CSV")
+    args = parser.parse_args()
+
+    if not PARQUET_DISPONIBLE:
+        print("❌ 'pyarrow' no está instalado. Instálalo con: pip install pyarrow")
+        return
+
+    print("📏 BENCHMARK DE FORMATO: CSV vs Parquet")
+    print("=" * 50)
+    df = comparar_formatos(args.repeticiones)
+    if df.empty:
+        print("⚠️ No se encontraron tablas en las capas RAW/PROCESSED.")
+        return
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(df.to_string(index=False))
+
+    total_csv, total_parquet = df['mb_csv'].sum(), df['mb_parquet'].sum()
+    print(f"\n💾 Total en disco: {total_csv:.2f} MB (CSV) vs {total_parquet:.2f} MB (Parquet)")
+    print(f"⏱️  Carga total: {df['seg_carga_csv'].sum():.3f} s (CSV) vs {df['seg_carga_parquet'].sum():.3f} s (Parquet)")
+
+    archivo = os.path.join(TELEMETRIA_DIR, "benchmark_formato_datos.csv")
+    df.to_csv(archivo, index=False)
+    print(f"📝 Resultados guardados en: {archivo}")
+
+    if args.convertir:
+        print("\n🔁 Migrando tablas CSV a Parquet...")
+        convertir_a_parquet()
+        print("💡 El código de un codigo_fuente.csv antiguo viene sin saltos de línea; "
+              "re-ejecuta la ingesta para tenerlo byte a byte.")
+
+if __name__ == "__main__":
+    main()
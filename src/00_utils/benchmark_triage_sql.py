@@ -0,0 +1,159 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+# Add src to path to import config_paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_dir)
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from config_paths import RAW_DIR, TELEMETRIA_DIR
+from capa_datos import existe_tabla_raw
+from almacen_codigo import cargar_indice_codigo
+from analisis_sql import dividir_sentencias, referencias_de_sentencia, triar_sentencia
+
+# ==============================================
+# BENCHMARK: TRIAJE POR TOKENS vs PARSER EN TODAS LAS SENTENCIAS
+# ==============================================
+# Sobre las mismas sentencias ya tokenizadas, mide sentencias/s de mandar todo a
+# sqlglot contra triar primero (omitir las que no tocan tablas y resolver los
+# INSERT ... SELECT simples de los tokens). La tokenización es común a los dos y
+# no entra en la medición. También verifica que las referencias sean las mismas.
+
+# Los avisos de sqlglot al caer a Command (PRINT, EXEC...) ensucian la salida
+logging.getLogger("sqlglot").setLevel(logging.ERROR)
+
+CONTROL = [
+    "DECLARE @v{i} INT = {i}",
+    "SET @v{i} = @v{i} + 1",
+    "PRINT 'paso {i}'",
+    "IF @v{i} > 10 RAISERROR('limite', 16, 1)",
+    "SET NOCOUNT ON",
+    "BEGIN TRAN",
+    "COMMIT",
+    "SET @fecha = DATEADD(DAY, -{i}, GETDATE())",
+]
+
+def generar_procedimiento(nombre, sentencias, fraccion_control, semilla):
+    """SP con sentencias de control (DECLARE, SET, PRINT...) y DML con y sin la forma simple"""
+    rnd = random.Random(semilla)
+    lineas = [f"CREATE PROCEDURE dbo.{nombre}", "AS", "BEGIN", "    SET NOCOUNT ON;"]
+    for i in range(sentencias):
+        if rnd.random() < fraccion_control:
+            lineas.append("    " + rnd.choice(CONTROL).format(i=i) + ";")
+            continue
+        destino = f"od_destino_{rnd.randint(1, 200):05d}"
+        fuente = f"od_fuente_{rnd.randint(1, 500):05d}"
+        otra = f"od_fuente_{rnd.randint(1, 500):05d}"
+        tipo = i % 4
+        if tipo == 0:
+            lineas.append(f"    INSERT INTO {destino} (id, valor) SELECT a.id, ISNULL(b.valor, 0)\n"
+                          f"    FROM {fuente} a LEFT JOIN {otra} b ON a.id = b.id WHERE a.fecha >= @fecha;")
+        elif tipo == 1:
+            lineas.append(f"    INSERT INTO {destino} SELECT * FROM {fuente} WHERE id > {i};")
+        elif tipo == 2:
+            lineas.append(f"    UPDATE d SET valor = f.valor FROM {destino} d JOIN {fuente} f ON d.id = f.id;")
+        else:
+            lineas.append(f"    INSERT INTO {destino} (id) SELECT id FROM {fuente}\n"
+                          f"    WHERE id IN (SELECT id FROM {otra} WHERE valor > {i});")
+    lineas.append("END")
+    return "\n".join(lineas)
+
+def codigos_sinteticos(procedimientos, sentencias, fraccion_control):
+    return [(f"sp_bench_{i:03d}", generar_procedimiento(f"sp_bench_{i:03d}", sentencias, fraccion_control, i))
+            for i in range(procedimientos)]
+
+def codigos_raw(maximo):
+    """Hasta `maximo` objetos de código de la capa RAW (leídos del almacén)"""
+    df_code, almacen = cargar_indice_codigo(RAW_DIR)
+    hashes = df_code["Hash_Definicion"].dropna().drop_duplicates().head(maximo)
+    return [(h[:12], almacen.obtener(h)) for h in hashes if almacen.obtener(h)]
+
+def _parsear(tokens, codigo):
+    try:
+        return referencias_de_sentencia(tokens, codigo)
+    except Exception:
+        return []
+
+def comparar(codigos):
+    resultados = []
+    for nombre, codigo in codigos:
+        try:
+            sentencias = dividir_sentencias(codigo)
+        except Exception as e:
+            print(f"   ⚠️ {nombre}: no se pudo tokenizar ({e})")
+            continue
+
+        inicio = time.perf_counter()
+        refs_parser = [_parsear(tokens, codigo) for tokens, _ in sentencias]
+        seg_parser = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        vias, refs_triaje = [], []
+        for tokens, _ in sentencias:
+            via, referencias = triar_sentencia(tokens)
+            vias.append(via)
+            refs_triaje.append(_parsear(tokens, codigo) if via == "completa" else referencias)
+        seg_triaje = time.perf_counter() - inicio
+
+        resultados.append({
+            "objeto": nombre,
+            "sentencias": len(sentencias),
+            "omitidas": vias.count("omitida"),
+            "rapidas": vias.count("rapida"),
+            "al_parser": vias.count("completa"),
+            "seg_parser": round(seg_parser, 4),
+            "seg_triaje": round(seg_triaje, 4),
+            "diferencias": sum(1 for a, b in zip(refs_parser, refs_triaje) if a != b)
+        })
+    return pd.DataFrame(resultados)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara parsear todas las sentencias contra triar primero")
+    parser.add_argument("--raw", action="store_true",
+                        help="Usa el código de la capa RAW en vez de SPs sintéticos")
+    parser.add_argument("--procedimientos", type=int, default=20, help="SPs sintéticos (u objetos de RAW)")
+    parser.add_argument("--sentencias", type=int, default=200, help="Sentencias por SP sintético")
+    parser.add_argument("--fraccion-control", type=float, default=0.5,
+                        help="Fracción de sentencias de control (DECLARE, SET, PRINT...) en los sintéticos")
+    args = parser.parse_args()
+
+    if args.raw:
+        if not existe_tabla_raw(RAW_DIR, "codigo_fuente"):
+            print(f"❌ No hay codigo_fuente en {RAW_DIR}. Ejecuta la ingesta primero.")
+            return
+        codigos = codigos_raw(args.procedimientos)
+        origen = f"{len(codigos)} objetos de RAW"
+    else:
+        codigos = codigos_sinteticos(args.procedimientos, args.sentencias, args.fraccion_control)
+        origen = (f"{args.procedimientos} SPs sintéticos de {args.sentencias} sentencias "
+                  f"({args.fraccion_control:.0%} de control)")
+
+    print("🚦 BENCHMARK DE TRIAJE: parser en todo vs triaje por tokens")
+    print(f"📋 Código: {origen}")
+    print("=" * 50)
+    df = comparar(codigos)
+    if df.empty:
+        print("⚠️ No hubo código que medir.")
+        return
+
+    sentencias = df["sentencias"].sum()
+    seg_parser, seg_triaje = df["seg_parser"].sum(), df["seg_triaje"].sum()
+    print(f"⏱️  Parser en todo: {sentencias / seg_parser:,.0f} sentencias/s | "
+          f"con triaje: {sentencias / seg_triaje:,.0f} sentencias/s | x{seg_parser / seg_triaje:.2f}")
+    print(f"🚦 Omitidas: {df['omitidas'].sum() / sentencias:.1%} | camino rápido: {df['rapidas'].sum() / sentencias:.1%}"
+          f" | al parser: {df['al_parser'].sum() / sentencias:.1%}")
+    print(f"🔎 Sentencias con referencias distintas: {df['diferencias'].sum()}")
+
+    archivo = os.path.join(TELEMETRIA_DIR, "benchmark_triage_sql.csv")
+    df.to_csv(archivo, index=False)
+    print(f"📝 Resultados guardados en: {archivo}")
+
+if __name__ == "__main__":
+    main()
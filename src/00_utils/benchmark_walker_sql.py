@@ -0,0 +1,183 @@
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+
+# Add src to path to import config_paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_dir)
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from config_paths import RAW_DIR, TELEMETRIA_DIR
+from capa_datos import existe_tabla_raw
+from almacen_codigo import cargar_indice_codigo
+from analisis_sql import recorrer_sentencia
+
+# ==============================================
+# BENCHMARK: RECORRIDO DEL AST (anterior vs. una pasada)
+# ==============================================
+# Compara, sobre los mismos árboles ya parseados, el recorrido anterior (por cada
+# tabla sube por .parent hasta la raíz, una vez buscando escritura y otra lectura)
+# con recorrer_sentencia (una pasada con contexto). El parseo se mide aparte y no
+# entra en la comparación. También cuenta las referencias que cambian de relación
+# (p. ej. las fuentes de un INSERT ... SELECT, que antes salían como ESCRIBE).
+
+def referencias_ascendentes(expression):
+    """El recorrido anterior de analizar_codigo_sp, tal cual, para comparar"""
+    referencias = []
+    for table in expression.find_all(exp.Table):
+        padre = table.parent
+        relacion = ""
+        while padre:
+            if isinstance(padre, (exp.Insert, exp.Update, exp.Create)):
+                relacion = "ESCRIBE"
+                break
+            padre = padre.parent
+        if not relacion:
+            padre = table.parent
+            while padre:
+                if isinstance(padre, (exp.Select, exp.Join)):
+                    relacion = "LEE"
+                    break
+                padre = padre.parent
+        referencias.append((table.catalog, table.db, table.name, relacion))
+    return referencias
+
+def _subconsulta(rnd, profundidad, columna):
+    """IN (SELECT ... FROM (SELECT ... FROM ...) x) anidado `profundidad` niveles"""
+    consulta = f"SELECT {columna} FROM od_fuente_{rnd.randint(1, 500):05d}"
+    for nivel in range(profundidad):
+        consulta = f"SELECT {columna} FROM ({consulta}) n{nivel} WHERE {columna} > {nivel}"
+    return consulta
+
+def generar_procedimiento(nombre, sentencias, profundidad, semilla):
+    """SP grande con INSERT...SELECT con JOIN y subconsultas anidadas, UPDATE...FROM y CTEs"""
+    rnd = random.Random(semilla)
+    lineas = [f"CREATE PROCEDURE dbo.{nombre}", "AS", "BEGIN", "    SET NOCOUNT ON;"]
+    for i in range(sentencias):
+        destino = f"od_destino_{rnd.randint(1, 200):05d}"
+        fuente = f"od_fuente_{rnd.randint(1, 500):05d}"
+        otra = f"od_fuente_{rnd.randint(1, 500):05d}"
+        tipo = i % 3
+        if tipo == 0:
+            lineas.append(f"    INSERT INTO {destino} (id, valor)\n"
+                          f"    SELECT a.id, b.valor FROM {fuente} a JOIN {otra} b ON a.id = b.id\n"
+                          f"    WHERE a.id IN ({_subconsulta(rnd, profundidad, 'id')});")
+        elif tipo == 1:
+            lineas.append(f"    UPDATE d SET valor = f.valor FROM {destino} d JOIN {fuente} f ON d.id = f.id\n"
+                          f"    WHERE f.id IN ({_subconsulta(rnd, profundidad, 'id')});")
+        else:
+            lineas.append(f"    WITH base_{i} AS (SELECT id, valor FROM {fuente} WHERE id IN "
+                          f"({_subconsulta(rnd, profundidad, 'id')}))\n"
+                          f"    INSERT INTO {destino} (id, valor) SELECT id, valor FROM base_{i};")
+    lineas.append("END")
+    return "\n".join(lineas)
+
+def codigos_sinteticos(procedimientos, sentencias, profundidad):
+    return [(f"sp_bench_{i:03d}", generar_procedimiento(f"sp_bench_{i:03d}", sentencias, profundidad, i))
+            for i in range(procedimientos)]
+
+def codigos_raw(maximo):
+    """Los `maximo` objetos de código más grandes de la capa RAW (leídos del almacén)"""
+    df_code, almacen = cargar_indice_codigo(RAW_DIR)
+    df_code = df_code.dropna(subset=["Hash_Definicion"])
+    df_code["Caracteres"] = df_code["Hash_Definicion"].map(lambda h: almacen.caracteres(h) or 0)
+    df_code = df_code.nlargest(maximo, "Caracteres")
+    return [(n, almacen.obtener(h)) for n, h in zip(df_code["Nombre_Objeto"], df_code["Hash_Definicion"])]
+
+def medir(funcion, arboles, repeticiones):
+    """Mejor tiempo (s) de recorrer todos los árboles, y las referencias del último"""
+    mejor, referencias = None, []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        referencias = [r for arbol in arboles for r in funcion(arbol)]
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, referencias
+
+def comparar_recorridos(codigos, repeticiones=3):
+    resultados = []
+    for nombre, codigo in codigos:
+        inicio = time.perf_counter()
+        try:
+            arboles = [a for a in sqlglot.parse(codigo, read="tsql") if a is not None]
+        except Exception as e:
+            print(f"   ⚠️ {nombre}: no se pudo parsear ({e})")
+            continue
+        seg_parseo = time.perf_counter() - inicio
+        nodos = sum(1 for arbol in arboles for _ in arbol.walk())
+
+        seg_anterior, refs_anterior = medir(referencias_ascendentes, arboles, repeticiones)
+        seg_nuevo, refs_nuevo = medir(recorrer_sentencia, arboles, repeticiones)
+        solo_anterior = Counter(refs_anterior) - Counter(refs_nuevo)
+        solo_nuevo = Counter(refs_nuevo) - Counter(refs_anterior)
+
+        resultados.append({
+            "objeto": nombre,
+            "kb_codigo": round(len(codigo) / 1024, 1),
+            "nodos_ast": nodos,
+            "tablas": len(refs_anterior),
+            "seg_parseo": round(seg_parseo, 4),
+            "seg_anterior": round(seg_anterior, 5),
+            "seg_una_pasada": round(seg_nuevo, 5),
+            "aceleracion": round(seg_anterior / seg_nuevo, 2) if seg_nuevo else None,
+            "reclasificadas": sum(solo_anterior.values()),
+            "escribe_a_lee": sum(n for (_, _, _, r), n in solo_anterior.items() if r == "ESCRIBE"),
+            "ctes_omitidas": len(refs_anterior) - len(refs_nuevo)
+        })
+    return pd.DataFrame(resultados)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el recorrido del AST anterior con el de una pasada")
+    parser.add_argument("--raw", action="store_true",
+                        help="Usa los objetos más grandes de la capa RAW en vez de SPs sintéticos")
+    parser.add_argument("--procedimientos", type=int, default=5, help="SPs sintéticos (o de RAW) a medir")
+    parser.add_argument("--sentencias", type=int, default=300, help="Sentencias por SP sintético")
+    parser.add_argument("--profundidad", type=int, default=6, help="Niveles de subconsulta anidada")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Recorridos por método (se toma el mejor)")
+    args = parser.parse_args()
+
+    if args.raw:
+        if not existe_tabla_raw(RAW_DIR, "codigo_fuente"):
+            print(f"❌ No hay codigo_fuente en {RAW_DIR}. Ejecuta la ingesta primero.")
+            return
+        codigos = codigos_raw(args.procedimientos)
+        origen = f"los {len(codigos)} objetos más grandes de RAW"
+    else:
+        codigos = codigos_sinteticos(args.procedimientos, args.sentencias, args.profundidad)
+        origen = (f"{args.procedimientos} SPs sintéticos de {args.sentencias} sentencias "
+                  f"(subconsultas de {args.profundidad} niveles)")
+
+    print("🌳 BENCHMARK DE RECORRIDO DEL AST: anterior vs una pasada")
+    print(f"📋 Código: {origen}")
+    print("=" * 50)
+    df = comparar_recorridos(codigos, args.repeticiones)
+    if df.empty:
+        print("⚠️ No hubo código que medir.")
+        return
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(df.to_string(index=False))
+
+    total_anterior, total_nuevo = df['seg_anterior'].sum(), df['seg_una_pasada'].sum()
+    tablas = df['tablas'].sum()
+    print(f"\n⏱️  Recorrido: {total_anterior:.3f} s (anterior) vs {total_nuevo:.3f} s (una pasada)"
+          f" | x{total_anterior / total_nuevo:.2f}" if total_nuevo else "")
+    print(f"📏 Tablas/s: {tablas / total_anterior:,.0f} (anterior) vs {tablas / total_nuevo:,.0f} (una pasada)"
+          f" | parseo: {df['seg_parseo'].sum():.2f} s")
+    print(f"🔀 Referencias reclasificadas: {df['reclasificadas'].sum():,} "
+          f"({df['escribe_a_lee'].sum():,} ESCRIBE -> LEE) | nombres de CTE omitidos: {df['ctes_omitidas'].sum():,}")
+
+    archivo = os.path.join(TELEMETRIA_DIR, "benchmark_walker_sql.csv")
+    df.to_csv(archivo, index=False)
+    print(f"📝 Resultados guardados en: {archivo}")
+
+if __name__ == "__main__":
+    main()
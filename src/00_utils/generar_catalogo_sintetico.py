@@ -0,0 +1,303 @@
+import pandas as pd
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add src to path to import config_paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_dir)
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from config_paths import DATA_DIR, TELEMETRIA_DIR
+from fuentes_catalogo import crear_catalogo_sqlite, TIPOS_SQL
+
+# Catálogo sintético por defecto (fuera de las capas RAW/PROCESSED)
+SINTETICO_DIR = os.path.join(DATA_DIR, "sintetico")
+ARCHIVO_CATALOGO = os.path.join(SINTETICO_DIR, "catalogo_sintetico.db")
+
+DOMINIOS = ["clientes", "ventas", "productos", "cuentas", "pagos", "riesgo", "cobranza", "contabilidad"]
+TAM_LOTE_INSERT = 5000
+
+def _fecha(rnd):
+    return (datetime(2020, 1, 1) + timedelta(days=rnd.randint(0, 1800), seconds=rnd.randint(0, 86399))).isoformat()
+
+def _codigo_sp(rnd, nombre, entradas, salidas, columnas, otros_sps, tam_objetivo):
+    """
+    SP con la variedad que aparece en los catálogos reales: INSERT...SELECT con JOIN,
+    MERGE, TRUNCATE/DELETE antes de cargar, OUTPUT ... INTO, UPDATE, tablas
+    #temporales, EXEC a otros SPs, SQL dinámico y comentarios. Se rellena con
+    sentencias y comentarios hasta acercarse a `tam_objetivo` caracteres.
+    """
+    lineas = [f"CREATE PROCEDURE dbo.{nombre}", "AS", "BEGIN", "    SET NOCOUNT ON;",
+              f"    -- Proceso sintético {nombre}"]
+    principal = entradas[0]
+    cols = columnas[principal][:4] or ["id"]
+    if rnd.random() < 0.3:
+        lineas += [f"    SELECT {', '.join(cols)} INTO #tmp_{nombre} FROM {principal};",
+                   f"    -- staging en #tmp_{nombre}"]
+        principal = f"#tmp_{nombre}"
+    for k, salida in enumerate(salidas):
+        join = ""
+        if len(entradas) > 1:
+            otra = rnd.choice(entradas[1:])
+            join = f"\n    INNER JOIN {otra} b ON a.{cols[0]} = b.{cols[0]}"
+        forma = rnd.random()
+        if forma < 0.15:
+            lineas.append(f"    MERGE {salida} AS t USING {principal} AS a ON t.{cols[0]} = a.{cols[0]}\n"
+                          f"    WHEN MATCHED THEN UPDATE SET t.{cols[-1]} = a.{cols[-1]}\n"
+                          f"    WHEN NOT MATCHED THEN INSERT ({', '.join(cols)}) "
+                          f"VALUES ({', '.join('a.' + c for c in cols)});")
+            continue
+        if forma < 0.25:
+            lineas.append(f"    TRUNCATE TABLE {salida};")
+        elif forma < 0.35:
+            lineas.append(f"    DELETE t FROM {salida} t\n    INNER JOIN {principal} a ON t.{cols[0]} = a.{cols[0]};")
+        elif forma < 0.45 and k + 1 < len(salidas):
+            # La segunda salida recibe el OUTPUT de la primera
+            lineas.append(f"    INSERT INTO {salida} ({', '.join(cols)})\n"
+                          f"    OUTPUT {', '.join('inserted.' + c for c in cols)} INTO {salidas[k + 1]} ({', '.join(cols)})\n"
+                          f"    SELECT {', '.join('a.' + c for c in cols)}\n    FROM {principal} a{join};")
+            break
+        lineas.append(f"    INSERT INTO {salida} ({', '.join(cols)})\n"
+                      f"    SELECT {', '.join('a.' + c for c in cols)}\n    FROM {principal} a{join};")
+    if rnd.random() < 0.4:
+        lineas.append(f"    UPDATE {salidas[0]} SET {cols[-1]} = {cols[-1]} WHERE {cols[0]} IS NOT NULL;")
+    if otros_sps and rnd.random() < 0.2:
+        lineas.append(f"    EXEC dbo.{rnd.choice(otros_sps)};")
+    dinamico = rnd.random()
+    if dinamico < 0.05:
+        # SQL dinámico plegable: la tabla se arma con REPLACE sobre una plantilla
+        lineas += ["    DECLARE @sql NVARCHAR(MAX);",
+                   f"    SET @sql = REPLACE(N'SELECT COUNT(*) FROM {{tabla}}', N'{{tabla}}', N'{entradas[-1]}');",
+                   "    EXEC sp_executesql @sql;"]
+    elif dinamico < 0.08:
+        # SQL dinámico no plegable: el nombre de la tabla llega como parámetro
+        lineas[1:1] = ["    @tabla SYSNAME = NULL"]
+        lineas.append("    EXEC('DELETE FROM ' + @tabla + ' WHERE 1 = 0');")
+
+    relleno = 0
+    while sum(len(l) + 1 for l in lineas) < tam_objetivo:
+        if rnd.random() < 0.5:
+            lineas.append(f"    -- Regla de negocio {relleno}: " + "validación " * rnd.randint(2, 12))
+        else:
+            tabla = rnd.choice(entradas)
+            lineas.append(f"    IF EXISTS (SELECT 1 FROM {tabla} WHERE {columnas[tabla][0]} = {relleno})\n"
+                          f"        PRINT 'control {relleno}';")
+        relleno += 1
+    lineas.append("END")
+    return "\n".join(lineas)
+
+def generar_catalogo(ruta, tablas=200, sps=500, tam_codigo=4000, columnas_por_tabla=8, semilla=42):
+    """
+    Llena un catálogo SQLite (forma sys.*) con `tablas` tablas y `sps` procedimientos
+    (más ~10% de vistas/funciones y ~5% de triggers) reproducibles según la semilla.
+    El tamaño del código de los SPs sigue una distribución sesgada (muchos medianos
+    y pocos enormes) con media cercana a `tam_codigo`.
+    Retorna un resumen con conteos y bytes de código.
+    """
+    rnd = random.Random(semilla)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    conn = crear_catalogo_sqlite(ruta)
+    tipos = {nombre: i for i, nombre in enumerate(TIPOS_SQL, 1)}
+
+    # Tablas: od_ (negocio), XTMP_ (temporales persistentes) y stg_ (staging, fuera del filtro)
+    objetos, columnas_filas, columnas = [], [], {}
+    nombres_tablas, volumenes = [], []
+    for i in range(1, tablas + 1):
+        dominio = DOMINIOS[i % len(DOMINIOS)]
+        prefijo = rnd.choices(["od_", "XTMP_", "stg_"], weights=[70, 15, 15])[0]
+        nombre = f"{prefijo}{dominio}_{i:05d}"
+        objetos.append((i, nombre, 1, "U", "USER_TABLE", _fecha(rnd), _fecha(rnd), 0))
+        cols = [f"{dominio}_id"] + [f"campo_{c:02d}" for c in range(1, rnd.randint(2, columnas_por_tabla))]
+        columnas[nombre] = cols
+        for c, col in enumerate(cols, 1):
+            tipo = "int" if c == 1 else rnd.choice(TIPOS_SQL)
+            columnas_filas.append((i, c, col, tipos[tipo], 4 if tipo == "int" else rnd.choice([8, 50, 100, 255]),
+                                   int(c > 1 and rnd.random() < 0.5)))
+        nombres_tablas.append((i, nombre))
+        # Volumen muy sesgado: pocas tablas enormes; las XTMP_ se vacían y llenan, son chicas
+        filas = int(rnd.lognormvariate(9, 2.5) / (20 if prefijo == "XTMP_" else 1))
+        paginas = -(-filas * 40 * len(cols) // 8060) + 1
+        volumenes.append((i, 1, 1, filas, paginas + paginas // 10, paginas))
+
+    modulos, dependencias, dependencias_columnas, ejecuciones = [], [], [], []
+    bytes_codigo = 0
+    id_por_nombre = {nombre: i for i, nombre in nombres_tablas}
+
+    def agregar_modulo(object_id, nombre, tipo, tipo_desc, codigo, referencias, padre=0):
+        nonlocal bytes_codigo
+        bytes_codigo += len(codigo.encode("utf-16-le"))
+        objetos.append((object_id, nombre, 1, tipo, tipo_desc, _fecha(rnd), _fecha(rnd), padre))
+        modulos.append((object_id, codigo))
+        for ref_id, ref in referencias:
+            dependencias.append((object_id, ref_id, 0, None, None, ref))
+
+    def agregar_columnas(object_id, tabla, cantidad, leida, escrita):
+        # Referencias por columna (sys.sql_dependencies): solo tablas, con su column_id real
+        if tabla not in id_por_nombre:
+            return
+        for c in range(1, min(cantidad, len(columnas[tabla])) + 1):
+            dependencias_columnas.append((object_id, id_por_nombre[tabla], c, int(leida), int(escrita), 0))
+
+    # Vistas y funciones inline: leen 1-2 tablas y los SPs pueden leerlas a su vez
+    objetos_lectura = []
+    for k in range(1, max(1, sps // 10) + 1):
+        base = rnd.sample(nombres_tablas, min(len(nombres_tablas), rnd.randint(1, 2)))
+        cols = columnas[base[0][1]][:3]
+        join = f" JOIN {base[1][1]} b ON a.{cols[0]} = b.{cols[0]}" if len(base) > 1 else ""
+        if k % 3:
+            nombre, object_id = f"vw_{DOMINIOS[k % len(DOMINIOS)]}_{k:05d}", 200000 + k
+            codigo = (f"CREATE VIEW dbo.{nombre} AS\nSELECT {', '.join('a.' + c for c in cols)}\n"
+                      f"FROM {base[0][1]} a{join}")
+            agregar_modulo(object_id, nombre, "V", "VIEW", codigo, base)
+        else:
+            nombre, object_id = f"fn_{DOMINIOS[k % len(DOMINIOS)]}_{k:05d}", 300000 + k
+            codigo = (f"CREATE FUNCTION dbo.{nombre} (@desde INT)\nRETURNS TABLE AS RETURN (\n"
+                      f"    SELECT {', '.join('a.' + c for c in cols)} FROM {base[0][1]} a{join}\n"
+                      f"    WHERE a.{cols[0]} >= @desde)")
+            agregar_modulo(object_id, nombre, "IF", "SQL_INLINE_TABLE_VALUED_FUNCTION", codigo, base)
+        agregar_columnas(object_id, base[0][1], len(cols), leida=True, escrita=False)
+        objetos_lectura.append((object_id, nombre))
+        columnas[nombre] = cols
+
+    # Triggers de auditoría sobre tablas od_: copian la fila a una tabla XTMP_
+    tablas_od = [t for t in nombres_tablas if t[1].startswith("od_")]
+    tablas_xtmp = [t for t in nombres_tablas if t[1].startswith("XTMP_")]
+    for k in range(1, (max(0, sps // 20) if tablas_od and tablas_xtmp else 0) + 1):
+        padre, log = rnd.choice(tablas_od), rnd.choice(tablas_xtmp)
+        nombre = f"tr_{padre[1]}_{k:05d}"
+        cols = columnas[padre[1]][:1]
+        codigo = (f"CREATE TRIGGER dbo.{nombre} ON dbo.{padre[1]} AFTER INSERT, UPDATE AS\nBEGIN\n"
+                  f"    INSERT INTO {log[1]} ({cols[0]}) SELECT {cols[0]} FROM inserted;\nEND")
+        agregar_modulo(400000 + k, nombre, "TR", "SQL_TRIGGER", codigo, [log], padre=padre[0])
+        agregar_columnas(400000 + k, log[1], 1, leida=False, escrita=True)
+
+    # Procedimientos con su código y dependencias coherentes con él
+    nombres_sps = [f"sp_{DOMINIOS[j % len(DOMINIOS)]}_{j:05d}" for j in range(1, sps + 1)]
+    for j, nombre in enumerate(nombres_sps, 1):
+        referencias = rnd.sample(nombres_tablas, min(len(nombres_tablas), rnd.randint(2, 5)))
+        salidas = [n for _, n in referencias[:rnd.randint(1, 2)]]
+        entradas = [n for _, n in referencias[len(salidas):]] or salidas
+        if objetos_lectura and rnd.random() < 0.2:
+            lectura = rnd.choice(objetos_lectura)
+            entradas.append(lectura[1])
+            referencias.append(lectura)
+        tam_objetivo = int(min(rnd.lognormvariate(0, 0.9), 40) * tam_codigo / 1.5)
+        codigo = _codigo_sp(rnd, nombre, entradas, salidas, columnas, nombres_sps[:j - 1], tam_objetivo)
+        agregar_modulo(100000 + j, nombre, "P", "SQL_STORED_PROCEDURE", codigo, referencias)
+        if rnd.random() < 0.8:
+            # Caché de planes: ~80% de los SPs corrieron desde el último reinicio
+            veces = rnd.randint(1, 400)
+            micros = int(rnd.lognormvariate(12, 2) * veces)
+            ejecuciones.append((1, 100000 + j, _fecha(rnd), _fecha(rnd), veces, micros,
+                                int(micros / 50 * rnd.uniform(0.5, 2))))
+        if rnd.random() < 0.5:
+            # sys.sql_dependencies (obsoleta) no registra todo: muchos SPs quedan sin dirección del catálogo
+            continue
+        for entrada in entradas:
+            agregar_columnas(100000 + j, entrada, 4, leida=True, escrita=False)
+        for salida in salidas:
+            agregar_columnas(100000 + j, salida, 4, leida=salida in entradas, escrita=True)
+
+    def insertar(sql, filas):
+        for i in range(0, len(filas), TAM_LOTE_INSERT):
+            conn.executemany(sql, filas[i:i + TAM_LOTE_INSERT])
+
+    insertar("INSERT INTO objects VALUES (?, ?, ?, ?, ?, ?, ?, ?)", objetos)
+    insertar("INSERT INTO columns VALUES (?, ?, ?, ?, ?, ?)", columnas_filas)
+    insertar("INSERT INTO sql_modules VALUES (?, ?)", modulos)
+    insertar("INSERT INTO sql_expression_dependencies VALUES (?, ?, ?, ?, ?, ?)", dependencias)
+    insertar("INSERT INTO sql_dependencies VALUES (?, ?, ?, ?, ?, ?)", dependencias_columnas)
+    insertar("INSERT INTO dm_db_partition_stats VALUES (?, ?, ?, ?, ?, ?)", volumenes)
+    insertar("INSERT INTO dm_exec_procedure_stats VALUES (?, ?, ?, ?, ?, ?, ?)", ejecuciones)
+    conn.commit()
+    conn.close()
+
+    return {
+        "tablas": tablas,
+        "sps": sps,
+        "columnas": len(columnas_filas),
+        "dependencias": len(dependencias),
+        "dependencias_columnas": len(dependencias_columnas),
+        "mb_codigo": round(bytes_codigo / 1024 ** 2, 2),
+        "mb_archivo": round(os.path.getsize(ruta) / 1024 ** 2, 2)
+    }
+
+def cargar_ingesta():
+    """Importa 01_ingestion_sql.py como módulo (el nombre empieza con dígitos)"""
+    ruta = os.path.join(src_dir, "01_ingestion", "01_ingestion_sql.py")
+    spec = importlib.util.spec_from_file_location("ingesta_sql", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def benchmark_ingesta(ruta, configuraciones, tam_lote):
+    """
+    Corre la extracción completa de 01_ingestion_sql.py contra el catálogo SQLite
+    (a una carpeta temporal, sin tocar la capa RAW) con cada configuración
+    (workers, particiones de código) y junta tiempos, filas/s y memoria.
+    """
+    os.environ["LINAJE_FUENTE"] = f"sqlite:{ruta}"
+    ingesta = cargar_ingesta()
+    resultados = []
+    for workers, particiones in configuraciones:
+        with tempfile.TemporaryDirectory() as salida:
+            destino = ingesta.Destino(None, "sintetico", "sintetico", salida)
+            inicio = time.perf_counter()
+            ingesta.run_extraction(tam_lote=tam_lote, workers=workers, codigo_completo=True,
+                                   destino=destino, particiones_codigo=particiones)
+            segundos = time.perf_counter() - inicio
+            with open(destino.archivo_telemetria, 'r', encoding='utf-8') as f:
+                telemetria = json.load(f)
+        codigo = telemetria["consultas"].get("codigo", {})
+        resultados.append({
+            "workers": workers,
+            "particiones_codigo": particiones,
+            "segundos": round(segundos, 3),
+            "filas_codigo": codigo.get("filas"),
+            "filas_por_segundo_codigo": codigo.get("filas_por_segundo"),
+            "pico_memoria_proceso_mb": telemetria.get("pico_memoria_proceso_mb")
+        })
+    return pd.DataFrame(resultados)
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un catálogo SQLite sintético con forma sys.* para la ingesta offline")
+    parser.add_argument("--salida", default=ARCHIVO_CATALOGO, help=f"Archivo .db (defecto: {ARCHIVO_CATALOGO})")
+    parser.add_argument("--tablas", type=int, default=200)
+    parser.add_argument("--sps", type=int, default=500)
+    parser.add_argument("--tam-codigo", type=int, default=4000, help="Caracteres promedio por SP")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Además corre la ingesta completa contra el catálogo con varias configuraciones")
+    parser.add_argument("--tam-lote", type=int, default=2000, help="Filas por lote en el benchmark")
+    args = parser.parse_args()
+
+    print(f"🧪 Generando catálogo sintético: {args.tablas} tablas, {args.sps} SPs (~{args.tam_codigo} caracteres c/u)")
+    inicio = time.perf_counter()
+    resumen = generar_catalogo(args.salida, args.tablas, args.sps, args.tam_codigo, semilla=args.semilla)
+    print(f"   ✅ {args.salida} ({time.perf_counter() - inicio:.1f} s)")
+    print(f"   📊 {resumen['columnas']} columnas | {resumen['dependencias']} dependencias"
+          f" ({resumen['dependencias_columnas']} por columna)"
+          f" | {resumen['mb_codigo']} MB de código | {resumen['mb_archivo']} MB en disco")
+    print(f"💡 Ingesta offline: python src/01_ingestion/01_ingestion_sql.py --fuente sqlite:{args.salida}")
+
+    if args.benchmark:
+        print("\n🏁 BENCHMARK DE INGESTA OFFLINE")
+        print("=" * 50)
+        configuraciones = [(1, 0), (3, 0), (3, 4)]
+        df = benchmark_ingesta(args.salida, configuraciones, args.tam_lote)
+        print("\n" + df.to_string(index=False))
+        archivo = os.path.join(TELEMETRIA_DIR, "benchmark_ingesta_offline.csv")
+        df.to_csv(archivo, index=False)
+        print(f"📝 Resultados guardados en: {archivo}")
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ src_dir = os.path.dirname(current_dir)
 if src_dir not in sys.path:
     sys.path.append(src_dir)
 
-from config_paths import PROCESSED_DIR, KNOWLEDGE_DIR, ensure_directories
+from config_paths import RAW_DIR, PROCESSED_DIR, KNOWLEDGE_DIR, ensure_directories
+from almacen_codigo import AlmacenCodigo, codigo_de_entrada
 
 def mock_ai_processing():
     ensure_directories()
@@ -29,9 +30,10 @@ def mock_ai_processing():
     
     print(f"📋 Procesando {len(maestro_sp)} SPs...")
     
+    almacen = AlmacenCodigo(RAW_DIR)
     for sp in maestro_sp:
         nombre_sp = sp['nombre_sp']
-        codigo = sp['codigo_sql'].upper()
+        codigo = codigo_de_entrada(sp, almacen).upper()
         
         # Heurística simple para simular IA
         inputs = []
@@ -0,0 +1,99 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+
+# Add src to path to import config_paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_dir)
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from config_paths import RAW_DIR
+from capa_datos import cargar_tabla, guardar_tabla, existe_tabla, espacios_raw, mapa_alias_por_base, ruta_existente
+
+# ==============================================
+# SONDA: --incremental SIN CAMBIOS DE CÓDIGO, CON VOLUMEN NUEVO
+# ==============================================
+# La ingesta vuelve a bajar volumen_tablas en cada corrida. Sobre una copia de la
+# capa RAW: construye el grafo, cambia solo el volumen (otros números y una tabla
+# que ya no aparece), corre 02_grafo_base --incremental y una construcción
+# completa, y compara relaciones_finales. Sale con código 1 si difieren.
+# No toca data/: todo va a un directorio temporal.
+
+def cargar_grafo_base():
+    ruta = os.path.join(src_dir, "01_ingestion", "02_grafo_base.py")
+    spec = importlib.util.spec_from_file_location("grafo_base", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def apuntar(grafo_base, raw, salida, telemetria):
+    """Redirige las rutas del módulo (se fijan al importarlo)"""
+    grafo_base.INPUT_DIR = raw
+    grafo_base.OUTPUT_DIR = salida
+    grafo_base.TELEMETRIA_DIR = telemetria
+    grafo_base.ESPACIOS = espacios_raw(raw)
+    grafo_base.ALIAS_POR_BASE = mapa_alias_por_base(grafo_base.ESPACIOS) if grafo_base.ESPACIOS else None
+
+def cambiar_volumen(raw, ruta_grafo):
+    """Otros números para todas las tablas y una que desaparece; más nuevo que el grafo"""
+    directorios = [e["directorio"] for e in espacios_raw(raw)] or [raw]
+    for directorio in directorios:
+        if not existe_tabla(directorio, "volumen_tablas"):
+            continue
+        df = cargar_tabla(directorio, "volumen_tablas")
+        df["Filas"] = df["Filas"] * 3 + 7
+        df["Bytes_Reservados"] = df["Bytes_Reservados"] * 2 + 8192
+        guardar_tabla(df.iloc[1:], directorio, "volumen_tablas")
+        ruta = ruta_existente(directorio, "volumen_tablas")
+        instante = os.path.getmtime(ruta_grafo) + 1
+        os.utime(ruta, (instante, instante))
+
+def relaciones(salida):
+    columnas = ["Origen", "Destino", "Relacion"]
+    return cargar_tabla(salida, "relaciones_finales").sort_values(columnas).reset_index(drop=True)
+
+def main():
+    print("🔬 SONDA: --incremental con solo el volumen cambiado")
+    print("=" * 50)
+    if not existe_tabla(RAW_DIR, "codigo_fuente") and not espacios_raw(RAW_DIR):
+        print(f"❌ No hay capa RAW en {RAW_DIR}: corré primero 01_ingestion_sql.py")
+        sys.exit(1)
+    temporal = tempfile.mkdtemp(prefix="sonda_incremental_")
+    try:
+        raw = os.path.join(temporal, "raw")
+        shutil.copytree(RAW_DIR, raw)
+        incremental, completa, telemetria = (os.path.join(temporal, d) for d in ("incremental", "completa", "tel"))
+        for d in (incremental, completa, telemetria):
+            os.makedirs(d)
+        grafo_base = cargar_grafo_base()
+
+        print("🏗️  1. Construcción completa inicial")
+        apuntar(grafo_base, raw, incremental, telemetria)
+        grafo_base.construir_grafo(workers=1, usar_cache=False)
+        cambiar_volumen(raw, os.path.join(incremental, "linaje_completo.graphml"))
+
+        print("\n🔁 2. --incremental tras cambiar solo el volumen")
+        grafo_base.construir_grafo(workers=1, usar_cache=False, incremental=True)
+
+        print("\n🏗️  3. Construcción completa con el volumen nuevo")
+        apuntar(grafo_base, raw, completa, telemetria)
+        grafo_base.construir_grafo(workers=1, usar_cache=False)
+
+        a, b = relaciones(incremental), relaciones(completa)
+        print("=" * 50)
+        if a.equals(b):
+            print(f"🎉 relaciones_finales idénticas ({len(a)} aristas)")
+            sys.exit(0)
+        distintas = a.merge(b, how="outer", indicator=True).query("_merge != 'both'")
+        print(f"❌ relaciones_finales difieren en {len(distintas)} filas:")
+        print(distintas.head(10).to_string(index=False))
+        sys.exit(1)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+# construir_grafo usa un pool de procesos: el trabajo va bajo el guard
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import logging
+import os
+import sys
+
+# Add src to path to import config_paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_dir)
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from analisis_sql import referencias_de_codigo
+
+# ==============================================
+# SONDAS DEL ANÁLISIS SQL
+# ==============================================
+# Cuerpos chicos con la forma de casos que rompieron el análisis alguna vez, y las
+# referencias (tabla, relación) que deben salir de ellos. Correr después de tocar
+# analisis_sql.py: sale con código 1 si alguna sonda no da lo esperado.
+
+# Los avisos de sqlglot al caer a Command (PRINT, EXEC...) ensucian la salida
+logging.getLogger("sqlglot").setLevel(logging.ERROR)
+
+SONDAS = [
+    ("SP heredado sin punto y coma", """
+CREATE PROCEDURE dbo.sp_legado
+AS
+BEGIN
+    SET NOCOUNT ON
+    DECLARE @hoy DATETIME
+    SET @hoy = GETDATE()
+    INSERT INTO od_destino (id, valor) SELECT a.id, a.valor FROM od_fuente a
+    UPDATE od_destino SET valor = 0 WHERE valor IS NULL
+    EXEC dbo.sp_siguiente
+    PRINT 'fin'
+END""", {("od_destino", "ESCRIBE"), ("od_fuente", "LEE"), ("sp_siguiente", "EJECUTA")}),
+
+    ("Bloque IF ... BEGIN ... END ELSE sin punto y coma", """
+CREATE PROCEDURE dbo.sp_condicional @modo INT
+AS
+IF EXISTS (SELECT 1 FROM od_control WHERE modo = @modo)
+BEGIN
+    DELETE FROM od_historia WHERE id IN (SELECT id FROM od_baja)
+    INSERT INTO od_historia SELECT * FROM od_alta UNION ALL SELECT * FROM od_reproceso
+END
+ELSE
+    UPDATE h SET estado = CASE WHEN b.id IS NULL THEN 0 ELSE 1 END
+    FROM od_historia h LEFT JOIN od_baja b ON h.id = b.id""",
+     {("od_control", "LEE"), ("od_historia", "ESCRIBE"), ("od_baja", "LEE"), ("od_alta", "LEE"),
+      ("od_reproceso", "LEE")}),
+
+    ("Trigger AFTER INSERT con inserted/deleted", """
+CREATE TRIGGER dbo.tr_auditoria ON dbo.od_padre AFTER INSERT, UPDATE AS
+BEGIN
+    SET NOCOUNT ON
+    INSERT INTO XTMP_log (id) SELECT id FROM inserted
+    UPDATE p SET fecha = GETDATE() FROM dbo.od_padre p JOIN deleted d ON p.id = d.id
+END""", {("XTMP_log", "ESCRIBE"), ("od_padre", "LEE"), ("od_padre", "ESCRIBE")}),
+
+    ("SP con WITH EXECUTE AS antes del AS", """
+CREATE PROCEDURE dbo.sp_con_opciones @id INT
+WITH EXECUTE AS CALLER
+AS
+SELECT id INTO #tmp FROM od_fuente WHERE id = @id
+INSERT INTO od_destino SELECT id FROM #tmp""", {("od_fuente", "LEE"), ("od_destino", "ESCRIBE")}),
+]
+
+# Nombres que nunca deben salir como tabla: en un trigger son su tabla padre
+PROHIBIDAS = {"inserted", "deleted"}
+
+def main():
+    print("🔬 SONDAS DEL ANÁLISIS SQL")
+    print("=" * 50)
+    fallidas = 0
+    for nombre, codigo, esperadas in SONDAS:
+        obtenidas = {(r[2], r[3]) for r in referencias_de_codigo(codigo) if r[2]}
+        if obtenidas >= esperadas and not {t.lower() for t, _ in obtenidas} & PROHIBIDAS:
+            print(f"✅ {nombre}")
+            continue
+        fallidas += 1
+        print(f"❌ {nombre}")
+        print(f"   Faltan: {sorted(esperadas - obtenidas)}")
+        print(f"   Salieron: {sorted(obtenidas)}")
+    print("=" * 50)
+    print(f"{'🎉' if not fallidas else '⚠️ '} {len(SONDAS) - fallidas} de {len(SONDAS)} sondas correctas")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
 #antes: 1_extraccion_sqlserver.py
 
 # src/01_ingestion/01_ingesta_sql.py
-import pyodbc
 import pandas as pd
 import os
 import sys
 import time
+import json
+import argparse
+import queue
+import shutil
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
 from dotenv import load_dotenv
 
 # ==============================================
@@ -19,7 +28,11 @@ src_dir = os.path.dirname(current_dir)
 sys.path.append(src_dir)
 
 # Importamos las rutas maestras
-from config_paths import RAW_DIR, CONFIG_DIR
+from config_paths import RAW_DIR, CONFIG_DIR, TELEMETRIA_DIR
+from capa_datos import (cargar_tabla, guardar_tabla, columnas_tabla, existe_tabla, EscritorTabla,
+                        registrar_espacio_raw, leer_por_lotes)
+from fuentes_catalogo import crear_fuente, pyodbc
+from almacen_codigo import sincronizar_almacen
 
 # Definimos la salida
 OUTPUT_DIR = RAW_DIR
@@ -43,104 +56,1386 @@ SERVER = os.getenv("SQL_SERVER")
 DATABASE = os.getenv("SQL_DATABASE")
 USERNAME = os.getenv("SQL_USER")
 PASSWORD = os.getenv("SQL_PASSWORD")
+# Varias bases en una corrida: "servidor/base=alias,base2,..." (servidor y alias opcionales)
+DESTINOS = os.getenv("SQL_DESTINOS", "")
+# Origen del catálogo: "sqlserver" (defecto) o "sqlite:<ruta>" (stand-in local, ver fuentes_catalogo.py)
+FUENTE = crear_fuente(os.getenv("LINAJE_FUENTE"), SERVER, DATABASE, USERNAME, PASSWORD)
 
-# Validación de seguridad
-if not all([SERVER, DATABASE, USERNAME, PASSWORD]):
-    print("❌ ERROR CRÍTICO: Faltan credenciales en el archivo .env")
-    print("   Asegúrate de definir: SQL_SERVER, SQL_DATABASE, SQL_USER, SQL_PASSWORD")
-    sys.exit(1)
+def validar_configuracion(fuente, destinos):
+    """Validación de seguridad: SQL Server necesita credenciales y al menos una base"""
+    if fuente.tipo != "sqlserver":
+        if not (destinos or DATABASE or os.path.isfile(fuente.ruta)):
+            print("❌ ERROR CRÍTICO: Con una carpeta de catálogos SQLite indica la base (SQL_DATABASE o --destinos)")
+            sys.exit(1)
+        return
+    if not all([USERNAME, PASSWORD]) or not (destinos or all([SERVER, DATABASE])):
+        print("❌ ERROR CRÍTICO: Faltan credenciales en el archivo .env")
+        print("   Asegúrate de definir: SQL_USER, SQL_PASSWORD y SQL_SERVER + SQL_DATABASE (o SQL_DESTINOS)")
+        sys.exit(1)
 
-def get_connection():
-    connection_string = (
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD};"
-        "TrustServerCertificate=yes;"
-    )
-    return pyodbc.connect(connection_string)
+def get_connection(servidor=None, base=None):
+    return FUENTE.conectar(servidor or SERVER, base or DATABASE)
 
-def run_extraction():
-    print(f"🔌 Conectando a {SERVER}...")
+class Destino:
+    """
+    Una base a extraer y la carpeta RAW donde quedan sus tablas y su estado
+    (marcas de agua, cambios). Con una sola base es la capa RAW de siempre;
+    en modo multi-base cada base tiene su subdirectorio RAW_DIR/<alias>/.
+    """
+    def __init__(self, servidor, base, alias=None, directorio=None):
+        self.servidor = servidor or SERVER
+        self.base = base
+        self.alias = alias or base or "local"
+        self.directorio = directorio or OUTPUT_DIR
+        os.makedirs(self.directorio, exist_ok=True)
+
+    @property
+    def en_espacio(self):
+        return os.path.abspath(self.directorio) != os.path.abspath(OUTPUT_DIR)
+
+    @property
+    def archivo_marcas(self):
+        return os.path.join(self.directorio, "marcas_agua.json")
+
+    @property
+    def archivo_cambios(self):
+        return os.path.join(self.directorio, "cambios_ultima_extraccion.json")
+
+    @property
+    def archivo_telemetria(self):
+        if not self.en_espacio:
+            return ARCHIVO_TELEMETRIA
+        return os.path.join(TELEMETRIA_DIR, f"telemetria_extraccion_{self.alias}.json")
+
+    @property
+    def archivo_plan(self):
+        if not self.en_espacio:
+            return ARCHIVO_PLAN
+        return os.path.join(TELEMETRIA_DIR, f"plan_extraccion_{self.alias}.json")
+
+    def conectar(self):
+        return get_connection(self.servidor, self.base)
+
+def parsear_destinos(texto):
+    """
+    Convierte "srv1/ventas=ventas_pe,srv2/ventas=ventas_cl,contabilidad" en una
+    lista de Destino, cada uno en RAW_DIR/<alias>/. El alias por defecto es el
+    nombre de la base y debe ser único (úsalo para bases homónimas en otros servidores).
+    """
+    destinos = []
+    for entrada in (e.strip() for e in texto.split(",")):
+        if not entrada:
+            continue
+        ubicacion, _, alias = entrada.partition("=")
+        servidor, _, base = ubicacion.strip().rpartition("/")
+        base, alias = base.strip(), alias.strip() or base.strip()
+        if not base or not alias.replace("_", "").replace("-", "").isalnum():
+            raise ValueError(f"Destino inválido: '{entrada}' (formato: servidor/base=alias)")
+        if FUENTE.tipo == "sqlserver" and not (servidor.strip() or SERVER):
+            raise ValueError(f"Destino sin servidor: '{entrada}' (define SQL_SERVER o usa servidor/base)")
+        if any(d.alias == alias for d in destinos):
+            raise ValueError(f"Alias repetido: '{alias}'. Asigna un alias distinto con servidor/base=alias")
+        destinos.append(Destino(servidor.strip() or None, base, alias, os.path.join(OUTPUT_DIR, alias)))
+    return destinos
+
+# ==============================================
+# 3. POOL DE CONEXIONES Y REINTENTOS
+# ==============================================
+# Workers por defecto: una conexión por cada consulta independiente del catálogo
+WORKERS_DEFECTO = 3
+REINTENTOS_DEFECTO = 3
+ESPERA_REINTENTO_SEG = 2
+
+# SQLSTATE que consideramos transitorios (caída de enlace/VPN, timeout, deadlock)
+SQLSTATE_TRANSITORIOS = {"08S01", "08001", "08007", "HYT00", "HYT01", "40001", "40613"}
+
+class PoolConexiones:
+    """
+    Pool simple de conexiones construido sobre get_connection().
+    Las conexiones se crean bajo demanda hasta `tamano` y se reutilizan;
+    una conexión que falló por un error transitorio se descarta.
+    """
+    def __init__(self, fabrica=get_connection, tamano=WORKERS_DEFECTO):
+        self.fabrica = fabrica
+        self.tamano = max(1, tamano)
+        self._libres = queue.Queue()
+        self._creadas = 0
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._creadas < self.tamano:
+                self._creadas += 1
+                crear = True
+            else:
+                crear = False
+        if not crear:
+            return self._libres.get()
+        try:
+            return self.fabrica()
+        except Exception:
+            with self._lock:
+                self._creadas -= 1
+            raise
+
+    def devolver(self, conn, descartar=False):
+        if descartar:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._creadas -= 1
+        else:
+            self._libres.put(conn)
+
+    @contextmanager
+    def conexion(self):
+        conn = self.obtener()
+        try:
+            yield conn
+        except Exception as e:
+            self.devolver(conn, descartar=es_error_transitorio(e))
+            raise
+        else:
+            self.devolver(conn)
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+            except Exception:
+                pass
+        self._creadas = 0
+
+def es_error_transitorio(error):
+    """True si el error de pyodbc es de red/timeout/deadlock y vale la pena reintentar"""
+    if pyodbc is None:
+        return False
+    if isinstance(error, getattr(pyodbc, "OperationalError", ())):
+        return True
+    if isinstance(error, getattr(pyodbc, "Error", ())) and error.args:
+        return str(error.args[0]) in SQLSTATE_TRANSITORIOS
+    return False
+
+def ejecutar_con_reintentos(pool, nombre, tarea, reintentos=REINTENTOS_DEFECTO):
+    """
+    Ejecuta tarea(conn) con una conexión del pool. Ante errores transitorios
+    reintenta con espera exponencial (2s, 4s, 8s...) sobre una conexión nueva.
+    Retorna (resultado, intentos).
+    """
+    for intento in range(1, reintentos + 1):
+        try:
+            with pool.conexion() as conn:
+                return tarea(conn), intento
+        except Exception as e:
+            if intento == reintentos or not es_error_transitorio(e):
+                raise
+            espera = ESPERA_REINTENTO_SEG * 2 ** (intento - 1)
+            print(f"   ⚠️  [{nombre}] Error transitorio ({e}). Reintento {intento}/{reintentos - 1} en {espera}s...")
+            time.sleep(espera)
+
+# ==============================================
+# 4. CONSULTAS DEL CATÁLOGO
+# ==============================================
+# Cada consulta admite un {filtro} adicional para poder acotarla a un
+# subconjunto de object_id (modo incremental). En modo completo va vacío.
+
+# Objetos con código (sys.sql_modules) que forman parte del linaje:
+# P = Stored Procedure, V = Vista, FN/IF/TF = Función escalar/inline/multi-sentencia, TR = Trigger
+TIPOS_MODULO = ("P", "V", "FN", "IF", "TF", "TR")
+# Los que además pueden ser leídos por otros módulos como si fueran una tabla
+TIPOS_REFERENCIABLES = ("V", "FN", "IF", "TF")
+LISTA_TIPOS_MODULO = ", ".join(f"'{t}'" for t in TIPOS_MODULO)
+LISTA_TIPOS_REFERENCIABLES = ", ".join(f"'{t}'" for t in TIPOS_REFERENCIABLES)
+# FROM/WHERE de cada consulta por separado: los comparte el plan previo (--plan)
+# para contar filas y bytes sobre exactamente el mismo conjunto
+FROM_COLUMNAS = """
+FROM sys.tables t
+INNER JOIN sys.columns c ON t.object_id = c.object_id
+INNER JOIN sys.types ty ON c.user_type_id = ty.user_type_id
+WHERE (t.name LIKE 'od_%' OR t.name LIKE 'XTMP_%') -- Filtro de Negocio
+"""
+
+QUERY_COLUMNAS = """
+SELECT 
+    SCHEMA_NAME(t.schema_id) AS [Esquema],
+    t.name AS [Tabla],
+    c.name AS [Columna],
+    ty.name AS [Tipo_Dato],
+    c.max_length AS [Longitud],
+    c.is_nullable AS [Es_Nulo]""" + FROM_COLUMNAS + """
+  {filtro}
+ORDER BY t.name, c.column_id
+"""
+
+FROM_DEPENDENCIAS = """
+FROM sys.sql_expression_dependencies d
+INNER JOIN sys.objects o ON d.referencing_id = o.object_id
+LEFT JOIN sys.objects r ON d.referenced_id = r.object_id
+WHERE o.type IN (""" + LISTA_TIPOS_MODULO + """) -- SPs, vistas, funciones y triggers
+  AND (d.referenced_entity_name LIKE 'od_%' OR d.referenced_entity_name LIKE 'XTMP_%'
+       OR r.type IN (""" + LISTA_TIPOS_REFERENCIABLES + """))
+"""
+
+# Tipo_Objeto es el type_desc del módulo que referencia; Tipo_Destino el tipo corto
+# del objeto referenciado (U, V, FN...; vacío si no se resolvió, p.ej. entre bases)
+QUERY_DEPENDENCIAS = """
+SELECT 
+    OBJECT_NAME(d.referencing_id) AS [Origen_SP],
+    d.referenced_entity_name AS [Destino_Tabla],
+    o.type_desc AS [Tipo_Objeto],
+    'DEPENDENCY' AS [Accion],
+    SCHEMA_NAME(o.schema_id) AS [Esquema_SP],
+    d.referenced_schema_name AS [Esquema_Tabla],
+    d.referenced_database_name AS [Base_Tabla],
+    RTRIM(o.type) AS [Tipo_Origen],
+    RTRIM(r.type) AS [Tipo_Destino]""" + FROM_DEPENDENCIAS + """
+  {filtro}
+"""
+
+# Dependencias a nivel de columna (referenced_minor_id -> sys.columns). SQL Server solo
+# llena referenced_minor_id en sys.sql_expression_dependencies para módulos con
+# SCHEMABINDING; para el resto el detalle por columna (y los flags is_selected /
+# is_updated) vive en sys.sql_dependencies, así que se unen ambas fuentes.
+# Es_Leida/Es_Escrita quedan vacíos cuando solo se conoce la referencia.
+FROM_DEPENDENCIAS_COLUMNAS = """
+FROM (
+    SELECT d.referencing_id AS Id_Origen, d.referenced_id AS Id_Destino, d.referenced_minor_id AS Id_Columna,
+           CAST(NULL AS INT) AS Es_Leida, CAST(NULL AS INT) AS Es_Escrita
+    FROM sys.sql_expression_dependencies d
+    WHERE d.referenced_minor_id > 0 AND d.referenced_id IS NOT NULL
+    UNION ALL
+    SELECT sd.object_id, sd.referenced_major_id, sd.referenced_minor_id,
+           CAST(sd.is_selected AS INT), CAST(sd.is_updated AS INT)
+    FROM sys.sql_dependencies sd
+    WHERE sd.referenced_minor_id > 0
+) x
+INNER JOIN sys.objects o ON x.Id_Origen = o.object_id
+INNER JOIN sys.objects r ON x.Id_Destino = r.object_id
+INNER JOIN sys.columns c ON c.object_id = x.Id_Destino AND c.column_id = x.Id_Columna
+WHERE o.type IN (""" + LISTA_TIPOS_MODULO + """) -- SPs, vistas, funciones y triggers
+  AND (r.name LIKE 'od_%' OR r.name LIKE 'XTMP_%'
+       OR r.type IN (""" + LISTA_TIPOS_REFERENCIABLES + """))
+"""
+# Una fila por (objeto, tabla, columna): las dos fuentes se funden aquí
+GROUP_DEPENDENCIAS_COLUMNAS = "GROUP BY o.name, o.schema_id, o.type, r.name, r.schema_id, r.type, c.name, c.column_id\n"
+
+QUERY_DEPENDENCIAS_COLUMNAS = """
+SELECT 
+    o.name AS [Origen_SP],
+    r.name AS [Destino_Tabla],
+    c.name AS [Columna],
+    MAX(x.Es_Leida) AS [Es_Leida],
+    MAX(x.Es_Escrita) AS [Es_Escrita],
+    SCHEMA_NAME(o.schema_id) AS [Esquema_SP],
+    SCHEMA_NAME(r.schema_id) AS [Esquema_Tabla],
+    RTRIM(o.type) AS [Tipo_Origen],
+    RTRIM(r.type) AS [Tipo_Destino]""" + FROM_DEPENDENCIAS_COLUMNAS + """
+  {filtro}
+""" + GROUP_DEPENDENCIAS_COLUMNAS + """ORDER BY o.name, r.name, c.column_id
+"""
+
+# Volumen por tabla: filas (heap o índice clustered, para no contar dos veces los
+# no clustered) y páginas de 8 KB reservadas/usadas por todos sus índices.
+# sys.dm_db_partition_stats necesita VIEW DATABASE STATE; sin ese permiso se omite.
+QUERY_VOLUMEN_TABLAS = """
+SELECT 
+    t.name AS [Tabla],
+    SCHEMA_NAME(t.schema_id) AS [Esquema],
+    SUM(CASE WHEN ps.index_id IN (0, 1) THEN ps.row_count ELSE 0 END) AS [Filas],
+    SUM(ps.reserved_page_count) AS [Paginas_Reservadas],
+    SUM(ps.used_page_count) AS [Paginas_Usadas],
+    SUM(ps.reserved_page_count) * 8192 AS [Bytes_Reservados]
+FROM sys.tables t
+INNER JOIN sys.dm_db_partition_stats ps ON t.object_id = ps.object_id
+WHERE (t.name LIKE 'od_%' OR t.name LIKE 'XTMP_%') -- Filtro de Negocio
+  {filtro}
+GROUP BY t.name, t.schema_id
+ORDER BY t.name
+"""
+
+# Estadísticas de ejecución por SP desde la caché de planes (opcional, --estadisticas-sp).
+# Un SP puede tener varios planes en caché: se suman. Los contadores se pierden al
+# reiniciar la instancia o al salir el plan de la caché (ver En_Cache_Desde).
+# Tiempos en milisegundos (la DMV los da en microsegundos).
+QUERY_ESTADISTICAS_SP = """
+SELECT 
+    p.name AS [Nombre_SP],
+    SCHEMA_NAME(p.schema_id) AS [Esquema],
+    SUM(ps.execution_count) AS [Ejecuciones],
+    SUM(ps.total_elapsed_time) / 1000.0 AS [Tiempo_Total_ms],
+    SUM(ps.total_elapsed_time) / 1000.0 / NULLIF(SUM(ps.execution_count), 0) AS [Tiempo_Promedio_ms],
+    SUM(ps.total_logical_reads) AS [Lecturas_Logicas],
+    MAX(ps.last_execution_time) AS [Ultima_Ejecucion],
+    MIN(ps.cached_time) AS [En_Cache_Desde]
+FROM sys.dm_exec_procedure_stats ps
+INNER JOIN sys.procedures p ON ps.object_id = p.object_id
+WHERE ps.database_id = DB_ID()
+  {filtro}
+GROUP BY p.name, p.schema_id
+ORDER BY p.name
+"""
+COLUMNAS_ESTADISTICAS_SP = ["Nombre_SP", "Esquema", "Ejecuciones", "Tiempo_Total_ms", "Tiempo_Promedio_ms",
+                            "Lecturas_Logicas", "Ultima_Ejecucion", "En_Cache_Desde"]
+
+# Filtro común del código fuente (lo comparten la consulta completa y la de huellas)
+WHERE_CODIGO = """
+WHERE o.type IN (""" + LISTA_TIPOS_MODULO + """) -- SPs, vistas, funciones y triggers
+  AND (
+      m.definition LIKE '%od_%' 
+      OR m.definition LIKE '%XTMP_%'
+      OR m.definition LIKE '%INSERT INTO%'
+  )
+"""
+
+# Huella calculada en el servidor (SHA2_256 sobre el nvarchar original, UTF-16LE).
+# Se guarda con el código y sirve como clave de caché para las etapas siguientes.
+EXPR_HASH_DEFINICION = "CONVERT(VARCHAR(64), HASHBYTES('SHA2_256', m.definition), 2)"
+
+QUERY_CODIGO = """
+SELECT 
+    o.name AS [Nombre_Objeto],
+    o.type_desc AS [Tipo],
+    m.definition AS [Codigo_SQL],
+    """ + EXPR_HASH_DEFINICION + """ AS [Hash_Definicion],
+    SCHEMA_NAME(o.schema_id) AS [Esquema],
+    RTRIM(o.type) AS [Tipo_Codigo],
+    OBJECT_NAME(NULLIF(o.parent_object_id, 0)) AS [Objeto_Padre]
+FROM sys.sql_modules m
+INNER JOIN sys.objects o ON m.object_id = o.object_id
+""" + WHERE_CODIGO + """
+  {filtro}
+"""
+
+# Fase 1 de la extracción por huellas: solo id, nombre y hash (sin transferir el código)
+QUERY_HASHES_CODIGO = """
+SELECT 
+    o.object_id AS [object_id],
+    o.name AS [Nombre_Objeto],
+    """ + EXPR_HASH_DEFINICION + """ AS [Hash_Definicion],
+    SCHEMA_NAME(o.schema_id) AS [Esquema]
+FROM sys.sql_modules m
+INNER JOIN sys.objects o ON m.object_id = o.object_id
+""" + WHERE_CODIGO
+
+# Tamaño (bytes) de cada definición, para partir sys.sql_modules en rangos de object_id balanceados
+QUERY_TAMANOS_CODIGO = """
+SELECT 
+    o.object_id AS [object_id],
+    DATALENGTH(m.definition) AS [Bytes]
+FROM sys.sql_modules m
+INNER JOIN sys.objects o ON m.object_id = o.object_id
+""" + WHERE_CODIGO + """
+ORDER BY o.object_id
+"""
+
+# Catálogo liviano (sin código) para las marcas de agua: solo fechas por objeto
+QUERY_CATALOGO_OBJETOS = """
+SELECT 
+    o.object_id AS [object_id],
+    o.name AS [Nombre_Objeto],
+    RTRIM(o.type) AS [Tipo],
+    o.create_date AS [create_date],
+    o.modify_date AS [modify_date]
+FROM sys.objects o
+WHERE (o.type = 'U' AND (o.name LIKE 'od_%' OR o.name LIKE 'XTMP_%'))
+   OR o.type IN (""" + LISTA_TIPOS_MODULO + """)
+"""
+
+# Tablas de la capa RAW (nombre lógico; el formato lo decide capa_datos: Parquet o CSV)
+TABLA_COLUMNAS = "metadata_tablas"
+TABLA_DEPENDENCIAS = "dependencias_sql"
+TABLA_DEPENDENCIAS_COLUMNAS = "dependencias_columnas"
+TABLA_CODIGO = "codigo_fuente"
+TABLA_VOLUMEN = "volumen_tablas"
+TABLA_ESTADISTICAS_SP = "estadisticas_sp"
+# Índice liviano Nombre_Objeto -> Hash_Definicion (claves de caché para etapas posteriores)
+TABLA_HASHES = "hashes_codigo"
+
+# Máximo de IDs por cláusula IN (evita sentencias gigantes)
+TAM_LOTE_IDS = 1000
+
+# Filas por fetchmany en la extracción en streaming
+TAM_LOTE_DEFECTO = 2000
+
+# Telemetría de la última corrida (tiempos, filas/s, pico de memoria)
+ARCHIVO_TELEMETRIA = os.path.join(TELEMETRIA_DIR, "telemetria_extraccion.json")
+ARCHIVO_TELEMETRIA_MULTIBASE = os.path.join(TELEMETRIA_DIR, "telemetria_multibase.json")
+# Último plan previo (--plan / --auto), para comparar estimado vs real
+ARCHIVO_PLAN = os.path.join(TELEMETRIA_DIR, "plan_extraccion.json")
+
+# Bases extraídas a la vez en modo multi-base (cada una abre hasta --workers conexiones)
+MAX_BASES_DEFECTO = 4
+
+def filtro_por_ids(columna, ids):
+    """Arma la cláusula 'AND col IN (...)' (los IDs son enteros, no hay riesgo de inyección)"""
+    return f"AND {columna} IN ({', '.join(str(int(i)) for i in ids)})"
+
+def leer_por_lotes_de_ids(conn, query, columna, ids):
+    """Ejecuta una consulta del catálogo acotada a una lista de object_id (en lotes)"""
+    ids = sorted(ids)
+    partes = []
+    for i in range(0, len(ids), TAM_LOTE_IDS):
+        lote = ids[i:i + TAM_LOTE_IDS]
+        partes.append(pd.read_sql(query.format(filtro=filtro_por_ids(columna, lote)), conn))
+    if not partes:
+        return None
+    return pd.concat(partes, ignore_index=True)
+
+# ==============================================
+# 5. EXTRACCIÓN EN STREAMING (fetchmany por lotes)
+# ==============================================
+def extraer_en_streaming(conn, query, nombre_tabla, tam_lote=TAM_LOTE_DEFECTO, transformar=None,
+                         medir_memoria=True, directorio=OUTPUT_DIR):
+    """
+    Ejecuta la consulta con un cursor y escribe cada lote de `tam_lote` filas
+    a la tabla RAW apenas llega, sin materializar el resultado completo en memoria.
+    Escribe primero a un archivo parcial y lo publica al terminar, para no
+    dejar la capa RAW a medio escribir si la conexión se cae.
+    Retorna las métricas de la consulta (filas, segundos, filas/s, pico de memoria).
+    Con consultas concurrentes el pico de tracemalloc es de todo el proceso,
+    por eso se puede desactivar la medición por consulta (medir_memoria=False).
+    """
+    if medir_memoria:
+        tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    
+    cursor = conn.cursor()
+    cursor.execute(query)
+    columnas = [d[0] for d in cursor.description]
+    escritor = EscritorTabla(directorio, nombre_tabla, columnas)
+    
+    filas = 0
+    lotes = 0
+    confirmado = False
+    try:
+        while True:
+            lote = cursor.fetchmany(tam_lote)
+            if not lote:
+                break
+            df_lote = pd.DataFrame.from_records([tuple(r) for r in lote], columns=columnas)
+            if transformar is not None:
+                df_lote = transformar(df_lote)
+            escritor.escribir(df_lote)
+            filas += len(df_lote)
+            lotes += 1
+        escritor.confirmar()
+        confirmado = True
+    finally:
+        cursor.close()
+        if not confirmado:
+            escritor.descartar()
+    
+    segundos = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1] if medir_memoria else None
+    return {
+        "archivo": nombre_tabla,
+        "filas": filas,
+        "lotes": lotes,
+        "tam_lote": tam_lote,
+        "segundos": round(segundos, 3),
+        "filas_por_segundo": round(filas / segundos, 1) if segundos > 0 else None,
+        "pico_memoria_mb": round(pico / 1024 ** 2, 2) if pico is not None else None
+    }
+
+def imprimir_metricas(metricas):
+    """Línea de resumen de una consulta en streaming"""
+    print(f"   -> Guardado: {metricas['archivo']} ({metricas['filas']} filas en {metricas['lotes']} lotes)")
+    linea = f"      ⏱️  {metricas['segundos']:.2f} s | {metricas['filas_por_segundo'] or 0:,.0f} filas/s"
+    if metricas.get('pico_memoria_mb') is not None:
+        linea += f" | pico memoria: {metricas['pico_memoria_mb']:.1f} MB"
+    if metricas.get('intentos', 1) > 1:
+        linea += f" | intentos: {metricas['intentos']}"
+    print(linea)
+    if metricas.get('modo_codigo') == "hash":
+        print(f"      🧬 Por huella: {metricas['descargados']} descargados | {metricas['sin_cambios']} sin cambios"
+              f" | {metricas['eliminados']} eliminados")
+    elif metricas.get('modo_codigo') == "particionado":
+        mb = [p['mb'] for p in metricas['particiones']]
+        reintentadas = sum(1 for p in metricas['particiones'] if p['intentos'] > 1)
+        print(f"      🧩 {len(mb)} particiones por object_id | {min(mb):.1f}-{max(mb):.1f} MB c/u"
+              f" | reintentadas: {reintentadas}")
+
+def guardar_telemetria(destino, modo, metricas_consultas, segundos_totales, extra=None):
+    """Persiste la telemetría de la corrida para compararla entre ejecuciones"""
+    telemetria = {
+        "fecha_extraccion": datetime.now().isoformat(timespec='seconds'),
+        "servidor": destino.servidor,
+        "base_datos": destino.base,
+        "modo": modo,
+        "segundos_totales": round(segundos_totales, 3),
+        "pico_memoria_proceso_mb": round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2),
+        "consultas": metricas_consultas
+    }
+    telemetria.update(extra or {})
+    with open(destino.archivo_telemetria, 'w', encoding='utf-8') as f:
+        json.dump(telemetria, f, indent=2, ensure_ascii=False)
+    print(f"📈 Telemetría guardada en: {destino.archivo_telemetria}")
+
+def extraer_volumen_tablas(conn, tam_lote=TAM_LOTE_DEFECTO, medir_memoria=True, directorio=OUTPUT_DIR):
+    """
+    Filas y bytes reservados por tabla. Los volúmenes cambian sin que cambie la
+    definición, así que se descargan siempre completos (también en modo incremental).
+    Sin permiso sobre la DMV se avisa y se sigue: el volumen es opcional aguas abajo.
+    """
+    try:
+        return extraer_en_streaming(conn, QUERY_VOLUMEN_TABLAS.format(filtro=""), TABLA_VOLUMEN, tam_lote,
+                                    medir_memoria=medir_memoria, directorio=directorio)
+    except Exception as e:
+        if es_error_transitorio(e):
+            raise
+        print(f"   ⚠️  Volumen de tablas omitido ({e}). ¿Falta VIEW DATABASE STATE?")
+        return {"archivo": TABLA_VOLUMEN, "filas": 0, "lotes": 0, "tam_lote": tam_lote, "segundos": 0.0,
+                "filas_por_segundo": None, "pico_memoria_mb": None, "omitida": str(e)}
+
+def importar_estadisticas_sp_csv(ruta, destino):
+    """
+    Stand-in offline de sys.dm_exec_procedure_stats: un CSV con las columnas de
+    QUERY_ESTADISTICAS_SP (Esquema, Tiempo_Promedio_ms y las fechas son opcionales).
+    En modo multi-base, si trae una columna Base_Datos (base o alias), cada base se
+    queda solo con sus filas.
+    """
+    inicio = time.perf_counter()
+    df = pd.read_csv(ruta)
+    faltantes = [c for c in ("Nombre_SP", "Ejecuciones", "Tiempo_Total_ms", "Lecturas_Logicas") if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Al CSV de estadísticas le faltan columnas: {', '.join(faltantes)}")
+    if "Base_Datos" in df.columns and destino.en_espacio:
+        df = df[df["Base_Datos"].isin([destino.base, destino.alias])]
+    if "Tiempo_Promedio_ms" not in df.columns:
+        df["Tiempo_Promedio_ms"] = df["Tiempo_Total_ms"] / df["Ejecuciones"].where(df["Ejecuciones"] > 0)
+    df = df.reindex(columns=COLUMNAS_ESTADISTICAS_SP)
+    guardar_tabla(df, destino.directorio, TABLA_ESTADISTICAS_SP)
+    segundos = time.perf_counter() - inicio
+    return {"archivo": TABLA_ESTADISTICAS_SP, "filas": len(df), "lotes": 1, "tam_lote": None,
+            "segundos": round(segundos, 3), "filas_por_segundo": round(len(df) / segundos, 1) if segundos > 0 else None,
+            "pico_memoria_mb": None, "origen": ruta}
+
+def extraer_estadisticas_sp(conn, origen, destino, tam_lote=TAM_LOTE_DEFECTO):
+    """
+    Paso opcional: costo de ejecución por SP. `origen` es True (DMV del servidor)
+    o la ruta de un CSV exportado. Como el volumen, se baja siempre completo; sin
+    VIEW SERVER STATE se avisa y se sigue.
+    """
+    if isinstance(origen, str):
+        return importar_estadisticas_sp_csv(origen, destino)
+    try:
+        return extraer_en_streaming(conn, QUERY_ESTADISTICAS_SP.format(filtro=""), TABLA_ESTADISTICAS_SP,
+                                    tam_lote, directorio=destino.directorio)
+    except Exception as e:
+        if es_error_transitorio(e):
+            raise
+        print(f"   ⚠️  Estadísticas de ejecución omitidas ({e}). ¿Falta VIEW SERVER STATE?")
+        return {"archivo": TABLA_ESTADISTICAS_SP, "filas": 0, "lotes": 0, "tam_lote": tam_lote, "segundos": 0.0,
+                "filas_por_segundo": None, "pico_memoria_mb": None, "omitida": str(e)}
+
+# ==============================================
+# 6. HUELLAS DEL CÓDIGO (HASHBYTES EN EL SERVIDOR)
+# ==============================================
+def cargar_hashes_codigo(directorio=OUTPUT_DIR):
+    """
+    Carga el índice {Nombre_Objeto: Hash_Definicion} de la última extracción.
+    Retorna None si no hay índice o si el código guardado no trae huellas.
+    """
+    if not (existe_tabla(directorio, TABLA_HASHES) and existe_tabla(directorio, TABLA_CODIGO)):
+        return None
+    df = cargar_tabla(directorio, TABLA_HASHES)
+    if 'Hash_Definicion' not in df.columns:
+        return None
+    return dict(zip(df['Nombre_Objeto'], df['Hash_Definicion'].fillna("")))
+
+def actualizar_indice_hashes(directorio=OUTPUT_DIR):
+    """Regenera hashes_codigo a partir de codigo_fuente (solo lee las columnas del índice)"""
+    columnas = columnas_tabla(directorio, TABLA_CODIGO)
+    if 'Hash_Definicion' not in columnas:
+        return
+    leer = [c for c in ('Nombre_Objeto', 'Hash_Definicion', 'Esquema') if c in columnas]
+    guardar_tabla(cargar_tabla(directorio, TABLA_CODIGO, columnas=leer), directorio, TABLA_HASHES)
+
+def extraer_codigo_por_hash(conn, hashes_previos, directorio=OUTPUT_DIR):
+    """
+    Extracción del código en dos fases:
+      1. Trae solo object_id, nombre y HASHBYTES de cada definición.
+      2. Descarga el código completo únicamente de los objetos cuyo hash
+         difiere del guardado en la capa RAW (nuevos o modificados).
+    Los objetos que ya no existen se quitan de codigo_fuente.
+    """
+    inicio = time.perf_counter()
+    df_hashes = pd.read_sql(QUERY_HASHES_CODIGO, conn)
+    df_hashes['Hash_Definicion'] = df_hashes['Hash_Definicion'].fillna("")
+    
+    cambiados = df_hashes[df_hashes.apply(
+        lambda r: hashes_previos.get(r['Nombre_Objeto']) != r['Hash_Definicion'], axis=1)]
+    eliminados = set(hashes_previos) - set(df_hashes['Nombre_Objeto'])
+    
+    df_code = leer_por_lotes_de_ids(conn, QUERY_CODIGO, "o.object_id", cambiados['object_id'].tolist())
+    
+    nombres_a_quitar = set(cambiados['Nombre_Objeto']) | eliminados
+    fusionar_raw(TABLA_CODIGO, "Nombre_Objeto", nombres_a_quitar, df_code, directorio)
+    guardar_tabla(df_hashes.drop(columns=['object_id']), directorio, TABLA_HASHES)
+    
+    segundos = time.perf_counter() - inicio
+    return {
+        "archivo": TABLA_CODIGO,
+        "filas": len(df_hashes),
+        "lotes": 1,
+        "tam_lote": None,
+        "segundos": round(segundos, 3),
+        "filas_por_segundo": round(len(df_hashes) / segundos, 1) if segundos > 0 else None,
+        "pico_memoria_mb": None,
+        "modo_codigo": "hash",
+        "descargados": len(cambiados),
+        "sin_cambios": len(df_hashes) - len(cambiados),
+        "eliminados": len(eliminados)
+    }
+
+# ==============================================
+# 7. CÓDIGO PARTICIONADO POR RANGOS DE object_id
+# ==============================================
+def particionar_por_bytes(tamanos, particiones):
+    """
+    Parte una lista ordenada de (object_id, bytes) en rangos contiguos
+    [(desde, hasta, bytes)] de tamaño parecido. Corta cuando el acumulado pasa
+    cada k/particiones del total (así un objeto enorme no desbalancea los demás).
+    """
+    total = sum(b for _, b in tamanos)
+    rangos = []
+    desde, bytes_rango, acumulado = None, 0, 0
+    for obj_id, b in tamanos:
+        if desde is None:
+            desde, bytes_rango = obj_id, 0
+        bytes_rango += b
+        acumulado += b
+        if len(rangos) < particiones - 1 and acumulado >= total * (len(rangos) + 1) / particiones:
+            rangos.append((desde, obj_id, bytes_rango))
+            desde = None
+    if desde is not None:
+        rangos.append((desde, tamanos[-1][0], bytes_rango))
+    return rangos
+
+def extraer_codigo_particionado(conn, fabrica, particiones, tam_lote=TAM_LOTE_DEFECTO, directorio=OUTPUT_DIR):
+    """
+    Descarga sys.sql_modules en `particiones` rangos de object_id con bytes balanceados
+    (DATALENGTH), cada uno por su propia conexión y en paralelo. Cada partición se
+    escribe a un archivo propio y se reintenta sola si falla; al final se unen en
+    orden de rango (y de object_id dentro del rango), así el resultado no depende
+    de qué partición terminó primero.
+    """
+    inicio = time.perf_counter()
+    df_tamanos = pd.read_sql(QUERY_TAMANOS_CODIGO, conn)
+    tamanos = [(int(i), int(b or 0)) for i, b in zip(df_tamanos['object_id'], df_tamanos['Bytes'])]
+    rangos = particionar_por_bytes(tamanos, particiones)
+
+    temporal = tempfile.mkdtemp(prefix=".particiones_codigo_", dir=directorio)
+    pool = PoolConexiones(fabrica, tamano=len(rangos))
+
+    def extraer_rango(indice, desde, hasta):
+        query = QUERY_CODIGO.format(filtro=f"AND o.object_id BETWEEN {int(desde)} AND {int(hasta)}"
+                                           " ORDER BY o.object_id")
+        metricas, intentos = ejecutar_con_reintentos(
+            pool, f"codigo[{indice}]",
+            lambda c: extraer_en_streaming(c, query, f"parte_{indice:04d}", tam_lote,
+                                           medir_memoria=False, directorio=temporal))
+        metricas["intentos"] = intentos
+        return metricas
+
+    try:
+        partes = [None] * len(rangos)
+        if rangos:
+            with ThreadPoolExecutor(max_workers=len(rangos)) as executor:
+                futuros = {executor.submit(extraer_rango, i, d, h): i for i, (d, h, _) in enumerate(rangos)}
+                for futuro in as_completed(futuros):
+                    partes[futuros[futuro]] = futuro.result()
+
+        # Unión determinista: en orden de rango, lote a lote
+        escritor = None
+        try:
+            for i in range(len(rangos)):
+                for df_lote in leer_por_lotes(temporal, f"parte_{i:04d}", tam_lote):
+                    if escritor is None:
+                        escritor = EscritorTabla(directorio, TABLA_CODIGO, df_lote.columns)
+                    escritor.escribir(df_lote)
+            if escritor is None:
+                # Sin objetos: se publica la tabla vacía con sus columnas
+                return extraer_en_streaming(conn, QUERY_CODIGO.format(filtro=""), TABLA_CODIGO, tam_lote,
+                                            medir_memoria=False, directorio=directorio)
+            escritor.confirmar()
+        except Exception:
+            if escritor is not None:
+                escritor.descartar()
+            raise
+    finally:
+        pool.cerrar()
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    segundos = time.perf_counter() - inicio
+    filas = sum(p["filas"] for p in partes)
+    return {
+        "archivo": TABLA_CODIGO,
+        "filas": filas,
+        "lotes": sum(p["lotes"] for p in partes),
+        "tam_lote": tam_lote,
+        "segundos": round(segundos, 3),
+        "filas_por_segundo": round(filas / segundos, 1) if segundos > 0 else None,
+        "pico_memoria_mb": None,
+        "modo_codigo": "particionado",
+        "particiones": [
+            {"desde": d, "hasta": h, "mb": round(b / 1024 ** 2, 3), "filas": p["filas"],
+             "segundos": p["segundos"], "intentos": p["intentos"]}
+            for (d, h, b), p in zip(rangos, partes)
+        ]
+    }
+
+# ==============================================
+# 8. MARCAS DE AGUA (MODO INCREMENTAL)
+# ==============================================
+def leer_catalogo_objetos(conn):
+    """Lee object_id, nombre, tipo y fechas (create/modify) de tablas y SPs"""
+    df = pd.read_sql(QUERY_CATALOGO_OBJETOS, conn)
+    catalogo = {}
+    for _, row in df.iterrows():
+        catalogo[str(int(row['object_id']))] = {
+            "nombre": row['Nombre_Objeto'],
+            "tipo": row['Tipo'],
+            "create_date": pd.Timestamp(row['create_date']).isoformat(),
+            "modify_date": pd.Timestamp(row['modify_date']).isoformat()
+        }
+    return catalogo
+
+def cargar_marcas_agua(destino):
+    """Carga las marcas de agua de la última extracción (None si no existen)"""
+    if not os.path.exists(destino.archivo_marcas):
+        return None
+    try:
+        with open(destino.archivo_marcas, 'r', encoding='utf-8') as f:
+            return json.load(f).get("objetos", {})
+    except Exception as e:
+        print(f"⚠️  No se pudieron leer las marcas de agua ({e}). Se hará extracción completa.")
+        return None
+
+def guardar_marcas_agua(catalogo, destino):
+    """Persiste el catálogo actual como nueva marca de agua"""
+    with open(destino.archivo_marcas, 'w', encoding='utf-8') as f:
+        json.dump({
+            "servidor": destino.servidor,
+            "base_datos": destino.base,
+            "fecha_extraccion": datetime.now().isoformat(timespec='seconds'),
+            "objetos": catalogo
+        }, f, indent=2, ensure_ascii=False)
+
+def detectar_cambios(catalogo_anterior, catalogo_actual):
+    """
+    Compara dos catálogos por object_id.
+    Retorna {tipo: {"nuevos": [...], "modificados": [...], "eliminados": [...]}}
+    con entradas (object_id, nombre_actual, nombre_anterior).
+    """
+    cambios = {t: {"nuevos": [], "modificados": [], "eliminados": []} for t in ("U",) + TIPOS_MODULO}
+    
+    for obj_id, obj in catalogo_actual.items():
+        previo = catalogo_anterior.get(obj_id)
+        if previo is None:
+            cambios[obj["tipo"]]["nuevos"].append((obj_id, obj["nombre"], None))
+        elif (obj["modify_date"] != previo["modify_date"]
+              or obj["create_date"] != previo["create_date"]
+              or obj["nombre"] != previo["nombre"]):
+            cambios[obj["tipo"]]["modificados"].append((obj_id, obj["nombre"], previo["nombre"]))
+    
+    # Barrido de eliminados: estaban en la marca anterior y ya no existen
+    for obj_id, previo in catalogo_anterior.items():
+        if obj_id not in catalogo_actual:
+            cambios[previo["tipo"]]["eliminados"].append((obj_id, None, previo["nombre"]))
+    
+    return cambios
+
+def fusionar_raw(nombre_tabla, columna_clave, nombres_a_quitar, df_nuevo, directorio=OUTPUT_DIR):
+    """
+    Fusiona una tabla de la capa RAW: quita las filas de los objetos cambiados/eliminados
+    y agrega las filas recién extraídas.
+    """
+    df_existente = cargar_tabla(directorio, nombre_tabla)
+    df_existente = df_existente[~df_existente[columna_clave].isin(nombres_a_quitar)]
     
+    if df_nuevo is not None and not df_nuevo.empty:
+        df_existente = pd.concat([df_existente, df_nuevo], ignore_index=True)
+    
+    guardar_tabla(df_existente, directorio, nombre_tabla)
+    return len(df_existente)
+
+ETIQUETAS_TIPO = {"U": "Tablas", "P": "Stored Procedures", "V": "Vistas", "FN": "Funciones escalares",
+                  "IF": "Funciones inline", "TF": "Funciones de tabla", "TR": "Triggers"}
+
+def reportar_cambios(cambios, destino):
+    """Imprime y guarda el detalle exacto de los objetos que cambiaron"""
+    etiquetas = ETIQUETAS_TIPO
+    total = 0
+    for tipo, grupos in cambios.items():
+        for grupo, objetos in grupos.items():
+            total += len(objetos)
+            for obj_id, nombre, nombre_anterior in objetos:
+                nombre_mostrar = nombre or nombre_anterior
+                detalle = f" (antes: {nombre_anterior})" if nombre and nombre_anterior and nombre != nombre_anterior else ""
+                print(f"   • [{etiquetas[tipo]}] {grupo.upper()}: {nombre_mostrar}{detalle}")
+    
+    if total == 0:
+        print("   ✅ Sin cambios desde la última extracción.")
+    
+    with open(destino.archivo_cambios, 'w', encoding='utf-8') as f:
+        json.dump({
+            "fecha_extraccion": datetime.now().isoformat(timespec='seconds'),
+            "total_cambios": total,
+            "cambios": {
+                etiquetas[tipo]: {
+                    grupo: [{"object_id": int(i), "nombre": n, "nombre_anterior": a} for i, n, a in objetos]
+                    for grupo, objetos in grupos.items()
+                }
+                for tipo, grupos in cambios.items()
+            }
+        }, f, indent=2, ensure_ascii=False)
+    
+    return total
+
+def raw_completo_disponible(directorio=OUTPUT_DIR):
+    """El modo incremental necesita la capa RAW previa y sus marcas de agua"""
+    tablas = [TABLA_COLUMNAS, TABLA_DEPENDENCIAS, TABLA_DEPENDENCIAS_COLUMNAS, TABLA_CODIGO]
+    return all(existe_tabla(directorio, t) for t in tablas)
+
+# ==============================================
+# 9. EXTRACCIÓN
+# ==============================================
+def run_extraction(incremental=False, tam_lote=TAM_LOTE_DEFECTO, workers=WORKERS_DEFECTO, benchmark=False,
+                   codigo_completo=False, destino=None, particiones_codigo=0, estadisticas_sp=False,
+                   auto=False):
+    destino = destino or Destino(SERVER, DATABASE)
+    directorio = destino.directorio
+    print(f"🔌 Conectando a {destino.servidor}/{destino.base}...")
+    inicio = time.time()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    
+    pool = PoolConexiones(destino.conectar, tamano=workers)
     try:
-        conn = get_connection()
+        # Validamos la conexión antes de lanzar nada en paralelo
+        with pool.conexion():
+            pass
     except Exception as e:
         print(f"❌ Error de conexión: {e}")
         raise
 
-    # ---------------------------------------------------------
-    # 1. DICCIONARIO DE DATOS (Estructura de Tablas)
-    # ---------------------------------------------------------
-    print("📊 1. Extrayendo estructura de tablas (Columnas y Tipos)...")
-    query_columns = """
-    SELECT 
-        t.name AS [Tabla],
-        c.name AS [Columna],
-        ty.name AS [Tipo_Dato],
-        c.max_length AS [Longitud],
-        c.is_nullable AS [Es_Nulo]
-    FROM sys.tables t
-    INNER JOIN sys.columns c ON t.object_id = c.object_id
-    INNER JOIN sys.types ty ON c.user_type_id = ty.user_type_id
-    WHERE t.name LIKE 'od_%' OR t.name LIKE 'XTMP_%' -- Filtro de Negocio
-    ORDER BY t.name, c.column_id
-    """
-    df_cols = pd.read_sql(query_columns, conn)
-    df_cols.to_csv(os.path.join(OUTPUT_DIR, "metadata_tablas.csv"), index=False)
-    print(f"   -> Guardado: metadata_tablas.csv ({len(df_cols)} columnas encontradas)")
-
-    # ---------------------------------------------------------
-    # 2. DEPENDENCIAS DEL SISTEMA
-    # ---------------------------------------------------------
-    print("🔗 2. Extrayendo dependencias oficiales (Relaciones conocidas)...")
-    query_deps = """
-    SELECT 
-        OBJECT_NAME(d.referencing_id) AS [Origen_SP],
-        d.referenced_entity_name AS [Destino_Tabla],
-        o.type_desc AS [Tipo_Objeto],
-        'DEPENDENCY' AS [Accion]
-    FROM sys.sql_expression_dependencies d
-    INNER JOIN sys.objects o ON d.referencing_id = o.object_id
-    WHERE o.type = 'P' -- Solo Stored Procedures
-      AND (d.referenced_entity_name LIKE 'od_%' OR d.referenced_entity_name LIKE 'XTMP_%')
-    """
-    df_deps = pd.read_sql(query_deps, conn)
-    df_deps.to_csv(os.path.join(OUTPUT_DIR, "dependencias_sql.csv"), index=False)
-    print(f"   -> Guardado: dependencias_sql.csv ({len(df_deps)} relaciones encontradas)")
-
-    # ---------------------------------------------------------
-    # 3. CÓDIGO FUENTE (La materia prima para el Parsing/IA)
-    # ---------------------------------------------------------
-    print("📜 3. Extrayendo CÓDIGO FUENTE de Stored Procedures...")
-    query_code = """
-    SELECT 
-        o.name AS [Nombre_Objeto],
-        o.type_desc AS [Tipo],
-        m.definition AS [Codigo_SQL]
-    FROM sys.sql_modules m
-    INNER JOIN sys.objects o ON m.object_id = o.object_id
-    WHERE o.type = 'P' -- Stored Procedures
-      AND (
-          m.definition LIKE '%od_%' 
-          OR m.definition LIKE '%XTMP_%'
-          OR m.definition LIKE '%INSERT INTO%'
-      )
-    """
-    df_code = pd.read_sql(query_code, conn)
-    
-    # Limpiamos saltos de línea para no romper el CSV
-    if not df_code.empty:
-        df_code['Codigo_SQL'] = df_code['Codigo_SQL'].str.replace('\r', ' ').str.replace('\n', ' ')
-    
-    df_code.to_csv(os.path.join(OUTPUT_DIR, "codigo_fuente.csv"), index=False)
-    print(f"   -> Guardado: codigo_fuente.csv ({len(df_code)} scripts extraídos)")
-
-    conn.close()
-    print("\n✅ PROCESO FINALIZADO CON ÉXITO.")
-    print(f"📂 Tus archivos están en: {OUTPUT_DIR}")
+    plan = None
+    if auto and not incremental:
+        # La configuración de la corrida la decide el plan previo
+        plan, _ = ejecutar_con_reintentos(pool, "plan", lambda conn: planificar_extraccion(conn, destino))
+        tam_lote = plan["recomendacion"]["tam_lote"]
+        workers = plan["recomendacion"]["workers"]
+        particiones_codigo = plan["recomendacion"]["particiones_codigo"]
+        pool.tamano = max(1, workers)
+        print(f"⚙️  Configuración del plan: tam_lote={tam_lote} | workers={workers} | particiones={particiones_codigo}")
+    elif not incremental and os.path.exists(destino.archivo_plan) and (
+            not os.path.exists(destino.archivo_telemetria)
+            or os.path.getmtime(destino.archivo_plan) > os.path.getmtime(destino.archivo_telemetria)):
+        # Un --plan hecho después de la última corrida: esta corrida es su "real"
+        with open(destino.archivo_plan, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+
+    marcas_previas = cargar_marcas_agua(destino) if incremental else None
+    if incremental and (marcas_previas is None or not raw_completo_disponible(directorio)):
+        print("⚠️  No hay marcas de agua o capa RAW previa: se ejecuta una extracción COMPLETA.")
+        incremental = False
+
+    # Catálogo liviano: sirve para comparar (incremental) y para dejar la marca de agua
+    print("🕒 0. Leyendo catálogo de objetos (fechas de creación/modificación)...")
+    catalogo_actual, _ = ejecutar_con_reintentos(pool, "catalogo", leer_catalogo_objetos)
+    print(f"   -> {len(catalogo_actual)} objetos en el catálogo")
+
+    extra = {}
+    if incremental:
+        ejecutar_con_reintentos(pool, "incremental",
+                                lambda conn: run_extraction_incremental(conn, marcas_previas, catalogo_actual,
+                                                                        destino))
+        print("📏 Actualizando volumen de tablas (siempre completo)...")
+        metricas = {"volumen": ejecutar_con_reintentos(
+            pool, "volumen", lambda conn: extraer_volumen_tablas(conn, tam_lote, directorio=directorio))[0]}
+        imprimir_metricas(metricas["volumen"])
+        modo = "incremental"
+    elif benchmark:
+        metricas, extra = run_benchmark(pool, tam_lote, workers, directorio, particiones_codigo)
+        modo = "benchmark"
+    else:
+        metricas = run_extraction_completa(pool, tam_lote, workers, codigo_completo, directorio,
+                                           particiones_codigo)
+        modo = "completa" if workers == 1 else f"completa_concurrente_{workers}"
+
+    if estadisticas_sp:
+        print("⏱️  Estadísticas de ejecución de SPs (sys.dm_exec_procedure_stats)...")
+        metricas["estadisticas_sp"] = ejecutar_con_reintentos(
+            pool, "estadisticas_sp", lambda conn: extraer_estadisticas_sp(conn, estadisticas_sp, destino, tam_lote))[0]
+        imprimir_metricas(metricas["estadisticas_sp"])
+
+    if modo != "benchmark":
+        # El código de esta base se publica en el almacén compartido de la capa RAW
+        inicio_almacen = time.perf_counter()
+        almacen, nuevos, filas = sincronizar_almacen(directorio, OUTPUT_DIR)
+        extra["almacen_codigo"] = {**almacen.resumen(), "cuerpos_nuevos": nuevos, "filas_leidas": filas,
+                                   "segundos": round(time.perf_counter() - inicio_almacen, 3)}
+        print(f"📦 Almacén de código: {nuevos} cuerpos nuevos de {filas} objetos "
+              f"({len(almacen)} únicos en total)")
+
+    guardar_marcas_agua(catalogo_actual, destino)
+    if destino.en_espacio:
+        # Se registra al final: un espacio sin destino.json no se lee aguas abajo
+        registrar_espacio_raw(directorio, destino.alias, destino.servidor, destino.base)
+    pool.cerrar()
+    if plan is not None and modo != "incremental":
+        extra["plan_vs_real"] = comparar_con_plan(plan, metricas, time.time() - inicio)
+    guardar_telemetria(destino, modo, metricas, time.time() - inicio, extra)
+    print(f"\n✅ PROCESO FINALIZADO CON ÉXITO. ({time.time() - inicio:.1f} s)")
+    print(f"📂 Tus archivos están en: {directorio}")
+
+def run_extraction_multibase(destinos, max_bases=MAX_BASES_DEFECTO, **opciones):
+    """
+    Extrae varias bases en paralelo (como máximo `max_bases` a la vez), cada una con su
+    propio pool de conexiones y su carpeta RAW_DIR/<alias>/ (tablas, marcas de agua,
+    telemetría). El tiempo de pared se acerca al de la base más lenta en vez de la suma.
+    Un error en una base no detiene a las demás; se informa en el resumen.
+    """
+    paralelas = max(1, min(max_bases, len(destinos)))
+    print(f"🌐 EXTRACCIÓN MULTI-BASE: {len(destinos)} bases ({paralelas} en paralelo)")
+    for d in destinos:
+        print(f"   • {d.alias}: {d.servidor}/{d.base}")
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    inicio = time.perf_counter()
+
+    def extraer(destino):
+        inicio_base = time.perf_counter()
+        try:
+            run_extraction(destino=destino, **opciones)
+            error = None
+        except Exception as e:
+            error = str(e)
+        return {
+            "servidor": destino.servidor,
+            "base_datos": destino.base,
+            "directorio": destino.directorio,
+            "estado": "ok" if error is None else "error",
+            "error": error,
+            "segundos": round(time.perf_counter() - inicio_base, 3)
+        }
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=paralelas) as executor:
+        futuros = {executor.submit(extraer, d): d for d in destinos}
+        for futuro in as_completed(futuros):
+            destino = futuros[futuro]
+            resultados[destino.alias] = futuro.result()
+            estado = "✔️ " if resultados[destino.alias]["estado"] == "ok" else "❌"
+            print(f"{estado} [{destino.alias}] {resultados[destino.alias]['segundos']:.1f} s")
+
+    segundos_pared = time.perf_counter() - inicio
+    suma = sum(r["segundos"] for r in resultados.values())
+    mas_lenta = max(resultados.values(), key=lambda r: r["segundos"])["segundos"]
+    fallidas = [a for a, r in resultados.items() if r["estado"] != "ok"]
+
+    print("\n📊 RESUMEN MULTI-BASE:")
+    for alias in sorted(resultados):
+        r = resultados[alias]
+        detalle = f" | {r['error']}" if r["error"] else ""
+        print(f"   • {alias:<25} {r['segundos']:>8.2f} s  {r['estado']}{detalle}")
+    print(f"   • Tiempo de pared: {segundos_pared:.2f} s | suma por base: {suma:.2f} s"
+          f" | base más lenta: {mas_lenta:.2f} s")
+
+    with open(ARCHIVO_TELEMETRIA_MULTIBASE, 'w', encoding='utf-8') as f:
+        json.dump({
+            "fecha_extraccion": datetime.now().isoformat(timespec='seconds'),
+            "max_bases": paralelas,
+            "segundos_pared": round(segundos_pared, 3),
+            "segundos_suma_bases": round(suma, 3),
+            "segundos_base_mas_lenta": mas_lenta,
+            "bases": {a: resultados[a] for a in sorted(resultados)}
+        }, f, indent=2, ensure_ascii=False)
+    print(f"📈 Telemetría multi-base guardada en: {ARCHIVO_TELEMETRIA_MULTIBASE}")
+
+    if fallidas:
+        raise RuntimeError(f"Fallaron {len(fallidas)} de {len(destinos)} bases: {', '.join(sorted(fallidas))}")
+
+def tareas_extraccion_completa(tam_lote=TAM_LOTE_DEFECTO, codigo_completo=False, directorio=OUTPUT_DIR,
+                               particiones_codigo=0, fabrica=get_connection):
+    """
+    Consultas independientes del catálogo: (clave, título, función(conn, medir_memoria) -> métricas).
+    El código fuente usa la extracción por huellas si ya existe una capa RAW con hashes;
+    si se descarga completo y particiones_codigo > 1, se parte por rangos de object_id.
+    """
+    def streaming(query, archivo, transformar=None):
+        return lambda conn, medir: extraer_en_streaming(conn, query, archivo, tam_lote, transformar,
+                                                        medir_memoria=medir, directorio=directorio)
+
+    def codigo(conn, medir):
+        hashes_previos = None if codigo_completo else cargar_hashes_codigo(directorio)
+        if hashes_previos is not None:
+            metricas = extraer_codigo_por_hash(conn, hashes_previos, directorio)
+        elif particiones_codigo > 1:
+            metricas = extraer_codigo_particionado(conn, fabrica, particiones_codigo, tam_lote, directorio)
+            actualizar_indice_hashes(directorio)
+        else:
+            # El código se guarda tal cual (saltos de línea incluidos), lote a lote
+            metricas = extraer_en_streaming(conn, QUERY_CODIGO.format(filtro=""), TABLA_CODIGO, tam_lote,
+                                            medir_memoria=medir, directorio=directorio)
+            actualizar_indice_hashes(directorio)
+        return metricas
+
+    return [
+        # 1. DICCIONARIO DE DATOS (Estructura de Tablas)
+        ("columnas", "📊 Estructura de tablas (Columnas y Tipos)",
+         streaming(QUERY_COLUMNAS.format(filtro=""), TABLA_COLUMNAS)),
+        # 2. DEPENDENCIAS DEL SISTEMA
+        ("dependencias", "🔗 Dependencias oficiales (Relaciones conocidas)",
+         streaming(QUERY_DEPENDENCIAS.format(filtro=""), TABLA_DEPENDENCIAS)),
+        ("dependencias_columnas", "🧬 Dependencias por columna (lectura/escritura)",
+         streaming(QUERY_DEPENDENCIAS_COLUMNAS.format(filtro=""), TABLA_DEPENDENCIAS_COLUMNAS)),
+        # 3. CÓDIGO FUENTE (La materia prima para el Parsing/IA)
+        ("codigo", "📜 CÓDIGO FUENTE de SPs, vistas, funciones y triggers", codigo),
+        # 4. VOLUMEN (filas y bytes por tabla, para pesar el linaje)
+        ("volumen", "📏 Volumen de tablas (filas y bytes reservados)",
+         lambda conn, medir: extraer_volumen_tablas(conn, tam_lote, medir, directorio)),
+    ]
+
+def run_extraction_completa(pool, tam_lote=TAM_LOTE_DEFECTO, workers=WORKERS_DEFECTO, codigo_completo=False,
+                            directorio=OUTPUT_DIR, particiones_codigo=0):
+    """
+    Descarga completa de columnas, dependencias y código fuente (en streaming).
+    Con workers > 1 las consultas corren en paralelo, cada una con su conexión del pool,
+    y el tiempo total se acerca al de la consulta más lenta en vez de la suma.
+    """
+    tareas = tareas_extraccion_completa(tam_lote, codigo_completo, directorio, particiones_codigo, pool.fabrica)
+    concurrente = workers > 1
+    metricas = {}
+
+    def ejecutar(tarea):
+        clave, titulo, funcion = tarea
+        resultado, intentos = ejecutar_con_reintentos(
+            pool, clave, lambda conn: funcion(conn, not concurrente))
+        resultado["intentos"] = intentos
+        return resultado
+
+    if not concurrente:
+        for i, tarea in enumerate(tareas, 1):
+            print(f"{i}. Extrayendo {tarea[1]}...")
+            metricas[tarea[0]] = ejecutar(tarea)
+            imprimir_metricas(metricas[tarea[0]])
+        return metricas
+
+    print(f"⚡ Extrayendo {len(tareas)} consultas en paralelo ({min(workers, len(tareas))} workers)...")
+    with ThreadPoolExecutor(max_workers=min(workers, len(tareas))) as executor:
+        futuros = {executor.submit(ejecutar, tarea): tarea for tarea in tareas}
+        for futuro in as_completed(futuros):
+            clave, titulo = futuros[futuro][:2]
+            metricas[clave] = futuro.result()
+            print(f"✔️  {titulo}")
+            imprimir_metricas(metricas[clave])
+    
+    # Orden estable en la telemetría
+    return {t[0]: metricas[t[0]] for t in tareas}
+
+def run_benchmark(pool, tam_lote=TAM_LOTE_DEFECTO, workers=WORKERS_DEFECTO, directorio=OUTPUT_DIR,
+                  particiones_codigo=0):
+    """
+    Compara el tiempo de pared de la extracción completa en serie vs concurrente.
+    Ambas corridas descargan el código completo (sin huellas) para que sean comparables;
+    la concurrente además lo parte por rangos de object_id si particiones_codigo > 1.
+    """
+    print("\n🏁 BENCHMARK: extracción en serie (1 worker)")
+    inicio = time.perf_counter()
+    metricas_serie = run_extraction_completa(pool, tam_lote, workers=1, codigo_completo=True,
+                                             directorio=directorio)
+    segundos_serie = time.perf_counter() - inicio
+
+    print(f"\n🏁 BENCHMARK: extracción concurrente ({workers} workers)")
+    inicio = time.perf_counter()
+    metricas_concurrente = run_extraction_completa(pool, tam_lote, workers=workers, codigo_completo=True,
+                                                   directorio=directorio, particiones_codigo=particiones_codigo)
+    segundos_concurrente = time.perf_counter() - inicio
+
+    aceleracion = segundos_serie / segundos_concurrente if segundos_concurrente > 0 else None
+    print("\n📊 RESULTADO DEL BENCHMARK:")
+    print(f"   • Serie:       {segundos_serie:.2f} s (suma de consultas)")
+    print(f"   • Concurrente: {segundos_concurrente:.2f} s ({workers} workers)")
+    if aceleracion:
+        print(f"   • Aceleración: x{aceleracion:.2f}")
+
+    return metricas_concurrente, {
+        "benchmark": {
+            "workers": workers,
+            "particiones_codigo": particiones_codigo,
+            "segundos_serie": round(segundos_serie, 3),
+            "segundos_concurrente": round(segundos_concurrente, 3),
+            "aceleracion": round(aceleracion, 2) if aceleracion else None,
+            "consultas_serie": metricas_serie
+        }
+    }
+
+def run_extraction_incremental(conn, marcas_previas, catalogo_actual, destino):
+    """
+    Descarga solo los objetos nuevos/modificados y elimina los borrados,
+    fusionando el resultado con la capa RAW existente.
+    """
+    print("🔍 Comparando contra la marca de agua anterior...")
+    cambios = detectar_cambios(marcas_previas, catalogo_actual)
+    total = reportar_cambios(cambios, destino)
+    directorio = destino.directorio
+    if total == 0:
+        return
+
+    # Objetos a (re)descargar y nombres a quitar de la capa RAW
+    ids_tablas = [i for grupo in ("nuevos", "modificados") for i, _, _ in cambios["U"][grupo]]
+    ids_sps = [i for t in TIPOS_MODULO for grupo in ("nuevos", "modificados") for i, _, _ in cambios[t][grupo]]
+    
+    def nombres_a_quitar(*tipos):
+        # Incluimos los "nuevos" por si un objeto se recreó con el mismo nombre
+        nombres = set()
+        for tipo in tipos:
+            for grupo in ("nuevos", "modificados", "eliminados"):
+                for _, nombre, nombre_anterior in cambios[tipo][grupo]:
+                    nombres.update(n for n in (nombre, nombre_anterior) if n)
+        return nombres
+
+    print(f"📊 1. Columnas de {len(ids_tablas)} tablas nuevas/modificadas...")
+    df_cols = leer_por_lotes_de_ids(conn, QUERY_COLUMNAS, "t.object_id", ids_tablas)
+    total_cols = fusionar_raw(TABLA_COLUMNAS, "Tabla", nombres_a_quitar("U"), df_cols, directorio)
+    print(f"   -> Fusionado: {TABLA_COLUMNAS} ({total_cols} columnas)")
+
+    print(f"🔗 2. Dependencias de {len(ids_sps)} SPs/vistas/funciones/triggers nuevos/modificados...")
+    df_deps = leer_por_lotes_de_ids(conn, QUERY_DEPENDENCIAS, "d.referencing_id", ids_sps)
+    total_deps = fusionar_raw(TABLA_DEPENDENCIAS, "Origen_SP", nombres_a_quitar(*TIPOS_MODULO), df_deps, directorio)
+    print(f"   -> Fusionado: {TABLA_DEPENDENCIAS} ({total_deps} relaciones)")
+
+    print(f"🧬 2b. Dependencias por columna de los mismos objetos...")
+    df_deps_cols = leer_por_lotes_de_ids(conn, QUERY_DEPENDENCIAS_COLUMNAS, "o.object_id", ids_sps)
+    total_deps_cols = fusionar_raw(TABLA_DEPENDENCIAS_COLUMNAS, "Origen_SP", nombres_a_quitar(*TIPOS_MODULO),
+                                   df_deps_cols, directorio)
+    print(f"   -> Fusionado: {TABLA_DEPENDENCIAS_COLUMNAS} ({total_deps_cols} columnas referenciadas)")
+
+    print(f"📜 3. Código fuente de {len(ids_sps)} SPs/vistas/funciones/triggers nuevos/modificados...")
+    df_code = leer_por_lotes_de_ids(conn, QUERY_CODIGO, "o.object_id", ids_sps)
+    total_code = fusionar_raw(TABLA_CODIGO, "Nombre_Objeto", nombres_a_quitar(*TIPOS_MODULO), df_code, directorio)
+    actualizar_indice_hashes(directorio)
+    print(f"   -> Fusionado: {TABLA_CODIGO} ({total_code} scripts)")
+
+# ==============================================
+# 10. PLAN PREVIO (--plan / --auto)
+# ==============================================
+# Antes de una descarga grande: conteos y DATALENGTH sobre los mismos FROM/WHERE de
+# la extracción (sin transferir filas), una estimación de MB y segundos por consulta
+# y una recomendación de tam_lote / workers / particiones. El plan queda junto a la
+# telemetría y la corrida siguiente lo compara con lo real.
+QUERY_PLAN_COLUMNAS = "SELECT COUNT(*) AS [Filas], COUNT(DISTINCT t.object_id) AS [Tablas]" + FROM_COLUMNAS
+QUERY_PLAN_DEPENDENCIAS = ("SELECT RTRIM(o.type) AS [Tipo], COUNT(*) AS [Filas]" + FROM_DEPENDENCIAS
+                           + "GROUP BY RTRIM(o.type)")
+# Se cuentan los grupos, no las filas de las dos fuentes: es lo que trae la extracción
+QUERY_PLAN_DEPENDENCIAS_COLUMNAS = ("SELECT COUNT(*) AS [Filas] FROM (SELECT 1 AS Grupo" + FROM_DEPENDENCIAS_COLUMNAS
+                                    + GROUP_DEPENDENCIAS_COLUMNAS + ") g")
+QUERY_PLAN_CODIGO = """
+SELECT 
+    RTRIM(o.type) AS [Tipo],
+    COUNT(*) AS [Filas],
+    SUM(CAST(DATALENGTH(m.definition) AS BIGINT)) AS [Bytes],
+    MAX(CAST(DATALENGTH(m.definition) AS BIGINT)) AS [Bytes_Max]
+FROM sys.sql_modules m
+INNER JOIN sys.objects o ON m.object_id = o.object_id
+""" + WHERE_CODIGO + """
+GROUP BY RTRIM(o.type)
+"""
+
+# Bytes aproximados por fila de las consultas tabulares (nombres + tipos cortos)
+BYTES_FILA_ESTIMADOS = {"columnas": 120, "dependencias": 160, "dependencias_columnas": 140, "volumen": 80}
+# Rendimiento supuesto si no hay telemetría previa de esta base
+FILAS_POR_SEG_DEFECTO = 20000
+MB_POR_SEG_CODIGO_DEFECTO = 5.0
+# Criterios de la recomendación
+MB_POR_LOTE_OBJETIVO = 16        # Memoria por lote de fetchmany en el código
+MB_POR_PARTICION = 128           # Por encima, el código se parte en rangos de object_id
+MAX_PARTICIONES_PLAN = 8
+SEGUNDOS_MIN_PARALELO = 10       # Por debajo, abrir más conexiones no compensa
+LOTE_MIN, LOTE_MAX = 100, 20000
+
+def rendimiento_previo(destino):
+    """Filas/s por consulta de la última corrida completa de esta base ({} si no hay)"""
+    if not os.path.exists(destino.archivo_telemetria):
+        return {}
+    with open(destino.archivo_telemetria, 'r', encoding='utf-8') as f:
+        telemetria = json.load(f)
+    if not str(telemetria.get("modo", "")).startswith("completa"):
+        return {}
+    return {clave: m["filas_por_segundo"] for clave, m in telemetria.get("consultas", {}).items()
+            if m.get("filas_por_segundo") and m.get("modo_codigo") != "hash"}
+
+def estimar_extraccion(conn, destino):
+    """Conteos y bytes por consulta (y por tipo de objeto) con consultas de agregación"""
+    cols = pd.read_sql(QUERY_PLAN_COLUMNAS, conn).iloc[0]
+    deps = pd.read_sql(QUERY_PLAN_DEPENDENCIAS, conn)
+    deps_cols = pd.read_sql(QUERY_PLAN_DEPENDENCIAS_COLUMNAS, conn).iloc[0]
+    codigo = pd.read_sql(QUERY_PLAN_CODIGO, conn).fillna(0)
+
+    filas = {
+        "columnas": int(cols["Filas"]),
+        "dependencias": int(deps["Filas"].sum()),
+        "dependencias_columnas": int(deps_cols["Filas"]),
+        "volumen": int(cols["Tablas"]),
+    }
+    consultas = {clave: {"filas": n, "mb": round(n * BYTES_FILA_ESTIMADOS[clave] / 1024 ** 2, 3)}
+                 for clave, n in filas.items()}
+    consultas["dependencias"]["por_tipo"] = dict(zip(deps["Tipo"], deps["Filas"].astype(int).tolist()))
+    consultas["codigo"] = {
+        "filas": int(codigo["Filas"].sum()),
+        "mb": round(codigo["Bytes"].sum() / 1024 ** 2, 3),
+        "mb_objeto_mas_grande": round(codigo["Bytes_Max"].max() / 1024 ** 2, 3) if len(codigo) else 0.0,
+        "por_tipo": {t: {"objetos": int(n), "mb": round(b / 1024 ** 2, 3)}
+                     for t, n, b in zip(codigo["Tipo"], codigo["Filas"], codigo["Bytes"])}
+    }
+
+    # Segundos: filas/s de la última corrida de esta base, o supuestos por defecto
+    previo = rendimiento_previo(destino)
+    for clave, consulta in consultas.items():
+        if clave in previo:
+            consulta["segundos"] = round(consulta["filas"] / previo[clave], 2)
+        elif clave == "codigo":
+            consulta["segundos"] = round(consulta["mb"] / MB_POR_SEG_CODIGO_DEFECTO, 2)
+        else:
+            consulta["segundos"] = round(consulta["filas"] / FILAS_POR_SEG_DEFECTO, 2)
+    return consultas, ("telemetria_previa" if previo else "supuestos_por_defecto")
+
+def recomendar_configuracion(consultas):
+    """tam_lote, workers y particiones para la corrida real, con el motivo de cada uno"""
+    codigo = consultas["codigo"]
+    bytes_promedio = codigo["mb"] * 1024 ** 2 / codigo["filas"] if codigo["filas"] else 0
+    if bytes_promedio:
+        tam_lote = int(MB_POR_LOTE_OBJETIVO * 1024 ** 2 / bytes_promedio) // 100 * 100
+    else:
+        tam_lote = TAM_LOTE_DEFECTO
+    tam_lote = max(LOTE_MIN, min(LOTE_MAX, tam_lote))
+
+    particiones = 0
+    if codigo["mb"] > MB_POR_PARTICION:
+        particiones = min(MAX_PARTICIONES_PLAN, -(-int(codigo["mb"]) // MB_POR_PARTICION))
+
+    segundos_serie = sum(c["segundos"] for c in consultas.values())
+    workers = 1 if segundos_serie < SEGUNDOS_MIN_PARALELO else len(consultas)
+    segundos_codigo = codigo["segundos"] / particiones if particiones > 1 else codigo["segundos"]
+    segundos_paralelo = max([segundos_codigo] + [c["segundos"] for k, c in consultas.items() if k != "codigo"])
+
+    return {
+        "tam_lote": tam_lote,
+        "workers": workers,
+        "particiones_codigo": particiones,
+        "segundos_estimados": round(segundos_serie if workers == 1 else segundos_paralelo, 2),
+        "motivos": [
+            f"tam_lote {tam_lote}: ~{MB_POR_LOTE_OBJETIVO} MB por lote con {bytes_promedio / 1024:,.1f} KB por objeto",
+            f"workers {workers}: {segundos_serie:,.1f} s estimados en serie"
+            + (" (no compensa paralelizar)" if workers == 1 else f" -> ~{segundos_paralelo:,.1f} s en paralelo"),
+            f"particiones {particiones}: {codigo['mb']:,.1f} MB de código"
+            + (f" (> {MB_POR_PARTICION} MB)" if particiones else f" (<= {MB_POR_PARTICION} MB, una consulta)"),
+        ]
+    }
+
+def planificar_extraccion(conn, destino):
+    """Arma el plan, lo imprime y lo guarda junto a la telemetría de la base"""
+    inicio = time.perf_counter()
+    consultas, base_estimacion = estimar_extraccion(conn, destino)
+    recomendacion = recomendar_configuracion(consultas)
+    plan = {
+        "fecha_plan": datetime.now().isoformat(timespec='seconds'),
+        "servidor": destino.servidor,
+        "base_datos": destino.base,
+        "segundos_plan": round(time.perf_counter() - inicio, 3),
+        "estimacion_basada_en": base_estimacion,
+        "mb_totales": round(sum(c["mb"] for c in consultas.values()), 3),
+        "consultas": consultas,
+        "recomendacion": recomendacion
+    }
+
+    print(f"📐 PLAN DE EXTRACCIÓN [{destino.alias}] ({plan['segundos_plan']:.2f} s, base: {base_estimacion})")
+    for clave, c in consultas.items():
+        print(f"   • {clave:<22} {c['filas']:>10,} filas | {c['mb']:>9,.2f} MB | ~{c['segundos']:,.1f} s")
+    for tipo, c in consultas["codigo"]["por_tipo"].items():
+        print(f"       código {tipo:<3} {c['objetos']:>8,} objetos | {c['mb']:>9,.2f} MB")
+    print(f"   💾 Total estimado: {plan['mb_totales']:,.1f} MB | ~{recomendacion['segundos_estimados']:,.1f} s")
+    for motivo in recomendacion["motivos"]:
+        print(f"   💡 {motivo}")
+
+    with open(destino.archivo_plan, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    print(f"📝 Plan guardado en: {destino.archivo_plan}")
+    return plan
+
+def comparar_con_plan(plan, metricas, segundos_totales):
+    """Estimado vs real por consulta (filas y segundos) para calibrar los supuestos"""
+    comparacion = {"segundos_estimados": plan["recomendacion"]["segundos_estimados"],
+                   "segundos_reales": round(segundos_totales, 3), "consultas": {}}
+    for clave, estimado in plan["consultas"].items():
+        if clave in metricas:
+            comparacion["consultas"][clave] = {
+                "filas_estimadas": estimado["filas"], "filas_reales": metricas[clave]["filas"],
+                "segundos_estimados": estimado["segundos"], "segundos_reales": metricas[clave]["segundos"]
+            }
+    print(f"📐 Plan vs real: ~{comparacion['segundos_estimados']:,.1f} s estimados | "
+          f"{comparacion['segundos_reales']:,.1f} s reales")
+    return comparacion
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extracción del catálogo SQL Server a la capa RAW")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Descarga solo objetos nuevos/modificados/eliminados según las marcas de agua")
+    parser.add_argument("--tam-lote", type=int, default=TAM_LOTE_DEFECTO,
+                        help=f"Filas por lote en la extracción en streaming (defecto: {TAM_LOTE_DEFECTO})")
+    parser.add_argument("--workers", type=int, default=WORKERS_DEFECTO,
+                        help=f"Conexiones/consultas en paralelo (defecto: {WORKERS_DEFECTO}; 1 = en serie)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Ejecuta la extracción completa en serie y en paralelo y compara tiempos")
+    parser.add_argument("--codigo-completo", action="store_true",
+                        help="Descarga todo el código fuente aunque existan huellas (HASHBYTES) previas")
+    parser.add_argument("--particiones-codigo", type=int, default=0,
+                        help="Descarga completa del código en N rangos de object_id en paralelo (0 = una consulta)")
+    parser.add_argument("--fuente", default=os.getenv("LINAJE_FUENTE") or "sqlserver",
+                        help="Origen del catálogo: 'sqlserver' o 'sqlite:<archivo.db|carpeta>' (stand-in local)")
+    parser.add_argument("--estadisticas-sp", action="store_true",
+                        help="Además baja ejecuciones, tiempos y lecturas por SP de sys.dm_exec_procedure_stats")
+    parser.add_argument("--estadisticas-sp-csv", metavar="RUTA",
+                        help="Igual que --estadisticas-sp pero desde un CSV exportado (offline)")
+    parser.add_argument("--plan", action="store_true",
+                        help="Solo estima filas/MB/tiempo por consulta y recomienda tam_lote, workers y particiones")
+    parser.add_argument("--auto", action="store_true",
+                        help="Calcula el plan previo y extrae con la configuración que recomienda")
+    parser.add_argument("--destinos", default=DESTINOS,
+                        help="Varias bases: 'servidor/base=alias,base2' (defecto: SQL_DESTINOS del .env)")
+    parser.add_argument("--max-bases", type=int, default=MAX_BASES_DEFECTO,
+                        help=f"Bases extraídas en paralelo en modo multi-base (defecto: {MAX_BASES_DEFECTO})")
+    args = parser.parse_args()
+    FUENTE = crear_fuente(args.fuente, SERVER, DATABASE, USERNAME, PASSWORD)
+    validar_configuracion(FUENTE, args.destinos)
+    print(f"🗄️  Fuente del catálogo: {FUENTE.descripcion()}")
+    opciones = dict(incremental=args.incremental, tam_lote=args.tam_lote, workers=args.workers,
+                    benchmark=args.benchmark, codigo_completo=args.codigo_completo,
+                    particiones_codigo=args.particiones_codigo,
+                    estadisticas_sp=args.estadisticas_sp_csv or args.estadisticas_sp, auto=args.auto)
     try:
-        run_extraction()
+        if args.plan:
+            for destino in (parsear_destinos(args.destinos) if args.destinos else [Destino(SERVER, DATABASE)]):
+                conn = destino.conectar()
+                try:
+                    planificar_extraccion(conn, destino)
+                finally:
+                    conn.close()
+        elif args.destinos:
+            run_extraction_multibase(parsear_destinos(args.destinos), args.max_bases, **opciones)
+        else:
+            run_extraction(**opciones)
     except Exception as e:
         print(f"\n❌ ERROR CRÍTICO: {e}")
-        print("Verifica tu VPN y las credenciales en config/.env")
\ No newline at end of file
+        if FUENTE.tipo == "sqlserver":
+            print("Verifica tu VPN y las credenciales en config/.env")
\ No newline at end of file
@@ -5,8 +5,10 @@ import pandas as pd
 import networkx as nx
 import os
 import sys
+import argparse
 import sqlglot
-from sqlglot import exp
+from collections import deque
+from datetime import datetime
 
 # ==============================================
 # 1. CONFIGURACIÓN DE RUTAS (NUEVO)
@@ -19,7 +21,14 @@ src_dir = os.path.dirname(current_dir)
 sys.path.append(src_dir)
 
 # Importamos las rutas maestras
-from config_paths import RAW_DIR, PROCESSED_DIR
+from config_paths import RAW_DIR, PROCESSED_DIR, CACHE_DIR, TELEMETRIA_DIR
+from capa_datos import (cargar_tabla_raw, existe_tabla_raw, guardar_tabla, cargar_tabla, existe_tabla,
+                        espacios_raw, mapa_alias_por_base, ruta_existente)
+from almacen_codigo import cargar_indice_codigo
+from analisis_sql import (analizar_huellas, aristas_de_referencias, temporales_de_referencias,
+                          sql_dinamico_de_referencias, TIPOS_CONSULTA, TAM_BLOQUE_DEFECTO,
+                          SEGUNDOS_SENTENCIA_DEFECTO, CARACTERES_SENTENCIA_DEFECTO, VERSION_EXTRACTOR)
+from cache_parsing import CacheParsing, CACHE_DIAS_DEFECTO, CACHE_MB_DEFECTO
 
 # Asignamos las rutas importadas a las variables locales
 INPUT_DIR = RAW_DIR
@@ -31,117 +40,663 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # ==============================================
 # 2. CARGA DE INSUMOS
 # ==============================================
-print(f"🧠 Iniciando análisis de lógica SQL...")
-print(f"📂 Leyendo datos desde: {INPUT_DIR}")
+def cargar_insumos():
+    """dependencias_sql y el índice de codigo_fuente (sin texto: el código se lee del almacén)"""
+    print(f"🧠 Iniciando análisis de lógica SQL...")
+    print(f"📂 Leyendo datos desde: {INPUT_DIR}")
+    if ESPACIOS:
+        print(f"🌐 Capa RAW multi-base: {', '.join(e['alias'] for e in ESPACIOS)}")
 
-# Cargamos dependencias y código fuente
-try:
-    df_deps = pd.read_csv(os.path.join(INPUT_DIR, "dependencias_sql.csv"))
-    df_code = pd.read_csv(os.path.join(INPUT_DIR, "codigo_fuente.csv"))
-except FileNotFoundError as e:
-    print(f"❌ Error crítico: No se encontraron los archivos en {INPUT_DIR}")
-    print(f"   Detalle: {e}")
-    exit()
+    # Cargamos dependencias y código fuente
+    try:
+        df_deps = cargar_tabla_raw(INPUT_DIR, "dependencias_sql")
+        df_code, _ = cargar_indice_codigo(INPUT_DIR)
+    except FileNotFoundError as e:
+        print(f"❌ Error crítico: No se encontraron los archivos en {INPUT_DIR}")
+        print(f"   Detalle: {e}")
+        exit()
+
+    # Extracciones antiguas no traen Tipo_Origen/Tipo_Codigo: todo origen es un SP.
+    for columna in ("Tipo_Origen", "Tipo_Destino"):
+        if columna not in df_deps.columns:
+            df_deps[columna] = None
+    return df_deps, df_code
+
+# Capa RAW multi-base: los nodos usan nombres calificados base.esquema.objeto
+ESPACIOS = espacios_raw(INPUT_DIR)
+ALIAS_POR_BASE = mapa_alias_por_base(ESPACIOS) if ESPACIOS else None
+
+# Tipo de nodo según el tipo de objeto del catálogo (sys.objects.type).
+TIPOS_NODO = {"P": "StoredProcedure", "V": "Vista", "FN": "Funcion", "IF": "Funcion",
+              "TF": "Funcion", "TR": "Trigger", "U": "Tabla"}
 
-# Inicializamos el Grafo Dirigido (DiGraph)
-G = nx.DiGraph()
+def tipo_nodo(tipo_objeto, defecto):
+    return TIPOS_NODO.get(tipo_objeto, defecto) if pd.notna(tipo_objeto) else defecto
 
 # ==============================================
 # PASO 1: CARGAR EL ESQUELETO (Dependencias Oficiales)
 # ==============================================
-# Como SQL Server no nos dijo si era lectura/escritura, por defecto
-# asumiremos una relación genérica "USA" (luego la refinaremos).
-for _, row in df_deps.iterrows():
-    sp = row['Origen_SP']
-    tabla = row['Destino_Tabla']
-    # Nodo SP (Proceso)
-    G.add_node(sp, tipo="StoredProcedure", color="red")
-    # Nodo Tabla (Dato)
-    G.add_node(tabla, tipo="Tabla", color="blue")
-    # Arista (Relación preliminar)
-    G.add_edge(sp, tabla, relacion="USA")
+def construir_esqueleto(df_deps, df_code, G=None, objetos=None):
+    """
+    Nodos y aristas del catálogo. Con `G` y `objetos` (modo incremental) agrega al
+    grafo existente solo lo de esos objetos: df_deps y df_code ya vienen filtrados.
+    """
+    # Inicializamos el Grafo Dirigido (DiGraph)
+    if G is None:
+        G = nx.DiGraph()
+
+    # Como SQL Server no nos dijo si era lectura/escritura, por defecto
+    # asumiremos una relación genérica "USA" (luego la refinaremos).
+    for _, row in df_deps.iterrows():
+        sp = row['Origen_SP']
+        tabla = row['Destino_Tabla']
+        tipo_origen = row['Tipo_Origen']
+        # Nodo SP (Proceso): también vistas, funciones y triggers
+        G.add_node(sp, tipo=tipo_nodo(tipo_origen, "StoredProcedure"), color="red")
+        # Nodo Tabla (Dato), o la vista/función referenciada
+        if tabla not in G or G.nodes[tabla].get("tipo") == "Tabla":
+            G.add_node(tabla, tipo=tipo_nodo(row['Tipo_Destino'], "Tabla"), color="blue")
+        # Arista (Relación preliminar). Una vista o función solo lee lo que referencia
+        if pd.notna(tipo_origen) and tipo_origen in TIPOS_CONSULTA:
+            G.add_edge(tabla, sp, relacion="LEE")
+        else:
+            G.add_edge(sp, tabla, relacion="USA")
+
+    # Triggers: la tabla sobre la que se definen los dispara
+    for _, row in df_code[df_code['Tipo_Codigo'] == "TR"].iterrows():
+        if pd.notna(row['Objeto_Padre']):
+            G.add_node(row['Nombre_Objeto'], tipo="Trigger", color="red")
+            G.add_node(row['Objeto_Padre'], tipo="Tabla", color="blue")
+            G.add_edge(row['Objeto_Padre'], row['Nombre_Objeto'], relacion="DISPARA")
+
+    # Dirección desde el catálogo: si SQL Server registró las columnas que el objeto lee
+    # (is_selected) o escribe (is_updated), la relación "USA" ya se puede orientar
+    if existe_tabla_raw(INPUT_DIR, "dependencias_columnas"):
+        df_deps_cols = cargar_tabla_raw(INPUT_DIR, "dependencias_columnas",
+                                        columnas=["Origen_SP", "Destino_Tabla", "Es_Leida", "Es_Escrita"])
+        if objetos is not None:
+            df_deps_cols = df_deps_cols[df_deps_cols["Origen_SP"].isin(objetos)]
+        direccion = df_deps_cols.groupby(["Origen_SP", "Destino_Tabla"])[["Es_Leida", "Es_Escrita"]].max()
+        orientadas = 0
+        for (sp, tabla), flags in direccion.iterrows():
+            if not G.has_edge(sp, tabla) or G.edges[sp, tabla].get("relacion") != "USA":
+                continue
+            if flags["Es_Escrita"] == 1:
+                G.edges[sp, tabla]["relacion"] = "ESCRIBE"
+                orientadas += 1
+            elif flags["Es_Leida"] == 1:
+                G.remove_edge(sp, tabla)
+                G.add_edge(tabla, sp, relacion="LEE")
+                orientadas += 1
+        print(f"   🧬 Relaciones orientadas por dependencias de columna: {orientadas}")
 
-print(f"   ✅ Estructura base cargada: {G.number_of_nodes()} nodos.")
+    print(f"   ✅ Estructura base cargada: {G.number_of_nodes()} nodos.")
+    return G
 
 # ==============================================
 # PASO 2: PARSING INTELIGENTE (Detectar XTMP y Dirección)
 # ==============================================
-print("🕵️‍♂️  Analizando código fuente con SQLGlot para detectar flujo...")
+def aplicar_aristas(G, aristas):
+    """Aplica al grafo las aristas de analizar_codigo_sp, en su orden"""
+    for origen, destino, relacion, temporal, dinamico in aristas:
+        if relacion == "LEE" and G.has_edge(origen, destino) and G.edges[origen, destino].get("relacion") == "DISPARA":
+            # Un trigger que lee inserted/deleted lee su tabla padre: la arista DISPARA ya lo dice
+            continue
+        if dinamico and not G.has_edge(origen, destino):
+            # Solo el SQL dinámico la da: el catálogo y el código estático no la ven
+            G.add_edge(origen, destino, relacion=relacion, dinamico=True)
+        else:
+            G.add_edge(origen, destino, relacion=relacion)
+        if relacion == "EJECUTA" and "tipo" not in G.nodes[destino]:
+            # Procedimiento llamado que el catálogo no trajo como nodo
+            G.add_node(destino, tipo="StoredProcedure", color="red")
+        if temporal:
+            # La XTMP es el destino de una escritura o el origen de una lectura
+            G.add_node(destino if relacion == "ESCRIBE" else origen, tipo="Temporal", color="orange")
 
-def analizar_codigo_sp(nombre_sp, codigo_sql):
-    try:
-        # Parseamos el SQL (Transact-SQL)
-        parsed = sqlglot.parse(codigo_sql, read="tsql")
-        
-        # Buscamos todas las sentencias dentro del código
-        for expression in parsed:
-            
-            # 2.1 DETECTAR ESCRITURAS (INSERT / UPDATE)
-            # Buscamos tablas destino
-            for table in expression.find_all(exp.Table):
-                nombre_tabla = table.name
-                
-                # Verificar si esta tabla está en un contexto de escritura
-                # (Esto es una simplificación para el MVP, en prod se navega el árbol)
-                padre = table.parent
-                es_escritura = False
-                
-                while padre:
-                    if isinstance(padre, (exp.Insert, exp.Update, exp.Create)):
-                        es_escritura = True
-                        break
-                    padre = padre.parent
-                
-                if es_escritura:
-                    # FLUJO: SP -> TABLA
-                    G.add_edge(nombre_sp, nombre_tabla, relacion="ESCRIBE")
-                    if "XTMP" in nombre_tabla:
-                        G.add_node(nombre_tabla, tipo="Temporal", color="orange")
-                
-                else:
-                    # FLUJO: TABLA -> SP (Lectura)
-                    # Solo si está en un FROM o JOIN
-                    padre = table.parent
-                    while padre:
-                        if isinstance(padre, (exp.Select, exp.Join)):
-                            G.add_edge(nombre_tabla, nombre_sp, relacion="LEE")
-                            if "XTMP" in nombre_tabla:
-                                G.add_node(nombre_tabla, tipo="Temporal", color="orange")
-                            break
-                        padre = padre.parent
-
-    except Exception as e:
-        # Si falla el parser (común en T-SQL complejo), seguimos
-        pass
-
-# Iteramos sobre cada SP y leemos su código
-count = 0
-for _, row in df_code.iterrows():
-    sp_name = row['Nombre_Objeto']
-    sql_text = row['Codigo_SQL']
-    
-    if pd.notna(sql_text):
-        analizar_codigo_sp(sp_name, sql_text)
-        count += 1
-
-print(f"   ✅ Código analizado en {count} procedimientos.")
+def analizar_codigo(G, df_code, workers=None, tam_bloque=TAM_BLOQUE_DEFECTO, cache=None,
+                    segundos_sentencia=SEGUNDOS_SENTENCIA_DEFECTO, max_caracteres=CARACTERES_SENTENCIA_DEFECTO,
+                    anotar_temporales=False, telemetria_previa=None):
+    """
+    Parsea el código de cada objeto en un pool de procesos y funde las aristas en G.
+    Con `cache` solo se parsean las huellas que no estén cacheadas para esta versión.
+    Las sentencias que pasan del presupuesto de tiempo o tamaño se saltan y quedan
+    en reports/telemetria/presupuesto_parseo.csv; el resto del objeto sí se usa.
+    Las #temporales y variables de tabla no son nodos; con `anotar_temporales` el
+    objeto las lista en su atributo "temporales". Un objeto con SQL dinámico lleva
+    sql_dinamico_sitios y sql_dinamico_pendientes (los sitios que no se pudieron plegar).
+    Retorna (métricas, telemetría por objeto); ver registro_telemetria.
+    """
+    print("🕵️‍♂️  Analizando código fuente con SQLGlot para detectar flujo...")
+    objetos = [(n, h, t if pd.notna(t) else None) for n, h, t in
+               zip(df_code['Nombre_Objeto'], df_code['Hash_Definicion'], df_code['Tipo_Codigo'])
+               if pd.notna(h)]
+
+    # Cada cuerpo distinto se resuelve una vez: de la caché o parseándolo
+    referencias_por_hash = {}
+    pendientes = []
+    for _, hash_def, _ in objetos:
+        if hash_def in referencias_por_hash:
+            continue
+        referencias = cache.obtener(hash_def) if cache is not None else None
+        if referencias is None:
+            referencias_por_hash[hash_def] = None
+            pendientes.append(hash_def)
+        else:
+            referencias_por_hash[hash_def] = referencias
+    parseadas, metricas, incidencias, medidas = analizar_huellas(pendientes, INPUT_DIR, workers, tam_bloque,
+                                                                 segundos_sentencia, max_caracteres)
+    referencias_por_hash.update(parseadas)
+    if cache is not None:
+        # Un resultado parcial por presupuesto no se cachea: con otro presupuesto puede completarse.
+        # Los errores del parser sí, porque se repiten igual.
+        parciales = {i["hash"] for i in incidencias if i["motivo"] != "error"}
+        for hash_def, referencias in parseadas.items():
+            if hash_def not in parciales:
+                cache.agregar(hash_def, referencias)
+
+    # Un cuerpo que vino de la caché conserva la medición de la corrida que lo parseó
+    previas_por_hash = {}
+    if telemetria_previa is not None:
+        previas_por_hash = {fila["Hash_Definicion"]: fila for fila in telemetria_previa.to_dict("records")}
+
+    # Se funden en el orden de codigo_fuente: mismo grafo que en serie
+    registros = []
+    analizados, temporales_colapsadas, con_temporales = 0, 0, 0
+    sitios_dinamicos, pendientes_dinamicos, con_dinamico = 0, 0, 0
+    for nombre, hash_def, tipo_objeto in objetos:
+        referencias = referencias_por_hash.get(hash_def)
+        if referencias is None:
+            continue  # Sin código en el almacén
+        aristas = aristas_de_referencias(nombre, referencias, tipo_objeto, ALIAS_POR_BASE)
+        aplicar_aristas(G, aristas)
+        registros.append(registro_telemetria(nombre, hash_def, tipo_objeto, referencias, len(aristas),
+                                             medidas.get(hash_def), previas_por_hash.get(hash_def)))
+        analizados += 1
+        sitios, pendientes = sql_dinamico_de_referencias(referencias)
+        if sitios:
+            # Queda como nodo aunque no tenga aristas: el reporte de pendientes sale del grafo
+            if nombre not in G:
+                G.add_node(nombre, tipo=tipo_nodo(tipo_objeto, "StoredProcedure"), color="red")
+            G.nodes[nombre]["sql_dinamico_sitios"] = sitios
+            G.nodes[nombre]["sql_dinamico_pendientes"] = pendientes
+            sitios_dinamicos += sitios
+            pendientes_dinamicos += pendientes
+            con_dinamico += 1
+        temporales = temporales_de_referencias(referencias)
+        if temporales:
+            temporales_colapsadas += len(temporales)
+            con_temporales += 1
+        if anotar_temporales and nombre in G:
+            if temporales:
+                G.nodes[nombre]["temporales"] = ",".join(temporales)
+            else:
+                G.nodes[nombre].pop("temporales", None)
+
+    print(f"   ✅ Código analizado en {analizados} objetos (SPs, vistas, funciones y triggers).")
+    if sitios_dinamicos:
+        print(f"   🧩 SQL dinámico: {sitios_dinamicos} sitios en {con_dinamico} objetos | "
+              f"{sitios_dinamicos - pendientes_dinamicos} plegados, {pendientes_dinamicos} pendientes")
+    llamadas = sum(1 for _, _, d in G.edges(data=True) if d.get("relacion") == "EJECUTA")
+    if llamadas:
+        print(f"   📞 Llamadas EXEC entre procedimientos: {llamadas}")
+    if temporales_colapsadas:
+        print(f"   🧹 #Temporales y variables de tabla colapsadas: {temporales_colapsadas} en {con_temporales} objetos"
+              f"{' (anotadas en el atributo temporales)' if anotar_temporales else ''}")
+    print(f"   ⏱️  {metricas['parseados']} cuerpos parseados en {metricas['segundos']:.2f} s con "
+          f"{metricas['workers']} proceso(s) | {metricas['objetos_por_segundo'] or 0:,.0f} objetos/s | "
+          f"{metricas['sentencias_por_segundo'] or 0:,.0f} sentencias/s")
+    if metricas['sentencias']:
+        print(f"   🚦 Triaje: {metricas['sentencias_omitidas']} sentencias sin tablas omitidas, "
+              f"{metricas['sentencias_rapidas']} INSERT...SELECT por camino rápido, "
+              f"{metricas['sentencias_parseadas']} al parser | {metricas['fraccion_sin_parser']:.1%} sin sqlglot")
+    reportar_presupuesto(incidencias, metricas, objetos)
+    return metricas, pd.DataFrame(registros, columns=COLUMNAS_TELEMETRIA)
+
+def reportar_presupuesto(incidencias, metricas, objetos):
+    """Sentencias saltadas por tiempo, tamaño, error del parser o caída del proceso"""
+    archivo = os.path.join(TELEMETRIA_DIR, "presupuesto_parseo.csv")
+    if not incidencias:
+        if os.path.exists(archivo):
+            os.remove(archivo)  # Que no quede el reporte de una corrida anterior
+        return
+    nombres_por_hash = {}
+    for nombre, hash_def, _ in objetos:
+        nombres_por_hash.setdefault(hash_def, []).append(nombre)
+    df = pd.DataFrame([{
+        "Objeto": ", ".join(nombres_por_hash.get(i["hash"], [])),
+        "Hash_Definicion": i["hash"],
+        "Sentencia": i["sentencia"],
+        "Motivo": i["motivo"],
+        "Caracteres": i["caracteres"],
+        "Segundos": i["segundos"],
+        "Inicio_Sentencia": i["inicio_sentencia"]
+    } for i in incidencias])
+    os.makedirs(TELEMETRIA_DIR, exist_ok=True)
+    df.to_csv(archivo, index=False)
+
+    print(f"   ✂️  Sentencias saltadas: {metricas['presupuesto_tiempo']} por tiempo, "
+          f"{metricas['presupuesto_tamano']} por tamaño, {metricas['errores_sentencia']} por error del parser"
+          f" | {metricas['procesos_reiniciados']} proceso(s) reiniciado(s)")
+    for _, fila in df[df["Motivo"] != "error"].head(5).iterrows():
+        print(f"      - {fila['Objeto']} #{fila['Sentencia']} ({fila['Motivo']}): {fila['Inicio_Sentencia'][:60]}")
+    print(f"   📝 Detalle en: {archivo}")
+
+# ==============================================
+# PASO 2a: TELEMETRÍA DE PARSEO POR OBJETO
+# ==============================================
+# Una fila por objeto con código, guardada junto al grafo (telemetria_parseo).
+# Estado: "ok" (todas las sentencias se analizaron), "recuperado" (alguna falló o
+# se cortó por presupuesto, pero el resto dio referencias) o "fallido" (no quedó
+# ninguna). Los segundos son del cuerpo: objetos con el mismo código comparten la
+# medición. Cada corrida suma una línea a reports/telemetria/historial_parseo.csv.
+NOMBRE_TELEMETRIA = "telemetria_parseo"
+COLUMNAS_TELEMETRIA = ["Nombre_Objeto", "Hash_Definicion", "Tipo_Codigo", "Origen", "Segundos", "Sentencias",
+                       "Sentencias_Parser", "Sentencias_Fallidas", "Sentencias_Cortadas", "Clase_Error",
+                       "Estado", "Aristas"]
+COLUMNAS_MEDICION = COLUMNAS_TELEMETRIA[4:-1]
+FACTOR_REGRESION = 2.0      # Más lento que esto respecto de la corrida anterior...
+SEGUNDOS_REGRESION = 0.1    # ...y por al menos estos segundos, se reporta
+
+def registro_telemetria(nombre, hash_def, tipo_objeto, referencias, aristas, medida, previa):
+    """Fila de telemetria_parseo: de este parseo o, si vino de la caché, de la corrida anterior"""
+    fila = {"Nombre_Objeto": nombre, "Hash_Definicion": hash_def, "Tipo_Codigo": tipo_objeto, "Aristas": aristas}
+    if medida is None:
+        fila["Origen"] = "cache"
+        if previa is not None:
+            fila.update({c: previa[c] for c in COLUMNAS_MEDICION})
+        return fila
+    fallidas, cortadas, clases = medida["errores"], medida["cortadas"], medida["clases_error"]
+    fila.update({
+        "Origen": "parseo",
+        "Segundos": round(medida["segundos"], 4),
+        "Sentencias": medida["sentencias"],
+        "Sentencias_Parser": medida["parseadas"],
+        "Sentencias_Fallidas": fallidas,
+        "Sentencias_Cortadas": cortadas,
+        "Clase_Error": ",".join(sorted(clases, key=clases.get, reverse=True)) or None,
+        "Estado": "ok" if not fallidas + cortadas else "recuperado" if referencias else "fallido"
+    })
+    return fila
+
+def cargar_telemetria_previa():
+    """telemetria_parseo de la construcción anterior, o None"""
+    if not existe_tabla(OUTPUT_DIR, NOMBRE_TELEMETRIA):
+        return None
+    return cargar_tabla(OUTPUT_DIR, NOMBRE_TELEMETRIA)
+
+def guardar_telemetria(telemetria, df_code, previa):
+    """
+    Guarda telemetria_parseo (en --incremental los objetos no re-analizados conservan
+    su fila) e imprime los más lentos, los que fallaron y lo que empeoró respecto de
+    la corrida anterior sobre el mismo código.
+    """
+    df = telemetria
+    if previa is not None:
+        conservar = previa[previa["Nombre_Objeto"].isin(df_code["Nombre_Objeto"])
+                           & ~previa["Nombre_Objeto"].isin(telemetria["Nombre_Objeto"])]
+        if not conservar.empty:
+            df = pd.concat([conservar.reindex(columns=COLUMNAS_TELEMETRIA), telemetria], ignore_index=True)
+    df = df.sort_values("Nombre_Objeto", ignore_index=True)
+    guardar_tabla(df, OUTPUT_DIR, NOMBRE_TELEMETRIA)
+
+    parseados = telemetria[telemetria["Origen"] == "parseo"]
+    estados = df["Estado"].value_counts()
+    print(f"\n📈 TELEMETRÍA DE PARSEO ({len(df)} objetos, {len(parseados)} parseados en esta corrida):")
+    print(f"   - Estado: {estados.get('ok', 0)} ok | {estados.get('recuperado', 0)} recuperados | "
+          f"{estados.get('fallido', 0)} fallidos")
+    if parseados.empty:
+        print("   ℹ️  Todo vino de la caché: para medir el parser, corra con --sin-cache.")
+        return
+    segundos = parseados["Segundos"]
+    print(f"   - Segundos por objeto: p50 {segundos.quantile(0.5):.3f} | p95 {segundos.quantile(0.95):.3f} | "
+          f"máx {segundos.max():.3f}")
+    print("   🐢 Más lentos:")
+    for _, fila in parseados.nlargest(5, "Segundos").iterrows():
+        print(f"      {fila['Nombre_Objeto']}: {fila['Segundos']:.2f} s | {fila['Sentencias']} sentencias "
+              f"({fila['Sentencias_Parser']} al parser)")
+    fallas = parseados[parseados["Estado"] != "ok"]
+    if not fallas.empty:
+        print("   💥 Con sentencias fallidas o cortadas:")
+        fallas = fallas.assign(_fallido=fallas["Estado"] == "fallido",
+                               _malas=fallas["Sentencias_Fallidas"] + fallas["Sentencias_Cortadas"])
+        for _, fila in fallas.sort_values(["_fallido", "_malas"], ascending=False).head(5).iterrows():
+            print(f"      {fila['Nombre_Objeto']} ({fila['Estado']}): {fila['Sentencias_Fallidas']} fallidas, "
+                  f"{fila['Sentencias_Cortadas']} cortadas | {fila['Clase_Error'] or 'presupuesto'}")
+
+    if previa is not None:
+        # Solo se compara el mismo código: un objeto que cambió no es una regresión del parser
+        comparables = parseados.merge(previa[["Nombre_Objeto", "Hash_Definicion", "Segundos", "Estado"]]
+                                      .dropna(subset=["Segundos"]),
+                                      on=["Nombre_Objeto", "Hash_Definicion"], suffixes=("", "_Previo"))
+        lentos = comparables[(comparables["Segundos"] >= FACTOR_REGRESION * comparables["Segundos_Previo"])
+                             & (comparables["Segundos"] - comparables["Segundos_Previo"] >= SEGUNDOS_REGRESION)]
+        rotos = comparables[(comparables["Estado"] != "ok") & (comparables["Estado_Previo"] == "ok")]
+        if not comparables.empty:
+            print(f"   🔍 Contra la corrida anterior ({len(comparables)} objetos con el mismo código): "
+                  f"{len(lentos)} al menos {FACTOR_REGRESION:g}x más lentos, {len(rotos)} que antes parseaban bien")
+        for _, fila in lentos.nlargest(5, "Segundos").iterrows():
+            print(f"      {fila['Nombre_Objeto']}: {fila['Segundos_Previo']:.2f} s -> {fila['Segundos']:.2f} s")
+        for _, fila in rotos.head(5).iterrows():
+            print(f"      {fila['Nombre_Objeto']}: ok -> {fila['Estado']} ({fila['Clase_Error'] or 'presupuesto'})")
+
+    archivo = os.path.join(TELEMETRIA_DIR, "historial_parseo.csv")
+    os.makedirs(TELEMETRIA_DIR, exist_ok=True)
+    pd.DataFrame([{
+        "Fecha": datetime.now().isoformat(timespec="seconds"),
+        "Version_Sqlglot": sqlglot.__version__,
+        "Version_Extractor": VERSION_EXTRACTOR,
+        "Objetos_Parseados": len(parseados),
+        "Sentencias": int(parseados["Sentencias"].sum()),
+        "Segundos": round(segundos.sum(), 3),
+        "Segundos_P95": round(segundos.quantile(0.95), 4),
+        "Recuperados": int((parseados["Estado"] == "recuperado").sum()),
+        "Fallidos": int((parseados["Estado"] == "fallido").sum())
+    }]).to_csv(archivo, mode="a", header=not os.path.exists(archivo), index=False)
+    print(f"   📝 Historial por corrida en: {archivo}")
+
+# ==============================================
+# PASO 2b: PESOS POR VOLUMEN (filas / bytes de cada tabla)
+# ==============================================
+# Atributos que pone asignar_volumen: en --incremental se borran antes de volver a
+# asignarlos, así una tabla que salió de volumen_tablas no conserva el valor viejo
+ATRIBUTOS_VOLUMEN_NODO = ("filas", "bytes", "ejecuciones", "tiempo_total_ms", "lecturas_logicas")
+ATRIBUTOS_VOLUMEN_ARISTA = ("filas", "bytes")
+TABLAS_VOLUMEN = ("volumen_tablas", "estadisticas_sp")
+
+def asignar_volumen(G):
+    """
+    Cada tabla lleva su volumen como atributo de nodo y cada relación el de la tabla
+    que toca (la que se lee o se escribe), para ordenar los flujos por bytes movidos.
+    Siempre sobre todo el grafo: la ingesta vuelve a bajar el volumen en cada corrida,
+    también en la incremental.
+    """
+    for _, data in G.nodes(data=True):
+        for atributo in ATRIBUTOS_VOLUMEN_NODO:
+            data.pop(atributo, None)
+    for _, _, data in G.edges(data=True):
+        for atributo in ATRIBUTOS_VOLUMEN_ARISTA:
+            data.pop(atributo, None)
+    volumen_por_tabla = {}
+    if existe_tabla_raw(INPUT_DIR, "volumen_tablas"):
+        df_volumen = cargar_tabla_raw(INPUT_DIR, "volumen_tablas", columnas=["Tabla", "Filas", "Bytes_Reservados"])
+        volumen_por_tabla = {t: (int(f), int(b)) for t, f, b in
+                             zip(df_volumen['Tabla'], df_volumen['Filas'], df_volumen['Bytes_Reservados'])
+                             if pd.notna(f) and pd.notna(b)}
+
+        for nodo, (filas, bytes_) in volumen_por_tabla.items():
+            if nodo in G:
+                G.nodes[nodo]["filas"] = filas
+                G.nodes[nodo]["bytes"] = bytes_
+
+        for u, v, data in G.edges(data=True):
+            # LEE y DISPARA salen de la tabla; ESCRIBE y USA llegan a ella
+            tabla = u if data.get("relacion") in ("LEE", "DISPARA") else v
+            if tabla in volumen_por_tabla:
+                data["filas"], data["bytes"] = volumen_por_tabla[tabla]
+        print(f"   📏 Volumen asignado a {sum(1 for t in volumen_por_tabla if t in G)} tablas del grafo.")
+
+    # Costo de ejecución por SP (opcional: 01_ingestion_sql.py --estadisticas-sp)
+    if existe_tabla_raw(INPUT_DIR, "estadisticas_sp"):
+        df_stats = cargar_tabla_raw(INPUT_DIR, "estadisticas_sp",
+                                    columnas=["Nombre_SP", "Ejecuciones", "Tiempo_Total_ms", "Lecturas_Logicas"])
+        con_costo = 0
+        for _, fila in df_stats.iterrows():
+            if fila['Nombre_SP'] in G and pd.notna(fila['Ejecuciones']):
+                G.nodes[fila['Nombre_SP']]["ejecuciones"] = int(fila['Ejecuciones'])
+                G.nodes[fila['Nombre_SP']]["tiempo_total_ms"] = float(fila['Tiempo_Total_ms'])
+                G.nodes[fila['Nombre_SP']]["lecturas_logicas"] = int(fila['Lecturas_Logicas'])
+                con_costo += 1
+        print(f"   ⏱️  Costo de ejecución asignado a {con_costo} SPs del grafo.")
+    return volumen_por_tabla
+
+def volumen_mas_nuevo_que_grafo():
+    """volumen_tablas o estadisticas_sp (de alguna base) se escribieron después del grafo guardado"""
+    ruta_grafo = os.path.join(OUTPUT_DIR, "linaje_completo.graphml")
+    if not os.path.exists(ruta_grafo):
+        return True
+    directorios = [e["directorio"] for e in espacios_raw(INPUT_DIR)] or [INPUT_DIR]
+    rutas = [ruta_existente(d, t) for d in directorios for t in TABLAS_VOLUMEN]
+    return any(r is not None and os.path.getmtime(r) > os.path.getmtime(ruta_grafo) for r in rutas)
+
+# ==============================================
+# PASO 2c: ACTUALIZACIÓN INCREMENTAL (solo lo que cambió)
+# ==============================================
+# Cada construcción deja en data/02_processed/huellas_grafo el Hash_Definicion de
+# cada objeto. Con --incremental se compara contra el índice actual y solo se
+# rehacen los objetos agregados, cambiados o eliminados: se quitan las aristas que
+# salieron de ellos, se vuelven a poner las del catálogo y las de su código, y se
+# parchea el grafo guardado. Cada arista sale de un solo objeto: el origen en USA,
+# ESCRIBE y EJECUTA, el destino en LEE y DISPARA.
+NOMBRE_HUELLAS = "huellas_grafo"
+COLUMNAS_HUELLAS = ["Nombre_Objeto", "Hash_Definicion", "Tipo_Codigo", "Objeto_Padre", "Version_Extractor"]
+
+def version_extraccion(anotar_temporales=False):
+    """Versión de la construcción: anotar o no las #temporales también cambia el grafo"""
+    return f"{sqlglot.__version__}/{VERSION_EXTRACTOR}{'+temporales' if anotar_temporales else ''}"
+
+def guardar_huellas(df_code, anotar_temporales=False):
+    df = df_code.reindex(columns=COLUMNAS_HUELLAS[:-1]).copy()
+    df["Version_Extractor"] = version_extraccion(anotar_temporales)
+    guardar_tabla(df, OUTPUT_DIR, NOMBRE_HUELLAS)
+
+def cargar_estado_previo(anotar_temporales=False):
+    """(grafo guardado, huellas de esa construcción) o None si hay que construir desde cero"""
+    ruta_grafo = os.path.join(OUTPUT_DIR, "linaje_completo.graphml")
+    if not os.path.exists(ruta_grafo) or not existe_tabla(OUTPUT_DIR, NOMBRE_HUELLAS):
+        print("   ℹ️  No hay una construcción previa con huellas: se construye desde cero.")
+        return None
+    previas = cargar_tabla(OUTPUT_DIR, NOMBRE_HUELLAS)
+    if previas.empty or set(previas["Version_Extractor"].astype(str)) != {version_extraccion(anotar_temporales)}:
+        print("   ℹ️  Cambió la versión de sqlglot, del extractor o --anotar-temporales: se construye desde cero.")
+        return None
+    return nx.read_graphml(ruta_grafo), previas
+
+def objetos_cambiados(previas, df_code):
+    """Nombres agregados, cambiados (hash, tipo o padre) y eliminados desde la construcción anterior"""
+    def firma(df):
+        return {n: (h if pd.notna(h) else None, t if pd.notna(t) else None, p if pd.notna(p) else None)
+                for n, h, t, p in zip(df["Nombre_Objeto"], df["Hash_Definicion"],
+                                      df["Tipo_Codigo"], df["Objeto_Padre"])}
+    antes, ahora = firma(previas), firma(df_code)
+    agregados = sorted(set(ahora) - set(antes))
+    eliminados = sorted(set(antes) - set(ahora))
+    cambiados = sorted(n for n in set(ahora) & set(antes) if ahora[n] != antes[n])
+    return agregados, cambiados, eliminados
+
+# Atributos de nodo que pone analizar_codigo a partir del código del objeto
+ATRIBUTOS_DE_CODIGO = ("temporales", "sql_dinamico_sitios", "sql_dinamico_pendientes")
+
+def propietario_arista(u, v, relacion):
+    """El objeto cuyo catálogo o código produjo la arista"""
+    return u if relacion in ("USA", "ESCRIBE", "EJECUTA") else v
+
+def quitar_aristas_de(G, objetos):
+    """Quita las aristas que salieron de `objetos` y devuelve los nodos que tocaban"""
+    quitar = [(u, v) for n in objetos if n in G
+              for u, v, data in list(G.in_edges(n, data=True)) + list(G.out_edges(n, data=True))
+              if propietario_arista(u, v, data.get("relacion", "USA")) == n]
+    tocados = {x for arista in quitar for x in arista}
+    G.remove_edges_from(quitar)
+    return tocados
+
+def limpiar_nodos(G, tocados):
+    """Una construcción completa no deja nodos sueltos, ni XTMP marcadas sin código que las toque"""
+    sueltos = [n for n in tocados if n in G and G.degree(n) == 0 and "sql_dinamico_sitios" not in G.nodes[n]]
+    G.remove_nodes_from(sueltos)
+    for n in tocados:
+        if n in G and G.nodes[n].get("tipo") == "Temporal":
+            escrita = any(d.get("relacion") == "ESCRIBE" for _, _, d in G.in_edges(n, data=True))
+            leida = any(d.get("relacion") == "LEE" and G.nodes[v].get("tipo") not in ("Vista", "Funcion")
+                        for _, v, d in G.out_edges(n, data=True))
+            if not escrita and not leida:
+                G.add_node(n, tipo="Tabla", color="blue")
+    return len(sueltos)
+
+def actualizar_grafo(G, previas, df_deps, df_code, workers, tam_bloque, cache, segundos_sentencia, max_caracteres,
+                     anotar_temporales=False, telemetria_previa=None):
+    """
+    Parchea G con los objetos que cambiaron; retorna (volumen por tabla, telemetría
+    de los objetos re-analizados) o None si no hubo cambios
+    """
+    agregados, cambiados, eliminados = objetos_cambiados(previas, df_code)
+    print(f"🔁 Modo incremental: {len(agregados)} agregados, {len(cambiados)} cambiados, "
+          f"{len(eliminados)} eliminados (de {len(df_code)} objetos).")
+    objetos = set(agregados) | set(cambiados) | set(eliminados)
+    if not objetos:
+        return None
+
+    tocados = quitar_aristas_de(G, objetos)
+    for n in objetos & set(G.nodes):
+        # Los atributos que salen del código se vuelven a poner al analizarlo
+        for atributo in ATRIBUTOS_DE_CODIGO:
+            G.nodes[n].pop(atributo, None)
+    vigentes = set(agregados) | set(cambiados)
+    construir_esqueleto(df_deps[df_deps["Origen_SP"].isin(vigentes)],
+                        df_code[df_code["Nombre_Objeto"].isin(vigentes)], G, vigentes)
+    _, telemetria = analizar_codigo(G, df_code[df_code["Nombre_Objeto"].isin(vigentes)], workers, tam_bloque,
+                                    cache, segundos_sentencia, max_caracteres, anotar_temporales, telemetria_previa)
+    sueltos = limpiar_nodos(G, tocados | objetos)
+    print(f"   🩹 Aristas rehechas para {len(vigentes)} objetos | {sueltos} nodos quitados por quedar sueltos.")
+    return asignar_volumen(G), telemetria
+
+# ==============================================
+# PASO 2d: GRAFO DE LLAMADAS (EXEC entre procedimientos)
+# ==============================================
+def cierre_llamadas(G):
+    """
+    Todo lo que cada procedimiento ejecuta, directa o anidadamente:
+    (Origen_SP, Destino_SP, Profundidad) con la profundidad mínima (1 = EXEC directo).
+    Un ciclo de llamadas no se recorre dos veces.
+    """
+    llamados = {}
+    for u, v, data in G.edges(data=True):
+        if data.get("relacion") == "EJECUTA":
+            llamados.setdefault(u, []).append(v)
+    filas = []
+    for origen in llamados:
+        profundidad = {origen: 0}
+        cola = deque([origen])
+        while cola:
+            actual = cola.popleft()
+            for destino in llamados.get(actual, ()):
+                if destino not in profundidad:
+                    profundidad[destino] = profundidad[actual] + 1
+                    filas.append((origen, destino, profundidad[destino]))
+                    cola.append(destino)
+    return pd.DataFrame(filas, columns=["Origen_SP", "Destino_SP", "Profundidad"])
 
 # ==============================================
 # PASO 3: GUARDAR EL "CEREBRO" (GRAFO)
 # ==============================================
-print(f"💾 Guardando resultados en: {OUTPUT_DIR}")
+def guardar_grafo(G, volumen_por_tabla):
+    print(f"💾 Guardando resultados en: {OUTPUT_DIR}")
+
+    # Guardamos en formato GEXF (para visualizar en Gephi) y GraphML (para Python)
+    nx.write_gexf(G, os.path.join(OUTPUT_DIR, "linaje_completo.gexf"))
+    nx.write_graphml(G, os.path.join(OUTPUT_DIR, "linaje_completo.graphml"))
+
+    # También guardamos una lista de aristas (Edges) como tabla (Parquet/CSV según capa_datos)
+    edges = []
+    for u, v, data in G.edges(data=True):
+        edges.append({"Origen": u, "Destino": v, "Relacion": data.get("relacion", "USA"),
+                      "Filas": data.get("filas"), "Bytes": data.get("bytes"),
+                      "Dinamico": bool(data.get("dinamico", False))})
+
+    df_edges = pd.DataFrame(edges, columns=["Origen", "Destino", "Relacion", "Filas", "Bytes", "Dinamico"])
+    guardar_tabla(df_edges, OUTPUT_DIR, "relaciones_finales")
+
+    # Objetos con SQL dinámico: los que tienen sitios pendientes siguen para la IA (04_init_metadata)
+    df_dinamico = pd.DataFrame([
+        {"Nombre_Objeto": n, "Sitios": int(d["sql_dinamico_sitios"]), "Pendientes": int(d["sql_dinamico_pendientes"])}
+        for n, d in G.nodes(data=True) if "sql_dinamico_sitios" in d
+    ], columns=["Nombre_Objeto", "Sitios", "Pendientes"])
+    guardar_tabla(df_dinamico, OUTPUT_DIR, "sql_dinamico")
+
+    # Vista de llamadas: expandir un orquestador sin volver a leer código
+    df_llamadas = cierre_llamadas(G)
+    guardar_tabla(df_llamadas, OUTPUT_DIR, "llamadas_sp")
+
+    print(f"\n🎉 GRAFO CONSTRUIDO EXITOSAMENTE.")
+    print(f"   - Nodos: {G.number_of_nodes()}")
+    print(f"   - Relaciones: {G.number_of_edges()}")
+    if not df_dinamico.empty:
+        print(f"   - SQL dinámico: {len(df_dinamico)} objetos, "
+              f"{int((df_dinamico['Pendientes'] > 0).sum())} con sitios sin plegar")
+    if not df_llamadas.empty:
+        print(f"   - Llamadas (cierre): {len(df_llamadas)} pares en {df_llamadas['Origen_SP'].nunique()} "
+              f"procedimientos | anidamiento máximo {df_llamadas['Profundidad'].max()}")
 
-# Guardamos en formato GEXF (para visualizar en Gephi) y GraphML (para Python)
-nx.write_gexf(G, os.path.join(OUTPUT_DIR, "linaje_completo.gexf"))
-nx.write_graphml(G, os.path.join(OUTPUT_DIR, "linaje_completo.graphml"))
+    if volumen_por_tabla:
+        print("\n🏋️ TOP 5 FLUJOS POR BYTES:")
+        for _, fila in df_edges.dropna(subset=["Bytes"]).nlargest(5, "Bytes").iterrows():
+            print(f"   {fila['Origen']} -[{fila['Relacion']}]-> {fila['Destino']}: "
+                  f"{fila['Bytes'] / 1024 ** 2:,.1f} MB ({int(fila['Filas']):,} filas)")
 
-# También guardamos una lista de aristas (Edges) en CSV para verla fácil
-edges = []
-for u, v, data in G.edges(data=True):
-    edges.append({"Origen": u, "Destino": v, "Relacion": data.get("relacion", "USA")})
+def construir_grafo(workers=None, tam_bloque=TAM_BLOQUE_DEFECTO, usar_cache=True,
+                    cache_dias=CACHE_DIAS_DEFECTO, cache_mb=CACHE_MB_DEFECTO,
+                    segundos_sentencia=SEGUNDOS_SENTENCIA_DEFECTO, max_caracteres=CARACTERES_SENTENCIA_DEFECTO,
+                    incremental=False, anotar_temporales=False):
+    df_deps, df_code = cargar_insumos()
+    cache = CacheParsing(CACHE_DIR, cache_dias, cache_mb) if usar_cache else None
+    previo = cargar_estado_previo(anotar_temporales) if incremental else None
+    telemetria_previa = cargar_telemetria_previa()
+    if previo is not None:
+        G, previas = previo
+        actualizado = actualizar_grafo(G, previas, df_deps, df_code, workers, tam_bloque, cache,
+                                       segundos_sentencia, max_caracteres, anotar_temporales, telemetria_previa)
+        if actualizado is None:
+            if not volumen_mas_nuevo_que_grafo():
+                print("✅ Sin cambios en el código: el grafo guardado ya está al día.")
+                return G
+            # El código no cambió pero la ingesta volvió a bajar volumen o costos
+            print("📏 Sin cambios en el código, con volumen/estadísticas más nuevos: se reasignan.")
+            guardar_grafo(G, asignar_volumen(G))
+            return G
+        volumen_por_tabla, telemetria = actualizado
+    else:
+        G = construir_esqueleto(df_deps, df_code)
+        _, telemetria = analizar_codigo(G, df_code, workers, tam_bloque, cache, segundos_sentencia, max_caracteres,
+                                        anotar_temporales, telemetria_previa)
+        volumen_por_tabla = asignar_volumen(G)
+    guardar_grafo(G, volumen_por_tabla)
+    guardar_huellas(df_code, anotar_temporales)
+    guardar_telemetria(telemetria, df_code, telemetria_previa)
 
-pd.DataFrame(edges).to_csv(os.path.join(OUTPUT_DIR, "relaciones_finales.csv"), index=False)
+    if cache is not None:
+        cache.guardar()
+        resumen = cache.resumen()
+        print(f"\n🗃️  CACHÉ DE PARSING (sqlglot {resumen['version_sqlglot']}, "
+              f"extractor v{resumen['version_extractor']}):")
+        print(f"   - Aciertos: {resumen['aciertos']} | Fallos: {resumen['fallos']} "
+              f"| Tasa: {(resumen['tasa_aciertos'] or 0):.1%}")
+        print(f"   - Entradas: {resumen['entradas']} | Desalojadas: {resumen['desalojadas']}")
+    return G
 
-print(f"\n🎉 GRAFO CONSTRUIDO EXITOSAMENTE.")
-print(f"   - Nodos: {G.number_of_nodes()}")
-print(f"   - Relaciones: {G.number_of_edges()}")
\ No newline at end of file
+# El pool de procesos reimporta este módulo en cada proceso (spawn en Windows):
+# todo el trabajo va bajo el guard
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el grafo de linaje desde la capa RAW")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos para parsear el código (por defecto: núcleos de la máquina; 1 = en serie)")
+    parser.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE_DEFECTO,
+                        help=f"Objetos por envío a cada proceso (defecto {TAM_BLOQUE_DEFECTO})")
+    parser.add_argument("--sin-cache", action="store_true",
+                        help="Parsea todo el código sin leer ni escribir la caché de parsing")
+    parser.add_argument("--cache-dias", type=int, default=CACHE_DIAS_DEFECTO,
+                        help=f"Desaloja entradas de la caché sin uso en N días (defecto {CACHE_DIAS_DEFECTO})")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_MB_DEFECTO,
+                        help=f"Tamaño máximo de la caché en MB (defecto {CACHE_MB_DEFECTO})")
+    parser.add_argument("--segundos-sentencia", type=float, default=SEGUNDOS_SENTENCIA_DEFECTO,
+                        help=f"Tiempo máximo de parseo por sentencia antes de saltarla "
+                             f"(defecto {SEGUNDOS_SENTENCIA_DEFECTO}; 0 = sin límite)")
+    parser.add_argument("--max-caracteres-sentencia", type=int, default=CARACTERES_SENTENCIA_DEFECTO,
+                        help=f"Sentencias más largas no se parsean (defecto {CARACTERES_SENTENCIA_DEFECTO:,})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Parchea el grafo guardado rehaciendo solo los objetos agregados, cambiados o eliminados")
+    parser.add_argument("--anotar-temporales", action="store_true",
+                        help="Lista en cada objeto las #temporales y variables de tabla colapsadas (atributo temporales)")
+    args = parser.parse_args()
+    construir_grafo(args.workers, args.tam_bloque, not args.sin_cache, args.cache_dias, args.cache_mb,
+                    args.segundos_sentencia, args.max_caracteres_sentencia, args.incremental,
+                    args.anotar_temporales)
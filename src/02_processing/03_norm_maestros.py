@@ -18,6 +18,8 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import RAW_DIR, PROCESSED_DIR
+from capa_datos import cargar_tabla_raw, existe_tabla_raw, guardar_tabla, cargar_tabla, existe_tabla
+from almacen_codigo import cargar_indice_codigo
 
 # Asignamos las rutas importadas a las variables locales
 INPUT_DIR = RAW_DIR
@@ -26,6 +28,58 @@ OUTPUT_DIR = PROCESSED_DIR
 # Aseguramos que exista el directorio de salida
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Costo de ejecución por SP (RAW estadisticas_sp) que se copia al maestro
+COLUMNAS_EJECUCION = {"Ejecuciones": "ejecuciones", "Tiempo_Total_ms": "tiempo_total_ms",
+                      "Tiempo_Promedio_ms": "tiempo_promedio_ms", "Lecturas_Logicas": "lecturas_logicas",
+                      "Ultima_Ejecucion": "ultima_ejecucion"}
+
+def cargar_ejecucion_por_sp():
+    """{nombre_sp: {ejecuciones, tiempo_total_ms, ...}} o vacío si no se extrajeron estadísticas"""
+    if not existe_tabla_raw(INPUT_DIR, "estadisticas_sp"):
+        return {}
+    df = cargar_tabla_raw(INPUT_DIR, "estadisticas_sp", columnas=["Nombre_SP"] + list(COLUMNAS_EJECUCION))
+    df = df.dropna(subset=["Ejecuciones"]).rename(columns=COLUMNAS_EJECUCION)
+    df["ultima_ejecucion"] = df["ultima_ejecucion"].astype(str)
+    return {fila.pop("Nombre_SP"): fila for fila in df.to_dict("records")}
+
+# Prefijo de ID por tipo de objeto (sys.objects.type). Los SPs conservan SP_/tb_
+# y las vistas, funciones y triggers tienen su propia numeración.
+PREFIJOS_MODULO = {"P": "SP", "V": "VW", "FN": "FN", "IF": "FN", "TF": "FN", "TR": "TR"}
+PREFIJOS_TABLA = {"U": "tb", "V": "vw", "FN": "fn", "IF": "fn", "TF": "fn"}
+TIPOS_CONSULTA = ("V", "FN", "IF", "TF")
+
+def asignar_ids(nombres, tipo_por_nombre, prefijos, defecto):
+    """{nombre: id} con un contador por prefijo, en orden alfabético de nombre"""
+    contadores = {}
+    ids = {}
+    for nombre in nombres:
+        prefijo = prefijos.get(tipo_por_nombre.get(nombre), defecto)
+        contadores[prefijo] = contadores.get(prefijo, 0) + 1
+        ids[nombre] = f"{prefijo}_{contadores[prefijo]:05d}"
+    return ids
+
+def tablas_del_grafo():
+    """
+    Tablas que toca el grafo de 02_grafo_base (relaciones_finales): el lado tabla de
+    LEE/DISPARA (origen) y de ESCRIBE/USA (destino). Incluye las que solo encontró el
+    parseo del código, que dependencias_sql no trae. Vacío si no se construyó el grafo.
+    """
+    if not existe_tabla(OUTPUT_DIR, "relaciones_finales"):
+        print("   ⚠️  No hay relaciones_finales (02_grafo_base.py): solo las tablas del catálogo.")
+        return set()
+    df_rel = cargar_tabla(OUTPUT_DIR, "relaciones_finales", columnas=["Origen", "Destino", "Relacion"])
+    return ({o for o, r in zip(df_rel["Origen"], df_rel["Relacion"]) if r in ("LEE", "DISPARA")}
+            | {d for d, r in zip(df_rel["Destino"], df_rel["Relacion"]) if r in ("ESCRIBE", "USA")})
+
+def tipos_conocidos(*pares):
+    """{nombre: tipo} a partir de pares (serie_nombres, serie_tipos); gana el primero"""
+    tipos = {}
+    for nombres, tipos_serie in pares:
+        for nombre, tipo in zip(nombres, tipos_serie):
+            if pd.notna(nombre) and pd.notna(tipo) and tipo:
+                tipos.setdefault(nombre, str(tipo).strip())
+    return tipos
+
 def generar_maestros():
     """
     Genera archivos maestros para SPs y Tablas con IDs únicos
@@ -37,84 +91,127 @@ def generar_maestros():
     
     try:
         # Cargar archivo de dependencias
-        df_deps = pd.read_csv(os.path.join(INPUT_DIR, "dependencias_sql.csv"))
-        df_code = pd.read_csv(os.path.join(INPUT_DIR, "codigo_fuente.csv"))
+        df_deps = cargar_tabla_raw(INPUT_DIR, "dependencias_sql")
+        # El código va al almacén direccionado por contenido; aquí solo se usa su huella
+        df_code, almacen = cargar_indice_codigo(INPUT_DIR)
+        resumen_almacen = almacen.resumen()
+        print(f"📦 Almacén de código: {resumen_almacen['objetos_unicos']} cuerpos únicos, "
+              f"{resumen_almacen['mb_pack']} MB comprimidos de {resumen_almacen['mb_original']} MB")
+        # Extracciones anteriores solo traen SPs y tablas, sin columnas de tipo
+        for columna in ("Tipo_Origen", "Tipo_Destino"):
+            if columna not in df_deps.columns:
+                df_deps[columna] = None
+        tipo_modulo = tipos_conocidos((df_code['Nombre_Objeto'], df_code['Tipo_Codigo']),
+                                      (df_deps['Origen_SP'], df_deps['Tipo_Origen']))
+        padre_por_objeto = {n: p for n, p in zip(df_code['Nombre_Objeto'], df_code['Objeto_Padre'])
+                            if pd.notna(p)}
         
         # ==============================================
         # 1. MAESTRO DE STORED PROCEDURES (JSON)
         # ==============================================
         print("\n📋 GENERANDO MAESTRO DE SPs...")
         
-        # Obtener SPs únicos de la columna Origen_SP
-        sps_unicos = df_deps['Origen_SP'].unique()
+        # Obtener SPs únicos de la columna Origen_SP, más las vistas, funciones
+        # y triggers extraídos aunque no tengan dependencias
+        sps_unicos = set(df_deps['Origen_SP'].unique())
+        sps_unicos.update(df_code.loc[df_code['Tipo_Codigo'].isin(PREFIJOS_MODULO) &
+                                      (df_code['Tipo_Codigo'] != "P"), 'Nombre_Objeto'])
         sps_unicos = sorted([sp for sp in sps_unicos if pd.notna(sp)])
+        ids_modulo = asignar_ids(sps_unicos, tipo_modulo, PREFIJOS_MODULO, "SP")
+        ejecucion_por_sp = cargar_ejecucion_por_sp()
         
-        # Crear diccionario para búsqueda rápida de código
-        codigo_por_sp = {}
-        for _, row in df_code.iterrows():
-            sp_name = row['Nombre_Objeto']
-            codigo_sql = row['Codigo_SQL']
-            if pd.notna(sp_name) and pd.notna(codigo_sql):
-                codigo_por_sp[sp_name] = codigo_sql
+        # Huella del código por objeto (solo las que el almacén puede resolver)
+        hash_por_sp = {n: h for n, h in zip(df_code['Nombre_Objeto'], df_code['Hash_Definicion'])
+                       if pd.notna(n) and h in almacen}
         
         # Crear lista de SPs con metadata completa
         maestro_sp = []
-        for i, sp_name in enumerate(sps_unicos, 1):
-            sp_id = f"SP_{i:05d}"  # Formato: SP_00001, SP_00002, etc.
-            codigo_sql = codigo_por_sp.get(sp_name, "CÓDIGO NO DISPONIBLE")
-            
-            maestro_sp.append({
+        for sp_name in sps_unicos:
+            sp_id = ids_modulo[sp_name]  # Formato: SP_00001, VW_00001, FN_00001, TR_00001
+            # El código no se copia: se resuelve por hash_definicion en el almacén
+            entrada = {
                 "id_sp": sp_id, 
                 "nombre_sp": sp_name,
-                "codigo_sql": codigo_sql
-            })
+                "tipo": tipo_modulo.get(sp_name, "P"),
+                "hash_definicion": hash_por_sp.get(sp_name)
+            }
+            if sp_name in padre_por_objeto:
+                entrada["objeto_padre"] = padre_por_objeto[sp_name]
+            if sp_name in ejecucion_por_sp:
+                entrada["ejecucion"] = ejecucion_por_sp[sp_name]
+            maestro_sp.append(entrada)
         
         # Guardar maestro de SPs como JSON (mejor para código)
         archivo_sp_json = os.path.join(OUTPUT_DIR, "maestro_sp.json")
         with open(archivo_sp_json, 'w', encoding='utf-8') as f:
             json.dump(maestro_sp, f, indent=2, ensure_ascii=False)
         
-        # También guardar versión CSV simplificada (sin código)
+        # También guardar versión tabular simplificada (sin código)
         maestro_sp_simple = []
         for sp in maestro_sp:
             maestro_sp_simple.append({
                 "id_sp": sp["id_sp"],
                 "nombre_sp": sp["nombre_sp"],
-                "longitud_codigo": len(sp["codigo_sql"])
+                "tipo": sp["tipo"],
+                "objeto_padre": sp.get("objeto_padre"),
+                "hash_definicion": sp["hash_definicion"],
+                "longitud_codigo": almacen.caracteres(sp["hash_definicion"]) or 0,
+                **{c: sp.get("ejecucion", {}).get(c) for c in COLUMNAS_EJECUCION.values()}
             })
         
         df_maestro_sp_simple = pd.DataFrame(maestro_sp_simple)
-        archivo_sp_csv = os.path.join(OUTPUT_DIR, "maestro_sp.csv")
-        df_maestro_sp_simple.to_csv(archivo_sp_csv, index=False)
+        archivo_sp_csv = guardar_tabla(df_maestro_sp_simple, OUTPUT_DIR, "maestro_sp")
         
         print(f"   ✅ Maestro SPs (JSON): {archivo_sp_json}")
-        print(f"   ✅ Maestro SPs (CSV simplificado): {archivo_sp_csv}")
+        print(f"   ✅ Maestro SPs (tabla simplificada): {archivo_sp_csv}")
         print(f"   📊 Total SPs únicos: {len(sps_unicos)}")
-        print(f"   💻 SPs con código disponible: {len([sp for sp in maestro_sp if sp['codigo_sql'] != 'CÓDIGO NO DISPONIBLE'])}")
+        conteo_tipos = pd.Series([sp["tipo"] for sp in maestro_sp]).value_counts()
+        print(f"   🏷️  Por tipo: {', '.join(f'{t}={n}' for t, n in conteo_tipos.items())}")
+        print(f"   ⏱️  SPs con estadísticas de ejecución: {sum(1 for sp in maestro_sp if 'ejecucion' in sp)}")
+        print(f"   💻 SPs con código disponible: {sum(1 for sp in maestro_sp if sp['hash_definicion'])}")
         
         # ==============================================
         # 2. MAESTRO DE TABLAS
         # ==============================================
         print("\n📊 GENERANDO MAESTRO DE TABLAS...")
         
-        # Obtener tablas únicas de la columna Destino_Tabla
-        tablas_unicas = df_deps['Destino_Tabla'].unique()
+        # Obtener tablas únicas de la columna Destino_Tabla, más las que el grafo
+        # encontró solo en el código. Las vistas y funciones también son "tablas"
+        # (se leen), con su propio prefijo vw_/fn_
+        tipo_tabla = tipos_conocidos((df_deps['Destino_Tabla'], df_deps['Tipo_Destino']))
+        tipo_tabla.update({n: t for n, t in tipo_modulo.items() if t in TIPOS_CONSULTA})
+        tablas_unicas = set(df_deps['Destino_Tabla'].unique())
+        tablas_unicas.update(n for n, t in tipo_modulo.items() if t in TIPOS_CONSULTA)
+        procesos = {n for n in sps_unicos if tipo_modulo.get(n, "P") not in TIPOS_CONSULTA}
+        solo_codigo = tablas_del_grafo() - tablas_unicas - procesos
+        tablas_unicas.update(solo_codigo)
         tablas_unicas = sorted([tb for tb in tablas_unicas if pd.notna(tb)])
+        ids_tabla = asignar_ids(tablas_unicas, tipo_tabla, PREFIJOS_TABLA, "tb")
         
         # Crear DataFrame con IDs únicos
         maestro_tablas = []
-        for i, tabla_name in enumerate(tablas_unicas, 1):
-            tabla_id = f"tb_{i:05d}"  # Formato: tb_00001, tb_00002, etc.
-            maestro_tablas.append({"id_tabla": tabla_id, "nombre_tabla": tabla_name})
+        for tabla_name in tablas_unicas:
+            tabla_id = ids_tabla[tabla_name]  # Formato: tb_00001, vw_00001, fn_00001
+            maestro_tablas.append({"id_tabla": tabla_id, "nombre_tabla": tabla_name,
+                                   "tipo": tipo_tabla.get(tabla_name, "U")})
         
         df_maestro_tablas = pd.DataFrame(maestro_tablas)
         
+        # Volumen (filas / bytes reservados) para pesar el linaje; vacío si no se extrajo
+        df_maestro_tablas['filas'] = None
+        df_maestro_tablas['bytes'] = None
+        if existe_tabla_raw(INPUT_DIR, "volumen_tablas"):
+            df_volumen = cargar_tabla_raw(INPUT_DIR, "volumen_tablas", columnas=["Tabla", "Filas", "Bytes_Reservados"])
+            df_volumen = df_volumen.drop_duplicates("Tabla").set_index("Tabla")
+            df_maestro_tablas['filas'] = df_maestro_tablas['nombre_tabla'].map(df_volumen['Filas'])
+            df_maestro_tablas['bytes'] = df_maestro_tablas['nombre_tabla'].map(df_volumen['Bytes_Reservados'])
+        
         # Guardar maestro de tablas
-        archivo_tablas = os.path.join(OUTPUT_DIR, "maestro_tablas.csv")
-        df_maestro_tablas.to_csv(archivo_tablas, index=False)
+        archivo_tablas = guardar_tabla(df_maestro_tablas, OUTPUT_DIR, "maestro_tablas")
         
         print(f"   ✅ Maestro Tablas guardado: {archivo_tablas}")
-        print(f"   📊 Total tablas únicas: {len(tablas_unicas)}")
+        print(f"   📊 Total tablas únicas: {len(tablas_unicas)} ({len(solo_codigo)} solo en el código)")
+        print(f"   📏 Tablas con volumen conocido: {df_maestro_tablas['bytes'].notna().sum()}")
         
         # ==============================================
         # 3. GENERAR VERSIÓN NORMALIZADA DE DEPENDENCIAS
@@ -148,8 +245,7 @@ def generar_maestros():
         df_deps_normalizado = pd.DataFrame(dependencias_normalizadas)
         
         # Guardar dependencias normalizadas
-        archivo_deps_norm = os.path.join(OUTPUT_DIR, "dependencias_normalizadas.csv")
-        df_deps_normalizado.to_csv(archivo_deps_norm, index=False)
+        archivo_deps_norm = guardar_tabla(df_deps_normalizado, OUTPUT_DIR, "dependencias_normalizadas")
         
         print(f"   ✅ Dependencias normalizadas guardadas: {archivo_deps_norm}")
         print(f"   📊 Total relaciones: {len(dependencias_normalizadas)}")
@@ -165,7 +261,7 @@ def generar_maestros():
         
     except FileNotFoundError as e:
         print(f"❌ ERROR: No se encontró el archivo {e.filename}")
-        print(f"💡 Verifica que los archivos .csv estén en: {INPUT_DIR}")
+        print(f"💡 Verifica que los archivos de la capa RAW (.parquet/.csv) estén en: {INPUT_DIR}")
         return False
     except Exception as e:
         print(f"❌ ERROR: {e}")
@@ -18,14 +18,71 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import PROCESSED_DIR, KNOWLEDGE_DIR
+from capa_datos import cargar_tabla, existe_tabla
 
 # Asignamos las rutas importadas
-INPUT_DIR = PROCESSED_DIR      # Donde están los maestros (maestro_sp.csv)
+INPUT_DIR = PROCESSED_DIR      # Donde están los maestros (maestro_sp)
 OUTPUT_DIR = KNOWLEDGE_DIR     # Donde guardaremos la metadata (banco_metadata.json)
 
 # Aseguramos que exista el directorio de salida
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Vistas y funciones: sus entradas y su salida salen directo del catálogo
+# (sys.sql_expression_dependencies), no hace falta pasarlas por la IA.
+TIPOS_CONSULTA = ("V", "FN", "IF", "TF")
+
+def metadata_desde_catalogo(sp_row, df_deps, id_tabla_por_nombre):
+    """Metadata resuelta de una vista/función: lee lo que referencia y 'produce' su propio nombre"""
+    refs = df_deps.loc[df_deps['id_sp'] == sp_row['id_sp'], 'id_tabla'] if not df_deps.empty else []
+    propio = id_tabla_por_nombre.get(sp_row['nombre_sp'])
+    return {
+        "id_sp": sp_row['id_sp'],
+        "nombre_sp": sp_row['nombre_sp'],
+        "inputs": sorted({r for r in refs if r != propio}),
+        "outputs": [propio] if propio else [],
+        "external_sources": False,
+        "creates_tables": False,
+        "ai_review": True,  # Ya resuelto: 06_ia_masivo lo salta
+        "fuente": "catalogo"
+    }
+
+def aristas_por_sp(df_rel):
+    """{nombre_sp: {"LEE": entradas, "ESCRIBE": salidas, "USA": sin orientar}} desde relaciones_finales"""
+    aristas = {}
+    for origen, destino, relacion in zip(df_rel['Origen'], df_rel['Destino'], df_rel['Relacion']):
+        if relacion == "LEE":
+            aristas.setdefault(destino, {"LEE": set(), "ESCRIBE": set(), "USA": set()})["LEE"].add(origen)
+        elif relacion in ("ESCRIBE", "USA"):
+            aristas.setdefault(origen, {"LEE": set(), "ESCRIBE": set(), "USA": set()})[relacion].add(destino)
+    return aristas
+
+def metadata_desde_grafo(sp_row, aristas, procedimientos, id_tabla_por_nombre, dinamico_pendiente=False):
+    """
+    Metadata de un SP que el análisis estático de 02_grafo_base ya resolvió, o None.
+    Resuelto: el código dio al menos una lectura o escritura y cada tabla que el
+    catálogo le asigna (USA) quedó orientada, por el código o por las dependencias
+    de columna. Un USA a otro procedimiento es un EXEC, no una tabla. Un SP con
+    SQL dinámico que no se pudo plegar (sql_dinamico) nunca está resuelto: sus
+    tablas no están en el grafo. Tampoco si alguna tabla no tiene id_tabla
+    (maestro_tablas anterior al grafo): inputs/outputs son siempre IDs.
+    """
+    if dinamico_pendiente or not aristas or not (aristas["LEE"] or aristas["ESCRIBE"]):
+        return None
+    if aristas["USA"] - aristas["LEE"] - procedimientos:
+        return None
+    if any(t not in id_tabla_por_nombre for t in aristas["LEE"] | aristas["ESCRIBE"]):
+        return None
+    return {
+        "id_sp": sp_row['id_sp'],
+        "nombre_sp": sp_row['nombre_sp'],
+        "inputs": sorted({id_tabla_por_nombre[t] for t in aristas["LEE"]}),
+        "outputs": sorted({id_tabla_por_nombre[t] for t in aristas["ESCRIBE"]}),
+        "external_sources": False,
+        "creates_tables": False,
+        "ai_review": True,  # Ya resuelto: 06_ia_masivo lo salta
+        "fuente": "estatico"
+    }
+
 def generar_metadata_simulada():
     """
     Genera un banco de metadata inicial (esqueleto) para todos los SPs
@@ -37,13 +94,35 @@ def generar_metadata_simulada():
     
     try:
         # Cargar maestro de SPs
-        df_maestro_sp = pd.read_csv(os.path.join(INPUT_DIR, "maestro_sp.csv"))
+        df_maestro_sp = cargar_tabla(INPUT_DIR, "maestro_sp")
         
         # Cargar maestro de tablas para usar en inputs/outputs simulados
-        df_maestro_tablas = pd.read_csv(os.path.join(INPUT_DIR, "maestro_tablas.csv"))
+        df_maestro_tablas = cargar_tabla(INPUT_DIR, "maestro_tablas")
         
         # Obtener lista de IDs de tablas para usar en la simulación
         ids_tablas = df_maestro_tablas['id_tabla'].tolist()
+        id_tabla_por_nombre = dict(zip(df_maestro_tablas['nombre_tabla'], df_maestro_tablas['id_tabla']))
+        
+        # Dependencias del catálogo, para resolver vistas y funciones sin IA
+        if 'tipo' not in df_maestro_sp.columns:
+            df_maestro_sp['tipo'] = "P"
+        df_deps = pd.DataFrame(columns=['id_sp', 'id_tabla'])
+        if df_maestro_sp['tipo'].isin(TIPOS_CONSULTA).any():
+            df_deps = cargar_tabla(INPUT_DIR, "dependencias_normalizadas", columnas=['id_sp', 'id_tabla'])
+        
+        # Grafo de 02_grafo_base: los SPs que el análisis estático resolvió no pasan por la IA
+        aristas_grafo = {}
+        if existe_tabla(INPUT_DIR, "relaciones_finales"):
+            aristas_grafo = aristas_por_sp(cargar_tabla(INPUT_DIR, "relaciones_finales",
+                                                        columnas=['Origen', 'Destino', 'Relacion']))
+        else:
+            print("⚠️ No hay relaciones_finales (02_grafo_base.py): todos los SPs quedan para la IA.")
+        procedimientos = set(df_maestro_sp.loc[~df_maestro_sp['tipo'].isin(TIPOS_CONSULTA), 'nombre_sp'])
+        # SQL dinámico que 02_grafo_base no pudo plegar: esos SPs siguen para la IA
+        dinamico_pendiente = set()
+        if existe_tabla(INPUT_DIR, "sql_dinamico"):
+            df_dinamico = cargar_tabla(INPUT_DIR, "sql_dinamico")
+            dinamico_pendiente = set(df_dinamico.loc[df_dinamico['Pendientes'] > 0, 'Nombre_Objeto'])
         
         print(f"📊 Procesando {len(df_maestro_sp)} SPs...")
         
@@ -54,6 +133,17 @@ def generar_metadata_simulada():
             id_sp = sp_row['id_sp']
             nombre_sp = sp_row['nombre_sp']
             
+            if sp_row['tipo'] in TIPOS_CONSULTA:
+                banco_metadata.append(metadata_desde_catalogo(sp_row, df_deps, id_tabla_por_nombre))
+                continue
+            
+            if sp_row['tipo'] != "TR":
+                metadata_sp = metadata_desde_grafo(sp_row, aristas_grafo.get(nombre_sp), procedimientos,
+                                                   id_tabla_por_nombre, nombre_sp in dinamico_pendiente)
+                if metadata_sp is not None:
+                    banco_metadata.append(metadata_sp)
+                    continue
+            
             # Simular inputs y outputs basados en el índice del SP
             # (Esto es un placeholder hasta que pase el script de IA)
             sp_index = int(id_sp.split('_')[1])  # Extraer el número del ID
@@ -89,6 +179,16 @@ def generar_metadata_simulada():
         
         print(f"✅ Banco de metadata JSON guardado: {archivo_json}")
         print(f"📊 Total SPs inicializados: {len(banco_metadata)}")
+        resueltos = sum(1 for m in banco_metadata if m.get("fuente") == "catalogo")
+        if resueltos:
+            print(f"🗂️  Vistas/funciones resueltas desde el catálogo (sin IA): {resueltos}")
+        estaticos = sum(1 for m in banco_metadata if m.get("fuente") == "estatico")
+        pendientes = sum(1 for m in banco_metadata if not m.get("ai_review"))
+        print(f"🧠 SPs resueltos por análisis estático (sin IA): {estaticos} de {estaticos + pendientes}")
+        print(f"🤖 Pendientes para la IA (06_ia_masivo.py): {pendientes}")
+        if dinamico_pendiente:
+            print(f"🧩 De ellos, con SQL dinámico sin plegar: "
+                  f"{sum(1 for m in banco_metadata if m['nombre_sp'] in dinamico_pendiente and not m.get('ai_review'))}")
         
         # También guardar como CSV para fácil visualización
         archivo_csv = os.path.join(OUTPUT_DIR, "banco_metadata_sp.csv")
@@ -18,7 +18,8 @@ src_dir = os.path.dirname(current_dir)
 sys.path.append(src_dir)
 
 # Importamos las rutas maestras
-from config_paths import PROCESSED_DIR, KNOWLEDGE_DIR, API_KEY_FILE
+from config_paths import RAW_DIR, PROCESSED_DIR, KNOWLEDGE_DIR, API_KEY_FILE
+from almacen_codigo import AlmacenCodigo, codigo_de_entrada
 
 # Rutas de archivos específicos
 FILE_MAESTRO_SP = os.path.join(PROCESSED_DIR, "maestro_sp.json")
@@ -42,10 +43,13 @@ def buscar_sp_por_id(sp_id_buscado):
         
         for sp in maestro_sp:
             if sp['id_sp'].lower() == sp_id_buscado.lower():
+                # El código se lee del almacén solo para el SP pedido
+                with AlmacenCodigo(RAW_DIR) as almacen:
+                    codigo_sql = codigo_de_entrada(sp, almacen)
                 return {
                     'id_sp': sp['id_sp'],
                     'nombre_sp': sp['nombre_sp'],
-                    'codigo_sql': sp['codigo_sql']
+                    'codigo_sql': codigo_sql
                 }
         
         return None  # No encontrado
@@ -17,7 +17,8 @@ src_dir = os.path.dirname(current_dir)
 sys.path.append(src_dir)
 
 # Importamos las rutas maestras
-from config_paths import PROCESSED_DIR, KNOWLEDGE_DIR, API_KEY_FILE
+from config_paths import RAW_DIR, PROCESSED_DIR, KNOWLEDGE_DIR, API_KEY_FILE
+from almacen_codigo import AlmacenCodigo, codigo_de_entrada
 
 # Rutas de archivos específicos
 FILE_MAESTRO_SP = os.path.join(PROCESSED_DIR, "maestro_sp.json")
@@ -75,11 +76,8 @@ def obtener_sps_no_analizados(maestro_sp, metadata_existente):
     sps_no_analizados = []
     for sp in maestro_sp:
         if sp['id_sp'].lower() not in sps_analizados:
-            sps_no_analizados.append({
-                'id_sp': sp['id_sp'],
-                'nombre_sp': sp['nombre_sp'],
-                'codigo_sql': sp['codigo_sql']
-            })
+            # Sin el código: se trae del almacén al momento de procesar cada SP
+            sps_no_analizados.append(sp)
     
     return sps_no_analizados
 
@@ -216,13 +214,15 @@ def procesar_sp_batch():
     procesados_exitosos = 0
     procesados_con_error = 0
     
+    almacen = AlmacenCodigo(RAW_DIR)
     for i, sp_info in enumerate(sps_a_procesar, 1):
+        codigo_sql = codigo_de_entrada(sp_info, almacen)
         print(f"\n{'='*50}")
         print(f"📋 SP {i}/{len(sps_a_procesar)}: {sp_info['nombre_sp']} ({sp_info['id_sp']})")
-        print(f"📏 Longitud del código: {len(sp_info['codigo_sql'])} caracteres")
+        print(f"📏 Longitud del código: {len(codigo_sql)} caracteres")
         
         # Extraer metadata con IA
-        metadata = extraer_metadata_sp(sp_info['codigo_sql'], sp_info['nombre_sp'])
+        metadata = extraer_metadata_sp(codigo_sql, sp_info['nombre_sp'])
         
         # Actualizar metadata existente
         if "error" not in metadata:
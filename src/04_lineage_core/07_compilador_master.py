@@ -19,6 +19,10 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import KNOWLEDGE_DIR, PROCESSED_DIR, GOLD_DIR
+from capa_datos import cargar_tabla, guardar_tabla
+
+# Campos de costo de ejecución que se copian del maestro de SPs a cada SP generador
+COLUMNAS_EJECUCION = ["ejecuciones", "tiempo_total_ms", "tiempo_promedio_ms", "lecturas_logicas"]
 
 def cargar_datos():
     """Carga todos los datos necesarios desde las capas Processed y Knowledge"""
@@ -31,19 +35,34 @@ def cargar_datos():
         print(f"   ✅ Metadata cargada: {path_metadata}")
         
         # 2. Maestros (Viene de la capa PROCESSED - normalizada)
-        path_maestro = os.path.join(PROCESSED_DIR, "maestro_tablas.csv")
-        df_maestro_tablas = pd.read_csv(path_maestro)
-        print(f"   ✅ Maestro tablas cargado: {path_maestro}")
+        df_maestro_tablas = cargar_tabla(PROCESSED_DIR, "maestro_tablas")
+        print(f"   ✅ Maestro tablas cargado: {PROCESSED_DIR}")
 
         # Crear diccionarios de mapeo
         mapeo_id_a_nombre_tabla = dict(zip(df_maestro_tablas['id_tabla'], df_maestro_tablas['nombre_tabla']))
         mapeo_nombre_a_id_tabla = dict(zip(df_maestro_tablas['nombre_tabla'], df_maestro_tablas['id_tabla']))
         
-        return metadata_sp, mapeo_id_a_nombre_tabla, mapeo_nombre_a_id_tabla
+        # Volumen por tabla (filas, bytes) si la ingesta lo trajo
+        volumen_por_tabla = {}
+        if 'bytes' in df_maestro_tablas.columns:
+            for _, fila in df_maestro_tablas.dropna(subset=['bytes']).iterrows():
+                volumen_por_tabla[fila['nombre_tabla']] = {'filas': int(fila['filas']), 'bytes': int(fila['bytes'])}
+        
+        # Costo de ejecución por SP (maestro_sp), si la ingesta trajo estadísticas
+        df_maestro_sp = cargar_tabla(PROCESSED_DIR, "maestro_sp")
+        if 'tiempo_total_ms' in df_maestro_sp.columns:
+            df_ejecucion = df_maestro_sp.dropna(subset=['ejecuciones']).astype({'ejecuciones': 'int64'})
+            ejecucion_por_sp = dict(zip(df_ejecucion['id_sp'],
+                                        df_ejecucion[COLUMNAS_EJECUCION].to_dict('records')))
+            for sp in metadata_sp:
+                if sp['id_sp'] in ejecucion_por_sp:
+                    sp['ejecucion'] = ejecucion_por_sp[sp['id_sp']]
+        
+        return metadata_sp, mapeo_id_a_nombre_tabla, mapeo_nombre_a_id_tabla, volumen_por_tabla
         
     except Exception as e:
         print(f"❌ Error cargando datos: {e}")
-        return None, None, None
+        return None, None, None, None
 
 def identificar_sps_generadores_reales(metadata_sp, mapeo_id_a_nombre_tabla):
     """
@@ -71,7 +90,8 @@ def identificar_sps_generadores_reales(metadata_sp, mapeo_id_a_nombre_tabla):
                 'sp_nombre': sp_nombre,
                 'inputs': [mapeo_id_a_nombre_tabla.get(inp, inp) for inp in sp.get('inputs', [])],
                 'external_sources': sp.get('external_sources', False),
-                'creates_tables': sp.get('creates_tables', False)
+                'creates_tables': sp.get('creates_tables', False),
+                'ejecucion': sp.get('ejecucion')
             })
     
     print(f"✅ SPs generadores identificados para {len(sps_por_tabla)} tablas")
@@ -82,10 +102,13 @@ def identificar_sps_generadores_reales(metadata_sp, mapeo_id_a_nombre_tabla):
     
     return dict(sps_por_tabla)
 
-def construir_maestro_trazabilidad(sps_por_tabla, mapeo_nombre_a_id_tabla):
+def construir_maestro_trazabilidad(sps_por_tabla, mapeo_nombre_a_id_tabla, volumen_por_tabla=None):
     """
-    Construye el maestro de trazabilidad usando memoización
+    Construye el maestro de trazabilidad usando memoización.
+    Con volumen_por_tabla cada tabla lleva sus filas/bytes y cada SP generador
+    los bytes que lee (bytes_entrada), para ordenar los flujos por volumen.
     """
+    volumen_por_tabla = volumen_por_tabla or {}
     print("\n🏗️ CONSTRUYENDO MAESTRO DE TRAZABILIDAD...")
     
     maestro = {}
@@ -145,7 +168,9 @@ def construir_maestro_trazabilidad(sps_por_tabla, mapeo_nombre_a_id_tabla):
                     'inputs_trazabilidad': inputs_trazabilidad,
                     'external_sources': sp['external_sources'],
                     'creates_tables': sp['creates_tables'],
-                    'profundidad_contribucion': profundidad_sp
+                    'profundidad_contribucion': profundidad_sp,
+                    'ejecucion': sp.get('ejecucion'),
+                    'bytes_entrada': sum(volumen_por_tabla.get(t, {}).get('bytes', 0) for t in sp['inputs'])
                 })
                 
                 profundidad_maxima = max(profundidad_maxima, profundidad_sp)
@@ -180,6 +205,8 @@ def construir_maestro_trazabilidad(sps_por_tabla, mapeo_nombre_a_id_tabla):
 
         maestro[tabla] = {
             'tabla_id': tabla_id,
+            'filas': volumen_por_tabla.get(tabla, {}).get('filas'),
+            'bytes': volumen_por_tabla.get(tabla, {}).get('bytes'),
             'trazabilidad': resultado_traza
         }
     
@@ -222,6 +249,34 @@ def mostrar_estadisticas_maestro(maestro):
     print(f"\n🏆 TOP 5 TABLAS MÁS COMPLEJAS:")
     for tabla, complejidad in tablas_complejas[:5]:
         print(f"   {tabla}: {complejidad} tablas origen")
+    
+    df_flujos = ranking_flujos_por_bytes(maestro)
+    if not df_flujos.empty and df_flujos['bytes_movidos'].sum() > 0:
+        print(f"\n🏋️ TOP 5 FLUJOS POR BYTES MOVIDOS:")
+        for _, flujo in df_flujos.head(5).iterrows():
+            print(f"   {flujo['sp_id']} → {flujo['tabla']}: {flujo['bytes_movidos'] / 1024 ** 2:,.1f} MB")
+
+def ranking_flujos_por_bytes(maestro):
+    """
+    Flujos SP → tabla ordenados por bytes movidos: lo que el SP lee (suma de sus
+    inputs) más el tamaño de la tabla que genera. Es una cota, no una medición.
+    """
+    flujos = []
+    for tabla, info in maestro.items():
+        for sp in info['trazabilidad'].get('sps_generadores', []):
+            bytes_salida = info.get('bytes') or 0
+            flujos.append({
+                'sp_id': sp['sp_id'],
+                'sp_nombre': sp['sp_nombre'],
+                'tabla': tabla,
+                'tabla_id': info['tabla_id'],
+                'bytes_entrada': sp.get('bytes_entrada', 0),
+                'bytes_salida': bytes_salida,
+                'bytes_movidos': sp.get('bytes_entrada', 0) + bytes_salida
+            })
+    columnas = ['sp_id', 'sp_nombre', 'tabla', 'tabla_id', 'bytes_entrada', 'bytes_salida', 'bytes_movidos']
+    df = pd.DataFrame(flujos, columns=columnas)
+    return df.sort_values('bytes_movidos', ascending=False, kind='stable').reset_index(drop=True)
 
 def consultar_trazabilidad_tabla(maestro, tabla_consulta):
     """Consulta la trazabilidad de una tabla específica"""
@@ -247,6 +302,9 @@ def consultar_trazabilidad_tabla(maestro, tabla_consulta):
         for sp in trazabilidad['sps_generadores']:
             print(f"   • {sp['sp_id']} - {sp['sp_nombre']}")
             print(f"     Inputs: {len(sp['inputs'])} tablas")
+            if sp.get('ejecucion'):
+                print(f"     ⏱️  {sp['ejecucion']['ejecuciones']:,.0f} ejecuciones | "
+                      f"{sp['ejecucion']['tiempo_total_ms'] / 1000:,.1f} s en total")
             if sp['external_sources']:
                 print(f"     🌐 TIENE FUENTES EXTERNAS")
         
@@ -303,7 +361,7 @@ def main():
     print("💡 Estrategia: Bottom-up con Memoización\n")
     
     # Cargar datos
-    metadata_sp, mapeo_id_a_nombre_tabla, mapeo_nombre_a_id_tabla = cargar_datos()
+    metadata_sp, mapeo_id_a_nombre_tabla, mapeo_nombre_a_id_tabla, volumen_por_tabla = cargar_datos()
     if not all([metadata_sp, mapeo_id_a_nombre_tabla, mapeo_nombre_a_id_tabla]):
         return
     
@@ -311,13 +369,16 @@ def main():
     sps_por_tabla = identificar_sps_generadores_reales(metadata_sp, mapeo_id_a_nombre_tabla)
     
     # Paso 2: Construir maestro con memoización
-    maestro, cache = construir_maestro_trazabilidad(sps_por_tabla, mapeo_nombre_a_id_tabla)
+    maestro, cache = construir_maestro_trazabilidad(sps_por_tabla, mapeo_nombre_a_id_tabla, volumen_por_tabla)
     
     # Paso 3: Mostrar estadísticas
     mostrar_estadisticas_maestro(maestro)
     
-    # Paso 4: Guardar maestro
+    # Paso 4: Guardar maestro (y el ranking de flujos por volumen, para triage y analítica)
     guardar_maestro(maestro)
+    if volumen_por_tabla:
+        ruta_flujos = guardar_tabla(ranking_flujos_por_bytes(maestro), GOLD_DIR, "flujos_por_volumen")
+        print(f"   🏋️ Ranking de flujos por bytes: {ruta_flujos}")
     
     # Paso 5: Consulta interactiva
     while True:
@@ -1,7 +1,6 @@
 #antes: 6_trazabilidad_tablas.py
 
 # actual: src/04_lineage_core/08_consulta_interactiva.py
-import pandas as pd
 import json
 import os
 import sys
@@ -19,6 +18,7 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import RAW_DIR, PROCESSED_DIR, KNOWLEDGE_DIR
+from capa_datos import cargar_tabla, cargar_tabla_raw, existe_tabla
 
 def cargar_metadata_sp():
     """Carga el banco de metadata de SPs"""
@@ -33,8 +33,8 @@ def cargar_metadata_sp():
 def cargar_maestros():
     """Carga todos los maestros necesarios"""
     try:
-        df_maestro_sp = pd.read_csv(os.path.join(PROCESSED_DIR, "maestro_sp.csv"))
-        df_maestro_tablas = pd.read_csv(os.path.join(PROCESSED_DIR, "maestro_tablas.csv"))
+        df_maestro_sp = cargar_tabla(PROCESSED_DIR, "maestro_sp")
+        df_maestro_tablas = cargar_tabla(PROCESSED_DIR, "maestro_tablas")
         
         mapeo_nombre_a_id_sp = dict(zip(df_maestro_sp['nombre_sp'], df_maestro_sp['id_sp']))
         mapeo_id_a_nombre_tabla = dict(zip(df_maestro_tablas['id_tabla'], df_maestro_tablas['nombre_tabla']))
@@ -69,9 +69,9 @@ def construir_arbol_trazabilidad(tabla_objetivo, metadata_sp, mapeo_nombre_a_id_
     
     # Cargar dependencias del CSV (Datos crudos)
     try:
-        df_deps = pd.read_csv(os.path.join(RAW_DIR, "dependencias_sql.csv"))
+        df_deps = cargar_tabla_raw(RAW_DIR, "dependencias_sql")
     except FileNotFoundError:
-        print(f"❌ No se pudo cargar dependencias_sql.csv desde {RAW_DIR}")
+        print(f"❌ No se pudo cargar dependencias_sql desde {RAW_DIR}")
         return None
     
     # Estructura del árbol
@@ -296,6 +296,26 @@ def generar_reporte_completo(tabla_objetivo):
     else:
         print("❌ No se pudo generar el reporte de trazabilidad")
 
+def cargar_llamadas_sp():
+    """Cierre de llamadas EXEC de 02_grafo_base (Origen_SP, Destino_SP, Profundidad), o None"""
+    if not existe_tabla(PROCESSED_DIR, "llamadas_sp"):
+        return None
+    return cargar_tabla(PROCESSED_DIR, "llamadas_sp")
+
+def mostrar_llamadas_sp(sp_nombre, df_llamadas):
+    """
+    Todo lo que un procedimiento ejecuta, directa o anidadamente, desde el cierre
+    ya calculado: no se vuelve a leer código.
+    """
+    llamados = df_llamadas[df_llamadas['Origen_SP'] == sp_nombre].sort_values(['Profundidad', 'Destino_SP'])
+    print(f"\n📞 PROCEDIMIENTOS QUE EJECUTA: {sp_nombre}")
+    print("=" * 50)
+    for profundidad, grupo in llamados.groupby('Profundidad'):
+        print(f"   📁 Nivel {profundidad}{' (EXEC directo)' if profundidad == 1 else ''}:")
+        for destino in grupo['Destino_SP']:
+            print(f"      └─ {destino}")
+    print(f"\n• Total ejecutados: {len(llamados)} | anidamiento: {llamados['Profundidad'].max()} niveles")
+
 def main():
     """
     Función principal
@@ -312,6 +332,12 @@ def main():
         print("❌ Debes ingresar un nombre de tabla")
         return
     
+    # Un procedimiento orquestador (EXEC a otros) se expande con el grafo de llamadas
+    df_llamadas = cargar_llamadas_sp()
+    if df_llamadas is not None and tabla in set(df_llamadas['Origen_SP']):
+        mostrar_llamadas_sp(tabla, df_llamadas)
+        return
+    
     print(f"\n🚀 Iniciando análisis completo de: {tabla}")
     print("⏳ Esto puede tomar varios segundos...\n")
     
@@ -1,7 +1,6 @@
 #antes: 5_8_test_dependencias.py
 
 # actual: src/04_lineage_core/09_qa_profundidad.py
-import pandas as pd
 import json
 import os
 import sys
@@ -19,6 +18,7 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import RAW_DIR, PROCESSED_DIR, KNOWLEDGE_DIR
+from capa_datos import cargar_tabla, cargar_tabla_raw
 
 def cargar_metadata_sp():
     """Carga el banco de metadata de SPs"""
@@ -33,8 +33,8 @@ def cargar_metadata_sp():
 def cargar_maestros():
     """Carga todos los maestros necesarios"""
     try:
-        df_maestro_sp = pd.read_csv(os.path.join(PROCESSED_DIR, "maestro_sp.csv"))
-        df_maestro_tablas = pd.read_csv(os.path.join(PROCESSED_DIR, "maestro_tablas.csv"))
+        df_maestro_sp = cargar_tabla(PROCESSED_DIR, "maestro_sp")
+        df_maestro_tablas = cargar_tabla(PROCESSED_DIR, "maestro_tablas")
         
         mapeo_nombre_a_id_sp = dict(zip(df_maestro_sp['nombre_sp'], df_maestro_sp['id_sp']))
         mapeo_id_a_nombre_tabla = dict(zip(df_maestro_tablas['id_tabla'], df_maestro_tablas['nombre_tabla']))
@@ -69,9 +69,9 @@ def construir_arbol_trazabilidad(tabla_objetivo, metadata_sp, mapeo_nombre_a_id_
     
     # Cargar dependencias del CSV (Raw)
     try:
-        df_deps = pd.read_csv(os.path.join(RAW_DIR, "dependencias_sql.csv"))
+        df_deps = cargar_tabla_raw(RAW_DIR, "dependencias_sql")
     except FileNotFoundError:
-        print(f"❌ No se pudo cargar dependencias_sql.csv desde {RAW_DIR}")
+        print(f"❌ No se pudo cargar dependencias_sql desde {RAW_DIR}")
         return None
     
     # Estructura del árbol
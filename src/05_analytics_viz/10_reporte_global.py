@@ -1,7 +1,6 @@
 #antes: 6_3_reporte_global_sistema.py
 
 # src/05_analytics_viz/10_reporte_global.py
-import pandas as pd
 import json
 import os
 import sys
@@ -20,6 +19,7 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import KNOWLEDGE_DIR, PROCESSED_DIR, GOLD_DIR
+from capa_datos import cargar_tabla
 
 class GeneradorMaestroTrazabilidad:
     def __init__(self):
@@ -43,11 +43,8 @@ class GeneradorMaestroTrazabilidad:
                 self.metadata_sp = json.load(f)
             
             # Maestros (Capa Processed)
-            path_tablas = os.path.join(PROCESSED_DIR, "maestro_tablas.csv")
-            path_sp = os.path.join(PROCESSED_DIR, "maestro_sp.csv")
-            
-            self.maestro_tablas = pd.read_csv(path_tablas)
-            self.maestro_sp = pd.read_csv(path_sp)
+            self.maestro_tablas = cargar_tabla(PROCESSED_DIR, "maestro_tablas")
+            self.maestro_sp = cargar_tabla(PROCESSED_DIR, "maestro_sp")
             
             print("✅ Datos cargados correctamente")
             return True
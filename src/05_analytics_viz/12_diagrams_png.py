@@ -1,7 +1,6 @@
 # antes: 3_visualizador_lineaje.py
 
 # src/05_analytics_viz/12_diagrams_png.py
-import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 import os
@@ -19,22 +18,23 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import PROCESSED_DIR, IMG_DIR
+from capa_datos import cargar_tabla, existe_tabla
 
 # Configuración de Archivos
-INPUT_CSV = os.path.join(PROCESSED_DIR, "relaciones_finales.csv")
+INPUT_TABLA = "relaciones_finales"
 OUTPUT_IMG_DIR = IMG_DIR
 
 # Aseguramos que exista el directorio de salida
 os.makedirs(OUTPUT_IMG_DIR, exist_ok=True)
 
 def generar_diagramas():
-    print(f"🎨 Cargando grafo desde: {INPUT_CSV}")
+    print(f"🎨 Cargando grafo desde: {PROCESSED_DIR} ({INPUT_TABLA})")
     
-    if not os.path.exists(INPUT_CSV):
+    if not existe_tabla(PROCESSED_DIR, INPUT_TABLA):
         print(f"❌ Error: No se encuentra el archivo de relaciones.")
         return
 
-    df = pd.read_csv(INPUT_CSV)
+    df = cargar_tabla(PROCESSED_DIR, INPUT_TABLA)
 
     # Crear Grafo Global
     G = nx.DiGraph()
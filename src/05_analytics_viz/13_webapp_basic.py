@@ -20,6 +20,7 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import PROCESSED_DIR, API_KEY_FILE
+from capa_datos import cargar_tabla, existe_tabla
 
 # ==============================================
 # CONFIGURACIÓN DE PÁGINA
@@ -33,12 +34,10 @@ st.set_page_config(page_title="Gloria RTM - Linaje IA (Básico)", layout="wide")
 @st.cache_data
 def cargar_grafo():
     """Carga los datos procesados y crea el grafo en memoria."""
-    ruta_csv = os.path.join(PROCESSED_DIR, "relaciones_finales.csv")
-    
-    if not os.path.exists(ruta_csv):
+    if not existe_tabla(PROCESSED_DIR, "relaciones_finales"):
         return None, None
 
-    df_rel = pd.read_csv(ruta_csv)
+    df_rel = cargar_tabla(PROCESSED_DIR, "relaciones_finales")
     G = nx.DiGraph()
     for _, row in df_rel.iterrows():
         G.add_edge(row['Origen'], row['Destino'], tipo=row['Relacion'])
@@ -76,7 +75,7 @@ def consultar_openai_generico(cliente, mensaje_usuario):
 # 1. Cargar Grafo
 G, df_rel = cargar_grafo()
 if G is None:
-    st.error("⚠️ No se encontró 'relaciones_finales.csv'. Ejecuta los scripts de procesamiento primero.")
+    st.error("⚠️ No se encontró 'relaciones_finales' (.parquet/.csv). Ejecuta los scripts de procesamiento primero.")
     st.stop()
 else:
     st.sidebar.success(f"✅ Grafo cargado: {len(G.nodes())} Nodos")
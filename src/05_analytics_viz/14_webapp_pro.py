@@ -21,6 +21,8 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import PROCESSED_DIR, RAW_DIR, API_KEY_FILE
+from capa_datos import cargar_tabla, existe_tabla, cargar_tabla_raw, existe_tabla_raw
+from almacen_codigo import AlmacenCodigo
 
 # ==============================================
 # CONFIGURACIÓN DE PÁGINA
@@ -33,31 +35,37 @@ st.set_page_config(page_title="Gloria RTM - Linaje IA (PRO)", layout="wide")
 
 @st.cache_data
 def cargar_datos():
-    """Carga Grafo y Diccionario de Código Fuente"""
+    """Carga Grafo e índice nombre -> huella del código (el texto se lee bajo demanda)"""
     
     # 1. Cargar Relaciones (Grafo) desde PROCESSED
-    ruta_rel = os.path.join(PROCESSED_DIR, "relaciones_finales.csv")
-    if not os.path.exists(ruta_rel):
+    if not existe_tabla(PROCESSED_DIR, "relaciones_finales"):
         return None, None, None
 
-    df_rel = pd.read_csv(ruta_rel)
+    df_rel = cargar_tabla(PROCESSED_DIR, "relaciones_finales")
     G = nx.DiGraph()
     for _, row in df_rel.iterrows():
         G.add_edge(row['Origen'], row['Destino'], tipo=row['Relacion'])
     
-    # 2. Cargar Código Fuente (Diccionario para búsqueda rápida) desde RAW
-    ruta_code = os.path.join(RAW_DIR, "codigo_fuente.csv")
-    diccionario_codigo = {}
+    # 2. Índice Nombre_Objeto -> Hash_Definicion desde RAW (sin cargar el código:
+    # cada objeto se descomprime del almacén solo cuando se selecciona)
+    hash_por_objeto = {}
     
-    if os.path.exists(ruta_code):
-        df_code = pd.read_csv(ruta_code)
-        # Creamos un mapa: Nombre_Objeto -> Codigo_SQL
-        # Normalizamos nombres a mayúsculas por si acaso
+    if existe_tabla_raw(RAW_DIR, "codigo_fuente"):
+        df_code = cargar_tabla_raw(RAW_DIR, "codigo_fuente", columnas=["Nombre_Objeto", "Hash_Definicion"])
         # Manejo seguro de nulos
-        df_code = df_code.dropna(subset=['Nombre_Objeto', 'Codigo_SQL'])
-        diccionario_codigo = pd.Series(df_code.Codigo_SQL.values, index=df_code.Nombre_Objeto).to_dict()
+        df_code = df_code.dropna(subset=['Nombre_Objeto', 'Hash_Definicion'])
+        hash_por_objeto = pd.Series(df_code.Hash_Definicion.values, index=df_code.Nombre_Objeto).to_dict()
     
-    return G, df_rel, diccionario_codigo
+    return G, df_rel, hash_por_objeto
+
+@st.cache_resource
+def abrir_almacen():
+    """Almacén de código (mmap) compartido entre sesiones de la app"""
+    return AlmacenCodigo(RAW_DIR)
+
+def obtener_codigo(nombre, defecto=""):
+    """Código de un objeto por nombre, leído del almacén por su huella"""
+    return abrir_almacen().obtener(hash_por_objeto.get(nombre), defecto)
 
 def cargar_api_key():
     try:
@@ -187,7 +195,7 @@ def visualizar_linaje_ascii(ruta):
 # ==============================================
 # INICIALIZACIÓN
 # ==============================================
-G, df_rel, dic_codigo = cargar_datos()
+G, df_rel, hash_por_objeto = cargar_datos()
 
 if G is None:
     st.error(f"⚠️ Faltan archivos de datos en {PROCESSED_DIR} o {RAW_DIR}. Ejecuta la ingesta primero.")
@@ -208,7 +216,7 @@ opciones = sorted(list(G.nodes()))
 seleccion = st.selectbox("🔍 Selecciona Tabla o SP para analizar:", opciones)
 
 # Recuperamos el código fuente del objeto seleccionado (si existe)
-codigo_objeto_actual = dic_codigo.get(seleccion, " -- No se encontró código fuente para este objeto (puede ser una tabla externa).")
+codigo_objeto_actual = obtener_codigo(seleccion, " -- No se encontró código fuente para este objeto (puede ser una tabla externa).")
 
 # Buscamos vecinos para enriquecer el contexto
 padres = list(G.predecessors(seleccion))
@@ -262,7 +270,7 @@ with col2:
             # Concatenar código de TODOS los SPs padres
             codigos_encontrados = 0
             for sp in sps_que_escriben[:5]:  # Límite a 5 SPs para no reventar tokens
-                codigo_sp = dic_codigo.get(sp, "")
+                codigo_sp = obtener_codigo(sp, "")
                 if codigo_sp and len(codigo_sp) > 50:
                     contexto_para_ia += f"\n\n-- CÓDIGO PADRE: {sp} --\n{codigo_sp}"
                     objetos_analizados.append(sp)
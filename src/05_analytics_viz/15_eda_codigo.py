@@ -2,7 +2,6 @@
 # eda_profundo/1_eda_codigo_fuente.py
 
 # actual: src/05_analytics_viz/15_eda_codigo.py
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
@@ -22,6 +21,8 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import RAW_DIR, EDA_PROFUNDO_DIR
+from capa_datos import existe_tabla_raw
+from almacen_codigo import cargar_indice_codigo
 
 # Intentar importar WordCloud
 try:
@@ -33,7 +34,7 @@ except ImportError:
     WORDCLOUD_AVAILABLE = False
 
 # Configuración de Archivos
-INPUT_FILE = os.path.join(RAW_DIR, "codigo_fuente.csv")
+INPUT_TABLA = "codigo_fuente"
 OUTPUT_DIR = os.path.join(EDA_PROFUNDO_DIR, "1_codigo_imgs")
 
 # Crear carpeta de salida si no existe
@@ -49,19 +50,21 @@ plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
 # ==============================================
 
 def cargar_datos():
-    """Carga el CSV de código fuente"""
-    print(f"📂 Cargando archivo desde: {INPUT_FILE}")
-    if not os.path.exists(INPUT_FILE):
-        print("❌ Error: No se encuentra codigo_fuente.csv")
+    """Carga el índice de código fuente y trae cada cuerpo del almacén de código"""
+    print(f"📂 Cargando {INPUT_TABLA} desde: {RAW_DIR}")
+    if not existe_tabla_raw(RAW_DIR, INPUT_TABLA):
+        print("❌ Error: No se encuentra codigo_fuente (.parquet/.csv)")
         return None
     try:
-        df = pd.read_csv(INPUT_FILE)
+        df, almacen = cargar_indice_codigo(RAW_DIR)
+        df['Codigo_SQL'] = [almacen.obtener(h) if isinstance(h, str) else None for h in df['Hash_Definicion']]
+        almacen.cerrar()
         print(f"✅ Cargados {len(df)} scripts SQL.")
         # Filtrar vacíos
         df = df.dropna(subset=['Codigo_SQL'])
         return df
     except Exception as e:
-        print(f"❌ Error leyendo CSV: {e}")
+        print(f"❌ Error leyendo código fuente: {e}")
         return None
 
 def calcular_metricas(df):
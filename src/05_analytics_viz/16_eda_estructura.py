@@ -20,9 +20,10 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import RAW_DIR, EDA_PROFUNDO_DIR
+from capa_datos import cargar_tabla_raw, existe_tabla_raw
 
 # Configuración de Archivos
-INPUT_FILE = os.path.join(RAW_DIR, "metadata_tablas.csv")
+INPUT_TABLA = "metadata_tablas"
 OUTPUT_DIR = os.path.join(EDA_PROFUNDO_DIR, "2_estructura_imgs")
 
 # Crear carpeta de salida si no existe
@@ -39,16 +40,16 @@ plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial']
 
 def cargar_metadata():
     """Carga el diccionario de datos (tablas y columnas)"""
-    print(f"📂 Cargando archivo desde: {INPUT_FILE}")
-    if not os.path.exists(INPUT_FILE):
-        print("❌ Error: No se encuentra metadata_tablas.csv")
+    print(f"📂 Cargando {INPUT_TABLA} desde: {RAW_DIR}")
+    if not existe_tabla_raw(RAW_DIR, INPUT_TABLA):
+        print("❌ Error: No se encuentra metadata_tablas (.parquet/.csv)")
         return None
     try:
-        df = pd.read_csv(INPUT_FILE)
+        df = cargar_tabla_raw(RAW_DIR, INPUT_TABLA)
         print(f"✅ Cargadas {len(df)} definiciones de columnas.")
         return df
     except Exception as e:
-        print(f"❌ Error leyendo CSV: {e}")
+        print(f"❌ Error leyendo metadata: {e}")
         return None
 
 def calcular_metricas_tabla(df_cols):
@@ -1,7 +1,6 @@
 # antes: eda_profundo/3_eda_cobertura_ia.py
 
 # actual: src/05_analytics_viz/17_eda_cobertura.py
-import pandas as pd
 import json
 import os
 import sys
@@ -20,11 +19,12 @@ sys.path.append(src_dir)
 
 # Importamos las rutas maestras
 from config_paths import RAW_DIR, KNOWLEDGE_DIR, PROCESSED_DIR, EDA_PROFUNDO_DIR
+from capa_datos import cargar_tabla, cargar_tabla_raw, existe_tabla
 
 # Configuración de Archivos
-FILE_SQL_DEPS = os.path.join(RAW_DIR, "dependencias_sql.csv")
+TABLA_SQL_DEPS = "dependencias_sql"
 FILE_IA_META = os.path.join(KNOWLEDGE_DIR, "banco_metadata_sp.json")
-FILE_MAESTRO_TABLAS = os.path.join(PROCESSED_DIR, "maestro_tablas.csv")
+TABLA_MAESTRO_TABLAS = "maestro_tablas"
 OUTPUT_DIR = os.path.join(EDA_PROFUNDO_DIR, "3_cobertura_imgs")
 
 # Crear carpeta de salida
@@ -42,13 +42,13 @@ def cargar_datos():
     
     # 1. Dependencias SQL (Oficiales)
     try:
-        print(f"   > Leyendo: {FILE_SQL_DEPS}")
-        df_sql = pd.read_csv(FILE_SQL_DEPS)
+        print(f"   > Leyendo: {TABLA_SQL_DEPS} ({RAW_DIR})")
+        df_sql = cargar_tabla_raw(RAW_DIR, TABLA_SQL_DEPS)
         # Filtramos solo lo que sean dependencias a tablas
         df_sql = df_sql.dropna(subset=['Origen_SP', 'Destino_Tabla'])
         print(f"   ✅ SQL Server reporta: {len(df_sql)} dependencias.")
     except Exception as e:
-        print(f"   ❌ Error cargando CSV SQL: {e}")
+        print(f"   ❌ Error cargando dependencias SQL: {e}")
         return None, None, None
 
     # 2. Metadata IA
@@ -64,8 +64,8 @@ def cargar_datos():
     # 3. Maestro de Tablas (Para traducir IDs si fuera necesario)
     mapa_ids = {}
     try:
-        if os.path.exists(FILE_MAESTRO_TABLAS):
-            df_tablas = pd.read_csv(FILE_MAESTRO_TABLAS)
+        if existe_tabla(PROCESSED_DIR, TABLA_MAESTRO_TABLAS):
+            df_tablas = cargar_tabla(PROCESSED_DIR, TABLA_MAESTRO_TABLAS)
             mapa_ids = dict(zip(df_tablas['id_tabla'], df_tablas['nombre_tabla']))
     except:
         pass # No es crítico si fallamos aquí, asumiremos nombres directos
@@ -0,0 +1,204 @@
+# src/almacen_codigo.py
+import os
+import mmap
+import zlib
+import hashlib
+import threading
+import pandas as pd
+
+from capa_datos import (cargar_tabla, guardar_tabla, existe_tabla, leer_por_lotes, espacios_raw,
+                        cargar_tabla_raw, columnas_tabla)
+
+# ==============================================
+# ALMACÉN DE CÓDIGO DIRECCIONADO POR CONTENIDO
+# ==============================================
+# Un solo lugar para el código de SPs, vistas, funciones y triggers, indexado por
+# la huella de la definición (Hash_Definicion, SHA2_256 sobre UTF-16LE como en
+# HASHBYTES). Cada cuerpo se guarda una sola vez, comprimido, en un archivo .pack
+# de solo-agregar; el índice (hash -> offset, bytes) es una tabla chica que cabe
+# en memoria. Leer un objeto es un slice del mmap y un zlib.decompress: O(1), sin
+# cargar el resto del corpus. Cuerpos idénticos entre bases o versiones se
+# guardan una vez. Una vez publicado, codigo_fuente queda solo con los metadatos
+# (nombre, huella, tipo, objeto padre): el texto vive únicamente en el pack.
+NOMBRE_ALMACEN = "almacen_codigo"
+NIVEL_COMPRESION = 6
+COLUMNAS_INDICE = ["Hash_Definicion", "Offset", "Bytes_Comprimidos", "Caracteres"]
+
+# Varias bases extraídas en paralelo (hilos) publican en el mismo almacén: cada
+# sincronización lee el índice, agrega y lo guarda bajo el mismo candado
+_locks = {}
+_lock_global = threading.Lock()
+
+def _lock_de(ruta):
+    with _lock_global:
+        return _locks.setdefault(os.path.abspath(ruta), threading.RLock())
+
+def hash_definicion(codigo):
+    """Misma huella que CONVERT(VARCHAR(64), HASHBYTES('SHA2_256', definition), 2)"""
+    return hashlib.sha256(codigo.encode("utf-16-le")).hexdigest().upper()
+
+class AlmacenCodigo:
+    """
+    Pack de blobs zlib + índice por hash. Se abre para lectura con mmap y se
+    agrega con agregar()/guardar(); un hash ya presente no se vuelve a escribir.
+    """
+    def __init__(self, directorio, nombre=NOMBRE_ALMACEN):
+        self.directorio = directorio
+        self.nombre = nombre
+        self.ruta_pack = os.path.join(directorio, nombre + ".pack")
+        self.nombre_indice = nombre + "_indice"
+        self._indice = {}
+        self._nuevos = []
+        self._archivo = None
+        self._mmap = None
+        if existe_tabla(directorio, self.nombre_indice):
+            df = cargar_tabla(directorio, self.nombre_indice)
+            self._indice = {h: (int(o), int(b), int(c)) for h, o, b, c in
+                            zip(df["Hash_Definicion"], df["Offset"], df["Bytes_Comprimidos"], df["Caracteres"])}
+
+    def __len__(self):
+        return len(self._indice)
+
+    def __contains__(self, hash_def):
+        return hash_def in self._indice
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def caracteres(self, hash_def):
+        """Largo del código sin descomprimirlo (None si no está)"""
+        entrada = self._indice.get(hash_def)
+        return entrada[2] if entrada else None
+
+    def obtener(self, hash_def, defecto=None):
+        """Código de una huella: un slice del mmap y una descompresión"""
+        entrada = self._indice.get(hash_def)
+        if entrada is None:
+            return defecto
+        offset, bytes_comprimidos, _ = entrada
+        if self._mmap is None or offset + bytes_comprimidos > len(self._mmap):
+            self._mapear()
+        return zlib.decompress(self._mmap[offset:offset + bytes_comprimidos]).decode("utf-8")
+
+    def _mapear(self):
+        self._cerrar_mmap()
+        self._archivo = open(self.ruta_pack, "rb")
+        self._mmap = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _cerrar_mmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._archivo.close()
+            self._mmap = self._archivo = None
+
+    def agregar(self, pares):
+        """
+        Agrega pares (hash, código) que no estén ya en el almacén. Los hashes vacíos
+        se calculan. Retorna cuántos cuerpos nuevos se escribieron al pack.
+        """
+        nuevos = 0
+        with _lock_de(self.ruta_pack), open(self.ruta_pack, "ab") as pack:
+            offset = pack.tell()
+            for hash_def, codigo in pares:
+                if codigo is None or (isinstance(codigo, float) and pd.isna(codigo)):
+                    continue
+                if not isinstance(hash_def, str) or not hash_def:
+                    hash_def = hash_definicion(codigo)
+                if hash_def in self._indice:
+                    continue
+                blob = zlib.compress(codigo.encode("utf-8"), NIVEL_COMPRESION)
+                pack.write(blob)
+                self._indice[hash_def] = (offset, len(blob), len(codigo))
+                self._nuevos.append(hash_def)
+                offset += len(blob)
+                nuevos += 1
+        return nuevos
+
+    def guardar(self):
+        """Persiste el índice (el pack ya quedó escrito en agregar())"""
+        if not self._nuevos and existe_tabla(self.directorio, self.nombre_indice):
+            return
+        filas = [(h, o, b, c) for h, (o, b, c) in self._indice.items()]
+        with _lock_de(self.ruta_pack):
+            guardar_tabla(pd.DataFrame(filas, columns=COLUMNAS_INDICE), self.directorio, self.nombre_indice)
+        self._nuevos = []
+
+    def cerrar(self):
+        self._cerrar_mmap()
+
+    def resumen(self):
+        """Objetos únicos, MB comprimidos en el pack y MB de código original (UTF-8 aprox.)"""
+        mb_pack = sum(b for _, b, _ in self._indice.values()) / 1024 ** 2
+        mb_original = sum(c for _, _, c in self._indice.values()) / 1024 ** 2
+        return {"objetos_unicos": len(self._indice), "mb_pack": round(mb_pack, 2),
+                "mb_original": round(mb_original, 2),
+                "compresion": round(mb_original / mb_pack, 2) if mb_pack else None}
+
+def sincronizar_almacen(directorio_raw, directorio_almacen=None, tam_lote=2000):
+    """
+    Publica en el almacén el código de la capa RAW (todas las bases si es multi-base),
+    leyendo codigo_fuente por lotes. Los cuerpos ya presentes solo cuestan una
+    búsqueda en el índice. Con el índice guardado, codigo_fuente se reescribe sin
+    Codigo_SQL. Retorna (almacén, cuerpos nuevos, filas leídas).
+    """
+    directorio_almacen = directorio_almacen or directorio_raw
+    espacios = [e["directorio"] for e in espacios_raw(directorio_raw)] or [directorio_raw]
+    nuevos = filas = 0
+    publicados = []
+    with _lock_de(os.path.join(directorio_almacen, NOMBRE_ALMACEN + ".pack")):
+        almacen = AlmacenCodigo(directorio_almacen)
+        for directorio in espacios:
+            if not existe_tabla(directorio, "codigo_fuente") or \
+                    "Codigo_SQL" not in columnas_tabla(directorio, "codigo_fuente"):
+                continue
+            for lote in leer_por_lotes(directorio, "codigo_fuente", tam_lote):
+                hashes = lote["Hash_Definicion"] if "Hash_Definicion" in lote.columns else [None] * len(lote)
+                nuevos += almacen.agregar(zip(hashes, lote["Codigo_SQL"]))
+                filas += len(lote)
+            publicados.append(directorio)
+        almacen.guardar()
+    for directorio in publicados:
+        quitar_codigo(directorio)
+    return almacen, nuevos, filas
+
+def quitar_codigo(directorio):
+    """Reescribe codigo_fuente sin Codigo_SQL (ya publicado en el almacén)"""
+    columnas = columnas_tabla(directorio, "codigo_fuente")
+    if "Hash_Definicion" in columnas:
+        df_code = cargar_tabla(directorio, "codigo_fuente", columnas=[c for c in columnas if c != "Codigo_SQL"])
+    else:
+        # Extracción sin huellas: se calculan ahora, la única vez que el código está a mano
+        df_code = cargar_tabla(directorio, "codigo_fuente")
+        df_code["Hash_Definicion"] = [hash_definicion(c) if isinstance(c, str) else None for c in df_code["Codigo_SQL"]]
+        df_code = df_code.drop(columns=["Codigo_SQL"])
+    guardar_tabla(df_code, directorio, "codigo_fuente")
+
+def cargar_indice_codigo(directorio_raw):
+    """
+    codigo_fuente (nombre, huella, tipo y objeto padre) y el almacén al día. Si
+    alguna base todavía trae Codigo_SQL (extracciones previas al almacén), se
+    publica primero, lo que además le calcula las huellas que falten.
+    Retorna (DataFrame, almacén).
+    """
+    espacios = [e["directorio"] for e in espacios_raw(directorio_raw)] or [directorio_raw]
+    if any(existe_tabla(d, "codigo_fuente") and "Codigo_SQL" in columnas_tabla(d, "codigo_fuente")
+           for d in espacios):
+        sincronizar_almacen(directorio_raw)
+    disponibles = set(columnas_tabla(espacios[0], "codigo_fuente"))
+    columnas = [c for c in ("Nombre_Objeto", "Hash_Definicion", "Tipo_Codigo", "Objeto_Padre") if c in disponibles]
+    df_code = cargar_tabla_raw(directorio_raw, "codigo_fuente", columnas=columnas)
+    for columna in ("Tipo_Codigo", "Objeto_Padre"):
+        if columna not in df_code.columns:
+            df_code[columna] = None
+    return df_code, AlmacenCodigo(directorio_raw)
+
+def codigo_de_entrada(entrada, almacen, defecto="CÓDIGO NO DISPONIBLE"):
+    """Código de una entrada de maestro_sp.json: por hash en el almacén (o el codigo_sql de versiones previas)"""
+    if entrada.get("codigo_sql") is not None:
+        return entrada["codigo_sql"]
+    if almacen is None or not entrada.get("hash_definicion"):
+        return defecto
+    return almacen.obtener(entrada["hash_definicion"], defecto)
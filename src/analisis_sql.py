@@ -0,0 +1,1304 @@
+# src/analisis_sql.py
+import os
+import re
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+from sqlglot import exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.tokens import TokenType
+
+from capa_datos import calificar_nombre, base_de_nombre
+from almacen_codigo import AlmacenCodigo
+
+# ==============================================
+# ANÁLISIS DEL CÓDIGO SQL (SQLGlot)
+# ==============================================
+# Lee el código de cada objeto y deduce hacia dónde fluye el dato, en dos pasos:
+#   1. referencias_de_codigo: parseo (caro) -> tablas tocadas y cómo; solo depende
+#      del texto, así que se cachea por huella y corre en otros procesos.
+#   2. aristas_de_referencias: resolución (barata) con el nombre y tipo del objeto ->
+#      aristas compactas (origen, destino, relación, temporal) sin tocar el grafo;
+#      el padre las aplica en el mismo orden que una corrida en serie.
+# Un EXEC a otro procedimiento es una referencia más, con relación "EJECUTA", y
+# las tablas de un SQL dinámico plegado llevan un quinto campo "dinamico".
+# VERSION_EXTRACTOR entra en la clave de la caché: subirla al cambiar el paso 1.
+VERSION_EXTRACTOR = "11"
+TIPOS_CONSULTA = ("V", "FN", "IF", "TF")  # Objetos de solo lectura: todo lo que referencian es entrada
+
+def nombre_nodo_tabla(catalogo, esquema, tabla, nombre_sp, alias_por_base=None):
+    """
+    Nombre del nodo de una tabla del código. Con `alias_por_base` (capa RAW
+    multi-base) se califica con la base del SP; None es una capa de una sola base.
+    """
+    if alias_por_base is None or tabla.startswith(("#", "@")):
+        return tabla
+    base = alias_por_base.get(catalogo, catalogo) if catalogo else base_de_nombre(nombre_sp)
+    return calificar_nombre(tabla, base, esquema)
+
+# sqlglot >= 26 nombra "with_"/"from_" los argumentos que antes eran "with"/"from"
+CLAVE_WITH = "with_" if "with_" in exp.Select.arg_types else "with"
+CLAVE_FROM = "from_" if "from_" in exp.Select.arg_types else "from"
+
+# Nodos que fijan el contexto de todo su subárbol
+CONTEXTO_POR_TIPO = {exp.Select: "LEE", exp.Join: "LEE", exp.Subquery: "LEE", exp.CTE: "LEE"}
+# Nodos que no pueden contener tablas: no se apilan
+TIPOS_HOJA = {exp.Identifier, exp.Literal, exp.Column, exp.Star, exp.Var, exp.DataType, exp.Null,
+              exp.Boolean, exp.Parameter, exp.Placeholder}
+_tiene_with = {}
+
+def nombre_tabla(tabla):
+    """Nombre de un exp.Table como en T-SQL: #temporal, ##global y @variable conservan su prefijo"""
+    identificador = tabla.this
+    if type(identificador) is exp.Parameter:
+        return "@" + tabla.name
+    if type(identificador) is exp.Identifier:
+        if identificador.args.get("temporary"):
+            return "#" + tabla.name
+        if identificador.args.get("global_") or identificador.args.get("global"):
+            return "##" + tabla.name
+    return tabla.name
+
+def es_temporal_de_sesion(tabla):
+    """#temporal o variable de tabla: viven en la sesión del objeto, no son nodos del linaje"""
+    return tabla.startswith(("#", "@")) and not tabla.startswith("##")
+
+def _destino_alias(objetivo, desde):
+    """Tabla que escribe un UPDATE/DELETE por alias: `UPDATE a ... FROM tabla a` escribe en tabla"""
+    if isinstance(objetivo, exp.Table) and not objetivo.db and desde is not None:
+        for tabla in desde.find_all(exp.Table):
+            if tabla.alias == objetivo.name:
+                return tabla
+    return objetivo
+
+def recorrer_sentencia(sentencia):
+    """
+    Un recorrido de arriba hacia abajo (pila explícita, cada nodo una vez) que lleva
+    el contexto de la sentencia: qué subárbol es destino de escritura, cuál es
+    fuente de lectura y qué nombres son CTEs en el ámbito. Retorna
+    [(catálogo, esquema, tabla, relación)] en orden de aparición.
+      * INSERT: el destino ESCRIBE; el SELECT/VALUES de origen LEE.
+      * UPDATE: el destino (o la tabla de su alias en el FROM) ESCRIBE; FROM/JOIN/WHERE LEE.
+      * DELETE: igual que UPDATE (`DELETE a FROM tabla a JOIN ...` escribe en tabla).
+      * MERGE: el destino ESCRIBE; USING, ON y los WHEN LEE.
+      * TRUNCATE: las tablas truncadas ESCRIBE.
+      * SELECT ... INTO: la tabla nueva ESCRIBE; el resto del SELECT LEE.
+      * CREATE: el objeto creado ESCRIBE; el SELECT de CTAS o de una vista LEE.
+      * SELECT / JOIN / subconsulta / CTE: todo lo que cuelga LEE.
+      * Fuera de estos contextos: "" (sin arista).
+    """
+    referencias = []
+    omitidas = set()  # id() de tablas ya emitidas como destino de un UPDATE por alias
+    pila = [(sentencia, "", frozenset())]
+    sacar, apilar = pila.pop, pila.append
+    while pila:
+        nodo, relacion, ctes = sacar()
+        tipo = type(nodo)
+
+        tiene_with = _tiene_with.get(tipo)
+        if tiene_with is None:
+            tiene_with = _tiene_with[tipo] = CLAVE_WITH in tipo.arg_types
+        if tiene_with and nodo.args.get(CLAVE_WITH) is not None:
+            ctes = ctes | {cte.alias_or_name for cte in nodo.args[CLAVE_WITH].expressions}
+
+        if tipo is exp.Table:
+            # Un FROM a una CTE no es una tabla física
+            if id(nodo) not in omitidas and not (nodo.name in ctes and not nodo.db and not nodo.catalog):
+                referencias.append((nodo.catalog, nodo.db, nombre_tabla(nodo), relacion))
+        elif tipo is exp.Insert or tipo is exp.Update or tipo is exp.Create or tipo is exp.Merge:
+            destino = nodo.this
+            if tipo is exp.Update:
+                destino = _destino_alias(nodo.this, nodo.args.get(CLAVE_FROM))
+                if destino is not nodo.this:
+                    # El alias resolvió la tabla destino: se emite aquí y no se vuelve a leer en el FROM
+                    referencias.append((destino.catalog, destino.db, nombre_tabla(destino), "ESCRIBE"))
+                    omitidas.add(id(destino))
+                    destino = None
+            for hijo in nodo.iter_expressions(reverse=True):
+                if hijo is nodo.this:
+                    if destino is not None:
+                        apilar((hijo, "ESCRIBE", ctes))
+                elif tipo is not exp.Create or hijo.arg_key == "expression":
+                    apilar((hijo, "LEE", ctes))
+                elif type(hijo) not in TIPOS_HOJA:
+                    apilar((hijo, relacion, ctes))
+            continue
+        elif tipo is exp.Delete:
+            # DELETE [FROM] tabla trae el destino en `this`; DELETE a FROM tabla a JOIN ...
+            # lo trae en `tables` (el alias) y la fuente en `this`
+            objetivos = nodo.args.get("tables") or ()
+            for objetivo in objetivos:
+                destino = _destino_alias(objetivo, nodo.this)
+                if destino is not objetivo:
+                    referencias.append((destino.catalog, destino.db, nombre_tabla(destino), "ESCRIBE"))
+                    omitidas.add(id(destino))
+                    omitidas.add(id(objetivo))
+            for hijo in nodo.iter_expressions(reverse=True):
+                if hijo.arg_key == "tables" or (hijo is nodo.this and not objetivos):
+                    apilar((hijo, "ESCRIBE", ctes))
+                elif type(hijo) not in TIPOS_HOJA:
+                    apilar((hijo, "LEE", ctes))
+            continue
+        elif tipo is exp.TruncateTable:
+            for hijo in nodo.iter_expressions(reverse=True):
+                if hijo.arg_key == "expressions":
+                    apilar((hijo, "ESCRIBE", ctes))
+            continue
+        elif tipo is exp.Select and nodo.args.get("into") is not None:
+            # SELECT ... INTO nueva: el INTO ESCRIBE y todo lo demás LEE
+            for hijo in nodo.iter_expressions(reverse=True):
+                if hijo.arg_key == "into":
+                    apilar((hijo, "ESCRIBE", ctes))
+                elif type(hijo) not in TIPOS_HOJA:
+                    apilar((hijo, "LEE", ctes))
+            continue
+        else:
+            relacion = CONTEXTO_POR_TIPO.get(tipo, relacion)
+
+        # iter_expressions invertido: la pila saca primero el hijo de la izquierda
+        for hijo in nodo.iter_expressions(reverse=True):
+            if type(hijo) not in TIPOS_HOJA:
+                apilar((hijo, relacion, ctes))
+    return referencias
+
+# ==============================================
+# SENTENCIA POR SENTENCIA
+# ==============================================
+# El código se tokeniza una vez y se corta en sentencias, pero cada sentencia se
+# parsea por separado: una sentencia que falla solo se pierde a sí misma, y una
+# demasiado grande (tamaño) o lenta (tiempo, ver el pool de abajo) se salta sin
+# perder el resto del objeto.
+# El T-SQL heredado casi no usa ';': además del punto y coma, una sentencia nueva
+# empieza en cada palabra que solo puede abrir una (INSERT, UPDATE, SELECT, SET,
+# IF, BEGIN, END...) fuera de paréntesis y de un CASE, salvo cuando continúa la
+# sentencia en curso: el SELECT de un INSERT o tras un UNION, el SET de un UPDATE,
+# el DML de un WITH o tras el THEN de un MERGE, el EXEC de un INSERT ... EXEC.
+DIALECTO = Dialect.get_or_raise("tsql")
+CARACTERES_SENTENCIA_DEFECTO = 250_000
+
+class _Tokenizador(DIALECTO.tokenizer_class):
+    # El tokenizador de T-SQL junta en un solo STRING todo lo que sigue a un EXEC,
+    # END o PRINT al inicio de una sentencia (o tras un BEGIN) hasta el próximo ';':
+    # sin punto y coma, el resto del cuerpo. Aquí cada palabra queda como token.
+    COMMANDS = set()
+
+TOKENIZADOR = _Tokenizador(dialect=DIALECTO)
+
+# Palabras que abren una sentencia (por tipo de token, o por texto si T-SQL las tokeniza como nombre)
+TOKENS_CORTE = frozenset({TokenType.INSERT, TokenType.UPDATE, TokenType.DELETE, TokenType.MERGE,
+                          TokenType.SELECT, TokenType.TRUNCATE, TokenType.SET, TokenType.DECLARE,
+                          TokenType.BEGIN, TokenType.END, TokenType.ELSE, TokenType.EXECUTE,
+                          TokenType.COMMAND, TokenType.CREATE, TokenType.DROP, TokenType.ALTER,
+                          TokenType.COMMIT, TokenType.ROLLBACK, TokenType.FETCH, TokenType.WITH})
+# Reservadas en T-SQL: sin corchetes no pueden ser el nombre de una columna o tabla
+PALABRAS_CORTE = frozenset({"IF", "WHILE", "RETURN", "RAISERROR", "OPEN", "CLOSE", "DEALLOCATE",
+                            "BREAK", "CONTINUE", "GOTO", "WAITFOR"})
+TOKENS_DML_PRINCIPAL = frozenset({TokenType.SELECT, TokenType.INSERT, TokenType.UPDATE,
+                                  TokenType.DELETE, TokenType.MERGE})
+TOKENS_CONJUNTO = frozenset({TokenType.UNION, TokenType.ALL, TokenType.EXCEPT, TokenType.INTERSECT})
+
+def _es_corte(token):
+    return token.token_type in TOKENS_CORTE or (
+        token.token_type in (TokenType.VAR, TokenType.COMMAND) and token.text.upper() in PALABRAS_CORTE)
+
+def _continua_sentencia(tokens, i, sentencia):
+    """Si la palabra de corte tokens[i] sigue la sentencia en curso (ver dividir_sentencias)"""
+    tipo = tokens[i].token_type
+    anterior = tokens[i - 1]
+    inicio = sentencia["inicio"]
+    if tipo == TokenType.WITH:
+        # Solo abre una CTE: WITH nombre AS ( / WITH nombre (columnas) AS; no un hint WITH (NOLOCK)
+        return not (i + 2 < len(tokens) and tokens[i + 1].token_type in TOKENS_NOMBRE
+                    and tokens[i + 2].token_type in (TokenType.ALIAS, TokenType.L_PAREN))
+    if inicio == TokenType.WITH and sentencia["principal"] is None and tipo in TOKENS_DML_PRINCIPAL:
+        sentencia["principal"] = tipo
+        return True
+    if tipo == TokenType.SELECT and anterior.token_type in TOKENS_CONJUNTO:
+        return True
+    if sentencia["principal"] == TokenType.INSERT and not sentencia["origen"] and (
+            tipo == TokenType.SELECT or _es_exec(tokens[i])):
+        sentencia["origen"] = True  # INSERT ... SELECT / INSERT ... EXEC
+        return True
+    if tipo in (TokenType.INSERT, TokenType.UPDATE, TokenType.DELETE) and (
+            anterior.token_type in (TokenType.THEN, TokenType.COMMA, TokenType.FOR)
+            or anterior.text.upper() in ("AFTER", "OF")):
+        # WHEN MATCHED THEN UPDATE de un MERGE, FOR UPDATE de un cursor, AFTER INSERT, UPDATE
+        return True
+    if tipo == TokenType.SET and sentencia["ultima"] == TokenType.UPDATE:
+        return True
+    if tipo == TokenType.FETCH and anterior.text.upper() in ("ROW", "ROWS"):
+        return True  # OFFSET n ROWS FETCH NEXT
+    if tipo == TokenType.ALTER and anterior.token_type == TokenType.OR:
+        return True  # CREATE OR ALTER
+    if tipo == TokenType.DROP and inicio == TokenType.ALTER:
+        return True  # ALTER TABLE ... DROP COLUMN
+    return False
+
+# CREATE/ALTER de un módulo: el encabezado (nombre, parámetros, ON tabla de un
+# trigger, WITH ...) termina en el AS que abre el cuerpo. Se quita antes de cortar:
+# parseado entero, sqlglot da un Command opaco para un trigger.
+TOKENS_MODULO = frozenset({TokenType.PROCEDURE, TokenType.FUNCTION, TokenType.VIEW})
+PSEUDO_TABLAS_TRIGGER = frozenset({"inserted", "deleted"})
+
+def _encabezado_modulo(tokens):
+    """(índice del primer token del cuerpo, (catálogo, esquema, tabla) padre de un trigger o None)"""
+    i = 0
+    if i < len(tokens) and tokens[i].token_type == TokenType.CREATE:
+        i += 1
+        if i + 1 < len(tokens) and tokens[i].token_type == TokenType.OR and tokens[i + 1].token_type == TokenType.ALTER:
+            i += 2
+    elif i < len(tokens) and tokens[i].token_type == TokenType.ALTER:
+        i += 1
+    else:
+        return 0, None
+    if i >= len(tokens):
+        return 0, None
+    trigger = tokens[i].token_type == TokenType.VAR and tokens[i].text.upper() == "TRIGGER"
+    if not trigger and tokens[i].token_type not in TOKENS_MODULO:
+        return 0, None
+    padre, profundidad = None, 0
+    for j in range(i + 1, len(tokens)):
+        tipo = tokens[j].token_type
+        if tipo == TokenType.L_PAREN:
+            profundidad += 1
+        elif tipo == TokenType.R_PAREN:
+            profundidad -= 1
+        elif trigger and padre is None and tipo == TokenType.ON:
+            padre, _ = _nombre_en(tokens, j + 1)
+        elif (tipo == TokenType.ALIAS and not profundidad and not _es_exec(tokens[j - 1])
+              and not (j >= 2 and tokens[j - 2].token_type == TokenType.PARAMETER)):
+            # Ni el AS de WITH EXECUTE AS ni el de un parámetro @p AS tipo
+            return j + 1, padre
+    return 0, None
+
+def _con_padre(referencias, padre):
+    """Las pseudo-tablas inserted/deleted de un trigger son las filas de su tabla padre"""
+    if padre is None:
+        return referencias
+    return [padre + tuple(r[3:]) if not r[0] and not r[1] and r[2].lower() in PSEUDO_TABLAS_TRIGGER else r
+            for r in referencias]
+
+def dividir_sentencias(codigo_sql):
+    """[(tokens, texto)] de cada sentencia del cuerpo, en orden (ver dividir_modulo)"""
+    return dividir_modulo(codigo_sql)[0]
+
+def dividir_modulo(codigo_sql):
+    """
+    ([(tokens, texto)] de cada sentencia, padre): sin el encabezado CREATE/ALTER del
+    módulo, y la tabla (catálogo, esquema, tabla) de un trigger o None
+    """
+    todos = TOKENIZADOR.tokenize(codigo_sql)
+    cuerpo, padre = _encabezado_modulo(todos)
+    todos = todos[cuerpo:]
+    sentencias = []
+    actual = []
+    sentencia = None
+    parentesis = casos = 0
+    for i, token in enumerate(todos):
+        tipo = token.token_type
+        if tipo == TokenType.SEMICOLON:
+            if actual:
+                sentencias.append(actual)
+            actual = []
+            continue
+        if tipo == TokenType.L_PAREN:
+            parentesis += 1
+        elif tipo == TokenType.R_PAREN:
+            parentesis = max(0, parentesis - 1)
+        elif tipo == TokenType.CASE:
+            casos += 1
+        elif tipo == TokenType.END and casos:
+            casos -= 1
+        elif tipo == TokenType.VALUES and actual and not parentesis:
+            sentencia["origen"] = True  # INSERT ... VALUES: un SELECT después ya es otra sentencia
+        elif actual and not parentesis and not casos and _es_corte(token):
+            if not _continua_sentencia(todos, i, sentencia):
+                sentencias.append(actual)
+                actual = []
+        if not actual:
+            sentencia = {"inicio": tipo, "principal": tipo, "origen": False, "ultima": tipo}
+            if tipo == TokenType.WITH:
+                sentencia["principal"] = None
+        elif not parentesis and _es_corte(token):
+            sentencia["ultima"] = tipo
+        actual.append(token)
+    if actual:
+        sentencias.append(actual)
+    return [(tokens, codigo_sql[tokens[0].start:tokens[-1].end + 1]) for tokens in sentencias], padre
+
+# La cláusula OUTPUT de un DML termina en su INTO o en la cláusula que le sigue
+TOKENS_DML = frozenset({TokenType.INSERT, TokenType.UPDATE, TokenType.DELETE, TokenType.MERGE})
+TOKENS_FIN_OUTPUT = frozenset({TokenType.INTO, TokenType.WHERE, TokenType.FROM, TokenType.SELECT,
+                               TokenType.VALUES, TokenType.DEFAULT, TokenType.RETURNING, TokenType.OPTION,
+                               TokenType.COMMAND, TokenType.EXECUTE})
+TOKENS_A_NORMALIZAR = frozenset({TokenType.RETURNING, TokenType.OPTION, TokenType.DELETE})
+
+def _fin_parentesis(tokens, i):
+    """Índice tras el paréntesis que abre en tokens[i]"""
+    profundidad = 0
+    while i < len(tokens):
+        if tokens[i].token_type == TokenType.L_PAREN:
+            profundidad += 1
+        elif tokens[i].token_type == TokenType.R_PAREN:
+            profundidad -= 1
+            if profundidad == 0:
+                return i + 1
+        i += 1
+    return i
+
+def normalizar_dml(tokens):
+    """
+    Reescribe a nivel de tokens las formas de T-SQL que el parser de sqlglot no acepta:
+      * OUTPUT ... [INTO destino [(columnas)]] en INSERT/UPDATE/DELETE/MERGE: se quita
+        la cláusula y el destino sale como referencia ESCRIBE (sqlglot solo acepta
+        un INTO de una parte y ninguna cláusula OUTPUT en un DELETE).
+      * DELETE FROM tabla FROM tabla JOIN ...: se quita el primer FROM.
+      * OPTION (...) al final de un DML: se quita (sqlglot no lo acepta en DELETE ni MERGE).
+    Retorna (tokens, referencias de los OUTPUT INTO), con los nombres como en
+    recorrer_sentencia (#temporal y @variable con su prefijo).
+    """
+    if not any(t.token_type in TOKENS_A_NORMALIZAR for t in tokens):
+        return tokens, []
+    resto, referencias = [], []
+    i, n, profundidad, dml = 0, len(tokens), 0, False
+    while i < n:
+        tipo = tokens[i].token_type
+        if tipo == TokenType.L_PAREN:
+            profundidad += 1
+        elif tipo == TokenType.R_PAREN:
+            profundidad -= 1
+        elif profundidad == 0 and tipo in TOKENS_DML:
+            dml = True
+        elif (tipo == TokenType.OPTION and dml and not profundidad and i + 1 < n
+              and tokens[i + 1].token_type == TokenType.L_PAREN):
+            i = _fin_parentesis(tokens, i + 1)  # Hints de la consulta: sin tablas
+            continue
+        if tipo != TokenType.RETURNING or not dml or profundidad:
+            resto.append(tokens[i])
+            i += 1
+            continue
+        i += 1
+        nivel = 0
+        while i < n and (nivel or tokens[i].token_type not in TOKENS_FIN_OUTPUT):
+            if tokens[i].token_type == TokenType.L_PAREN:
+                nivel += 1
+            elif tokens[i].token_type == TokenType.R_PAREN:
+                nivel -= 1
+            i += 1
+        if i < n and tokens[i].token_type == TokenType.INTO:
+            i += 1
+            prefijo = ""
+            while i < n and tokens[i].token_type in (TokenType.HASH, TokenType.PARAMETER):
+                prefijo += tokens[i].text
+                i += 1
+            destino, i = _nombre_en(tokens, i)
+            if destino is not None:
+                referencias.append(destino[:2] + (prefijo + destino[2], "ESCRIBE"))
+            if i < n and tokens[i].token_type == TokenType.L_PAREN:
+                i = _fin_parentesis(tokens, i)
+
+    for d in range(len(resto) - 2):
+        if resto[d].token_type == TokenType.DELETE and resto[d + 1].token_type == TokenType.FROM:
+            j = d + 3 if resto[d + 2].token_type == TokenType.HASH else d + 2
+            _, j = _nombre_en(resto, j)
+            j = _saltar_alias(resto, j)
+            if j is not None and j < len(resto) and resto[j].token_type == TokenType.FROM:
+                del resto[d + 1]
+            break
+    return resto, referencias
+
+class SentenciaOpaca(Exception):
+    """sqlglot no entendió la sentencia y la dejó como un Command: no se sabe qué toca"""
+    clase = "Command"
+
+def referencias_de_sentencia(tokens, codigo_sql):
+    """
+    Referencias de una sentencia ya tokenizada (lanza la excepción del parser si falla).
+    `codigo_sql` es el cuerpo completo: las posiciones de los tokens son sobre él.
+    Los destinos de OUTPUT ... INTO van después de los de la sentencia. Un Command
+    que no sea un EXEC cuenta como fallo (SentenciaOpaca), no como cero tablas.
+    """
+    if tokens[0].token_type == TokenType.VAR and tokens[0].text.upper() in ("IF", "WHILE"):
+        tokens = tokens[1:]  # La condición: IF EXISTS (SELECT ...) se parsea como expresión
+    tokens, referencias_output = normalizar_dml(tokens)
+    referencias = []
+    for expression in DIALECTO.parser().parse(tokens, codigo_sql):
+        if isinstance(expression, exp.Command) and str(expression.this).upper() not in ("EXEC", "EXECUTE"):
+            raise SentenciaOpaca(str(expression.this))
+        if expression is not None:
+            referencias.extend(recorrer_sentencia(expression))
+    return referencias + referencias_output
+
+# ==============================================
+# TRIAJE POR TOKENS (antes de sqlglot)
+# ==============================================
+# Con los tokens de la sentencia ya en mano se decide, sin parsear, cuánto hay que
+# hacer con ella:
+#   - "omitida": ningún token puede introducir una tabla (SET, DECLARE, PRINT,
+#     RAISERROR, IF/WHILE sin consultas, BEGIN/COMMIT...), o la sentencia es de
+#     cursor o un EXEC (FETCH ... INTO @v): no referencia nada.
+#   - "rapida": INSERT [INTO] destino [(columnas)] SELECT ... FROM fuente [alias]
+#     [JOIN tabla [alias] ON ...] [WHERE ...] sin subconsultas, o INSERT ... EXEC:
+#     se resuelve directo de los tokens, en el mismo orden que recorrer_sentencia.
+#   - "completa": el resto va al parser.
+# Las dos primeras dan lo mismo que el parser (salvo que este fallara: una
+# sentencia omitida no cuenta como error).
+TOKENS_CON_TABLAS = frozenset({
+    TokenType.FROM, TokenType.JOIN, TokenType.INTO, TokenType.UPDATE, TokenType.TABLE,
+    TokenType.CREATE, TokenType.MERGE, TokenType.USING, TokenType.DELETE, TokenType.INSERT,
+    TokenType.TRUNCATE, TokenType.ALTER, TokenType.DROP, TokenType.GRANT, TokenType.REVOKE,
+    TokenType.USE, TokenType.APPLY, TokenType.DESCRIBE, TokenType.ANALYZE, TokenType.COPY,
+    TokenType.CACHE, TokenType.UNCACHE, TokenType.LOAD, TokenType.REFRESH, TokenType.SHOW,
+    TokenType.SUMMARIZE, TokenType.PRAGMA
+})
+TOKENS_NOMBRE = frozenset({TokenType.VAR, TokenType.IDENTIFIER})
+# Tras la fuente del camino rápido: lo que no puede traer otra tabla
+TOKENS_FIN_FUENTE = frozenset({TokenType.WHERE, TokenType.GROUP_BY, TokenType.ORDER_BY, TokenType.HAVING})
+TOKENS_LADO_JOIN = frozenset({TokenType.INNER, TokenType.LEFT, TokenType.RIGHT, TokenType.FULL,
+                              TokenType.OUTER, TokenType.CROSS})
+TOKENS_FIN_ON = TOKENS_LADO_JOIN | TOKENS_FIN_FUENTE | {TokenType.JOIN}
+TOKENS_OTRA_CONSULTA = frozenset({TokenType.SELECT, TokenType.FROM, TokenType.JOIN, TokenType.INTO,
+                                  TokenType.UNION, TokenType.EXCEPT, TokenType.INTERSECT, TokenType.APPLY})
+
+def _nombre_en(tokens, i):
+    """(catálogo, esquema, tabla) de un nombre de 1 a 3 partes desde tokens[i], y el índice siguiente"""
+    partes = []
+    while i < len(tokens) and tokens[i].token_type in TOKENS_NOMBRE:
+        partes.append(tokens[i].text)
+        i += 1
+        if i < len(tokens) and tokens[i].token_type == TokenType.DOT and len(partes) < 3:
+            i += 1
+        else:
+            break
+    if not partes or tokens[i - 1].token_type == TokenType.DOT:
+        return None, i
+    return ("",) * (3 - len(partes)) + tuple(partes), i
+
+def _saltar_alias(tokens, i):
+    """Índice tras el alias opcional ([AS] alias) de una tabla, o None si el AS no trae nombre"""
+    if i < len(tokens) and tokens[i].token_type == TokenType.ALIAS:
+        i += 1
+        if i >= len(tokens) or tokens[i].token_type not in TOKENS_NOMBRE:
+            return None
+    if i < len(tokens) and tokens[i].token_type in TOKENS_NOMBRE:
+        i += 1
+    return i
+
+def referencias_rapidas(tokens):
+    """
+    Referencias de un INSERT ... SELECT simple (o un INSERT ... EXEC, que sqlglot no
+    parsea) directo de los tokens, o None si no tiene esa forma
+    """
+    n = len(tokens)
+    if tokens[0].token_type != TokenType.INSERT:
+        return None
+    i = 2 if n > 1 and tokens[1].token_type == TokenType.INTO else 1
+    prefijo = ""
+    while i < n and tokens[i].token_type in (TokenType.HASH, TokenType.PARAMETER):
+        prefijo += tokens[i].text  # #temporal o @variable de tabla, como en recorrer_sentencia
+        i += 1
+    destino, i = _nombre_en(tokens, i)
+    if destino is None or i >= n:
+        return None
+    destino = destino[:2] + (prefijo + destino[2],)
+    if tokens[i].token_type == TokenType.L_PAREN:  # Lista de columnas
+        i += 1
+        while i < n and tokens[i].token_type in (TokenType.VAR, TokenType.IDENTIFIER, TokenType.COMMA):
+            i += 1
+        if i >= n or tokens[i].token_type != TokenType.R_PAREN:
+            return None
+        i += 1
+    if i < n and _es_exec(tokens[i]):
+        return [destino + ("ESCRIBE",)]  # El procedimiento sale de llamadas_de_sentencia
+    if i >= n or tokens[i].token_type != TokenType.SELECT:
+        return None
+    i += 1
+    while i < n and tokens[i].token_type != TokenType.FROM:
+        if tokens[i].token_type in TOKENS_OTRA_CONSULTA:
+            return None  # Subconsulta o SELECT ... INTO en la lista
+        i += 1
+
+    # FROM fuente [alias] seguido de [INNER|LEFT|RIGHT|FULL [OUTER]] JOIN tabla [alias] ON ... o CROSS JOIN tabla
+    referencias = [destino + ("ESCRIBE",)]
+    i += 1
+    union_cruzada = None  # None en la fuente del FROM
+    while True:
+        fuente, i = _nombre_en(tokens, i)
+        if fuente is None:
+            return None
+        referencias.append(fuente + ("LEE",))
+        i = _saltar_alias(tokens, i)
+        if i is None:
+            return None
+        con_on = i < n and tokens[i].token_type == TokenType.ON
+        if union_cruzada is not None and con_on == union_cruzada:
+            return None  # Un JOIN sin ON o un CROSS JOIN con ON: que decida el parser
+        if con_on:
+            i += 1
+            profundidad = 0
+            while i < n and tokens[i].token_type not in TOKENS_FIN_ON:
+                tipo = tokens[i].token_type
+                if tipo in TOKENS_OTRA_CONSULTA:
+                    return None
+                if tipo == TokenType.L_PAREN:
+                    profundidad += 1
+                elif tipo == TokenType.R_PAREN:
+                    profundidad -= 1
+                elif profundidad == 0 and tipo in (TokenType.COMMA, TokenType.ON):
+                    return None  # Otra fuente separada por coma en medio de la condición
+                i += 1
+        j = i
+        while j < n and tokens[j].token_type in TOKENS_LADO_JOIN:
+            j += 1
+        if j >= n or tokens[j].token_type != TokenType.JOIN:
+            break
+        union_cruzada = any(t.token_type == TokenType.CROSS for t in tokens[i:j])
+        i = j + 1
+
+    if i < n:
+        if tokens[i].token_type not in TOKENS_FIN_FUENTE:
+            return None  # Hints, APPLY, coma, un LEFT(...) en el ON...
+        if any(t.token_type in TOKENS_OTRA_CONSULTA for t in tokens[i + 1:]):
+            return None
+    return referencias
+
+# ==============================================
+# LLAMADAS A OTROS PROCEDIMIENTOS (EXEC)
+# ==============================================
+# sqlglot no parsea EXEC: lo deja como un Command opaco, y el triaje lo omite
+# porque no trae tablas. Las llamadas se sacan de los tokens de cada sentencia,
+# por cualquier vía y aunque el parser falle (INSERT ... EXEC), como referencias
+# (catálogo, esquema, procedimiento, "EJECUTA").
+PROCEDIMIENTOS_DINAMICOS = frozenset({"sp_executesql"})  # SQL dinámico: no es una llamada a resolver aquí
+
+def _es_exec(token):
+    return token.token_type == TokenType.EXECUTE or (
+        token.token_type == TokenType.COMMAND and token.text.upper() in ("EXEC", "EXECUTE"))
+
+def _procedimiento_en(tokens, i):
+    """((catálogo, esquema, procedimiento) o None, índice siguiente) del llamado desde tokens[i] (tras el EXEC)"""
+    n = len(tokens)
+    if (i + 2 < n and tokens[i].token_type == TokenType.PARAMETER and tokens[i + 1].token_type in TOKENS_NOMBRE
+            and tokens[i + 2].token_type == TokenType.EQ):
+        i += 3  # EXEC @retorno = procedimiento
+    partes = []
+    while i < n and tokens[i].token_type in TOKENS_NOMBRE:
+        partes.append(tokens[i].text)
+        i += 1
+        if i < n and tokens[i].token_type == TokenType.DOT and len(partes) < 4:
+            i += 1
+        else:
+            break
+    # EXEC (@sql), EXEC @variable, EXEC #temporal o un nombre cortado: no hay procedimiento que resolver
+    if not partes or tokens[i - 1].token_type == TokenType.DOT:
+        return None, i
+    return (("",) * 3 + tuple(partes))[-3:], i
+
+def llamadas_de_sentencia(tokens):
+    """
+    Procedimientos que una sentencia ejecuta, en orden: [(catálogo, esquema, procedimiento, "EJECUTA")].
+    sp_executesql no cuenta: es SQL dinámico.
+    """
+    llamadas = []
+    for i, token in enumerate(tokens):
+        if not _es_exec(token):
+            continue
+        procedimiento, _ = _procedimiento_en(tokens, i + 1)
+        if procedimiento is not None and procedimiento[2].lower() not in PROCEDIMIENTOS_DINAMICOS:
+            llamadas.append(procedimiento + ("EJECUTA",))
+    return llamadas
+
+# Sentencias que por su primera palabra no nombran tablas aunque traigan FROM o INTO
+PALABRAS_SIN_TABLAS = frozenset({"FETCH", "OPEN", "CLOSE", "DEALLOCATE", "EXEC", "EXECUTE", "PRINT", "RAISERROR"})
+
+def triar_sentencia(tokens):
+    """("omitida", []), ("rapida", referencias) o ("completa", None) para los tokens de una sentencia"""
+    if (tokens[0].text.upper() in PALABRAS_SIN_TABLAS
+            or not any(t.token_type in TOKENS_CON_TABLAS for t in tokens)):
+        return "omitida", []
+    referencias = referencias_rapidas(tokens)
+    if referencias is not None:
+        return "rapida", referencias
+    return "completa", None
+
+def _referencias_de_sentencias(sentencias, codigo_sql, max_caracteres):
+    """(referencias, completo) de las sentencias ya divididas; completo = ninguna falló ni se saltó"""
+    referencias, completo = [], True
+    for tokens, texto in sentencias:
+        via, rapidas = triar_sentencia(tokens)
+        if via != "completa":
+            referencias.extend(rapidas)
+        elif len(texto) <= max_caracteres:
+            try:
+                referencias.extend(referencias_de_sentencia(tokens, codigo_sql))
+            except Exception:
+                # Si falla el parser (común en T-SQL complejo), seguimos con la siguiente
+                completo = False
+        else:
+            completo = False
+        referencias.extend(llamadas_de_sentencia(tokens))
+    return referencias, completo
+
+def referencias_de_codigo(codigo_sql, max_caracteres=CARACTERES_SENTENCIA_DEFECTO):
+    """
+    Tablas que el código toca, en orden: [(catálogo, esquema, tabla, relación)] con
+    relación "ESCRIBE", "LEE" o "" (referenciada fuera de un FROM/JOIN), y los
+    procedimientos que ejecuta con relación "EJECUTA" tras las tablas de su sentencia.
+    Al final van las del SQL dinámico plegado (ver referencias_dinamicas). En un
+    trigger, inserted/deleted salen como su tabla padre. No depende del nombre ni
+    del tipo del objeto, así se puede cachear por huella del código.
+    Sin límite de tiempo: para eso está analizar_huellas.
+    """
+    try:
+        sentencias, padre = dividir_modulo(codigo_sql)
+    except Exception:
+        # Sin tokens no hay sentencias (p. ej. un literal sin cerrar)
+        return []
+    referencias, _ = _referencias_de_sentencias(sentencias, codigo_sql, max_caracteres)
+    return _con_padre(referencias, padre) + referencias_dinamicas(codigo_sql, sentencias, max_caracteres)
+
+# ==============================================
+# SQL DINÁMICO (EXEC (@sql) / sp_executesql)
+# ==============================================
+# Las tablas de un SQL armado en variables no están en el texto del objeto. Una
+# pasada por los tokens de todo el cuerpo lleva el valor de cada variable de texto
+# (DECLARE / SET / SELECT @v = ...) plegando constantes: literales, +, REPLACE,
+# CONCAT, QUOTENAME, CHAR(n), LTRIM/RTRIM/UPPER/LOWER. Una asignación bajo un IF,
+# ELSE o WHILE (o en su BEGIN ... END) suma variantes en vez de reemplazar el valor.
+# En cada EXEC (...) o sp_executesql, cada variante se analiza como código y sus
+# referencias salen con un quinto campo "dinamico".
+# Lo que no se puede plegar (un parámetro, una columna, GETDATE()...) entra como
+# MARCA_DINAMICA: sirve de valor en un WHERE, pero una tabla que la contiene no se
+# resuelve. Cada sitio deja además una referencia de estado ("", "", "", relación)
+# con relación SQL_DINAMICO_RESUELTO o SQL_DINAMICO_PENDIENTE.
+MARCA_DINAMICA = "__dinamico__"
+MAX_VARIANTES = 16          # Más variantes que esto deja el sitio pendiente
+PROFUNDIDAD_DINAMICA = 2    # SQL dinámico dentro de SQL dinámico
+SQL_DINAMICO_RESUELTO = "SQL_DINAMICO_RESUELTO"
+SQL_DINAMICO_PENDIENTE = "SQL_DINAMICO_PENDIENTE"
+_PATRON_DINAMICO = re.compile(r"\bexec(?:ute)?\s*\(|\bsp_executesql\b", re.IGNORECASE)
+TOKENS_TEXTO = frozenset({TokenType.STRING, TokenType.NATIONAL_STRING})
+TOKENS_INICIO_SENTENCIA = frozenset({TokenType.INSERT, TokenType.UPDATE, TokenType.DELETE, TokenType.MERGE,
+                                     TokenType.SELECT, TokenType.TRUNCATE, TokenType.CREATE, TokenType.DROP,
+                                     TokenType.COMMAND, TokenType.SET, TokenType.DECLARE})
+_FUNCIONES_TEXTO = {"LTRIM": str.lstrip, "RTRIM": str.rstrip, "TRIM": str.strip,
+                    "UPPER": str.upper, "LOWER": str.lower}
+
+def _combinar(izquierda, derecha):
+    return list(dict.fromkeys(a + b for a in izquierda for b in derecha))[:MAX_VARIANTES + 1]
+
+def _saltar_bloque(tokens, i):
+    """Índice tras el paréntesis (tokens[i] = '(') o el CASE ... END que empieza en tokens[i]"""
+    if tokens[i].token_type == TokenType.L_PAREN:
+        return _fin_parentesis(tokens, i)
+    profundidad = 0
+    while i < len(tokens):
+        if tokens[i].token_type == TokenType.CASE:
+            profundidad += 1
+        elif tokens[i].token_type == TokenType.END:
+            profundidad -= 1
+            if profundidad == 0:
+                return i + 1
+        i += 1
+    return i
+
+def _argumentos(tokens, i, estado):
+    """([variantes de cada argumento], índice tras el ')') desde el '(' en tokens[i], o (None, ...)"""
+    argumentos = []
+    i += 1
+    while i < len(tokens):
+        if tokens[i].token_type == TokenType.R_PAREN and not argumentos:
+            return argumentos, i + 1
+        variantes, i = _evaluar(tokens, i, estado)
+        if variantes is None or i >= len(tokens):
+            return None, i
+        argumentos.append(variantes)
+        if tokens[i].token_type == TokenType.R_PAREN:
+            return argumentos, i + 1
+        if tokens[i].token_type != TokenType.COMMA:
+            return None, i
+        i += 1
+    return None, i
+
+def _reemplazar(texto, buscado, nuevo):
+    """REPLACE de T-SQL (sin distinguir mayúsculas, como la intercalación habitual)"""
+    if not buscado:
+        return texto
+    return re.sub(re.escape(buscado), lambda _: nuevo, texto, flags=re.IGNORECASE)
+
+def _entre_comillas(texto, comilla):
+    """QUOTENAME(texto, comilla)"""
+    if comilla in ("", "[", "]"):
+        return "[" + texto.replace("]", "]]") + "]"
+    return comilla + texto.replace(comilla, comilla * 2) + comilla
+
+def _evaluar_funcion(nombre, tokens, i, estado):
+    """Variantes de nombre(...) con tokens[i] = '('; una función que no se pliega da la marca"""
+    fin = _fin_parentesis(tokens, i)
+    if nombre == "CAST":
+        variantes, j = _evaluar(tokens, i + 1, estado)
+        if variantes is None or j >= fin or tokens[j].token_type != TokenType.ALIAS:
+            variantes = [MARCA_DINAMICA]
+        return variantes, fin
+    if nombre in ("CONVERT", "TRY_CONVERT"):
+        # El primer argumento es el tipo: se pliega el segundo
+        j, profundidad = i + 1, 0
+        while j < fin and (profundidad or tokens[j].token_type != TokenType.COMMA):
+            profundidad += {TokenType.L_PAREN: 1, TokenType.R_PAREN: -1}.get(tokens[j].token_type, 0)
+            j += 1
+        variantes, _ = _evaluar(tokens, j + 1, estado) if j < fin else (None, j)
+        return variantes if variantes is not None else [MARCA_DINAMICA], fin
+    argumentos, j = _argumentos(tokens, i, estado)
+    if argumentos is None or j != fin:
+        return [MARCA_DINAMICA], fin
+    if nombre == "REPLACE" and len(argumentos) == 3:
+        variantes = [_reemplazar(t, b, r) for t in argumentos[0] for b in argumentos[1] for r in argumentos[2]]
+    elif nombre == "CONCAT" and argumentos:
+        variantes = argumentos[0]
+        for argumento in argumentos[1:]:
+            variantes = _combinar(variantes, argumento)
+    elif nombre == "QUOTENAME" and len(argumentos) in (1, 2):
+        comillas = [c[:1] for c in argumentos[1]] if len(argumentos) == 2 else [""]
+        variantes = [_entre_comillas(t, c) for t in argumentos[0] for c in comillas]
+    elif nombre in ("CHAR", "NCHAR") and len(argumentos) == 1 and all(v.isdigit() for v in argumentos[0]):
+        variantes = [chr(int(v)) for v in argumentos[0]]
+    elif nombre in _FUNCIONES_TEXTO and len(argumentos) == 1:
+        variantes = [_FUNCIONES_TEXTO[nombre](t) for t in argumentos[0]]
+    elif nombre in ("ISNULL", "COALESCE"):
+        variantes = argumentos[0]
+    else:
+        return [MARCA_DINAMICA], fin
+    return list(dict.fromkeys(variantes))[:MAX_VARIANTES + 1], fin
+
+def _evaluar_termino(tokens, i, estado):
+    """(variantes, índice siguiente) de un término de una expresión de texto, o (None, i) si no lo es"""
+    n = len(tokens)
+    if i >= n:
+        return None, i
+    token = tokens[i]
+    tipo = token.token_type
+    if tipo in TOKENS_TEXTO or tipo == TokenType.NUMBER:
+        return [token.text], i + 1
+    if tipo == TokenType.NULL:
+        return [""], i + 1
+    if tipo == TokenType.PARAMETER:
+        if i + 1 < n and tokens[i + 1].token_type in TOKENS_NOMBRE:
+            # Una variable que no se asignó en el cuerpo es un parámetro: no se conoce
+            return list(estado.get(tokens[i + 1].text.lower(), [MARCA_DINAMICA])), i + 2
+        j = i
+        while j < n and tokens[j].token_type == TokenType.PARAMETER:
+            j += 1
+        if j < n and tokens[j].token_type in TOKENS_NOMBRE:
+            return [MARCA_DINAMICA], j + 1  # @@ROWCOUNT, @@SERVERNAME...
+        return None, i
+    if tipo == TokenType.L_PAREN:
+        variantes, j = _evaluar(tokens, i + 1, estado)
+        if variantes is not None and j < n and tokens[j].token_type == TokenType.R_PAREN:
+            return variantes, j + 1
+        return [MARCA_DINAMICA], _fin_parentesis(tokens, i)  # (SELECT ...) u otra expresión
+    if tipo == TokenType.CASE:
+        return [MARCA_DINAMICA], _saltar_bloque(tokens, i)
+    if i + 1 < n and tokens[i + 1].token_type == TokenType.L_PAREN and tipo not in TOKENS_TEXTO:
+        return _evaluar_funcion(token.text.upper(), tokens, i + 1, estado)
+    if tipo in TOKENS_NOMBRE:
+        # Una columna o dbo.funcion(...): su valor no se conoce
+        _, j = _nombre_en(tokens, i)
+        if j < n and tokens[j].token_type == TokenType.L_PAREN:
+            j = _fin_parentesis(tokens, j)
+        return [MARCA_DINAMICA], max(j, i + 1)
+    return None, i
+
+def _evaluar(tokens, i, estado):
+    """(variantes, índice siguiente) de una expresión de texto término + término + ..., o (None, i)"""
+    variantes, i = _evaluar_termino(tokens, i, estado)
+    if variantes is None:
+        return None, i
+    while i < len(tokens) and tokens[i].token_type == TokenType.PLUS:
+        derecha, i = _evaluar_termino(tokens, i + 1, estado)
+        if derecha is None:
+            return None, i
+        variantes = _combinar(variantes, derecha)
+    return variantes, i
+
+def _asignar(estado, variable, variantes, condicional, acumular=False):
+    """Nuevo valor de una variable; bajo una condición se suma al valor anterior"""
+    anterior = estado.get(variable, [""])
+    if variantes is None:
+        variantes = [MARCA_DINAMICA]
+    if acumular:
+        variantes = _combinar(anterior, variantes)
+    if condicional:
+        variantes = list(dict.fromkeys(anterior + variantes))[:MAX_VARIANTES + 1]
+    estado[variable] = variantes
+
+def _resolver_sitio(variantes, max_caracteres, profundidad):
+    """Referencias de las variantes de un SQL dinámico, más la referencia de estado del sitio"""
+    textos = [v for v in variantes or () if v.strip()]
+    resuelto = bool(textos) and len(variantes) <= MAX_VARIANTES
+    referencias = []
+    for texto in textos[:MAX_VARIANTES]:
+        try:
+            sentencias = dividir_sentencias(texto)
+        except Exception:
+            resuelto = False
+            continue
+        propias = []
+        for sentencia in sentencias:
+            de_sentencia, completo = _referencias_de_sentencias([sentencia], texto, max_caracteres)
+            # Una sentencia con la marca y sin tablas es SQL que no se pudo armar
+            resuelto = resuelto and completo and (bool(de_sentencia) or MARCA_DINAMICA not in sentencia[1])
+            propias.extend(de_sentencia)
+        if profundidad < PROFUNDIDAD_DINAMICA:
+            anidadas = referencias_dinamicas(texto, sentencias, max_caracteres, profundidad + 1)
+            resuelto = resuelto and not any(r[3] == SQL_DINAMICO_PENDIENTE for r in anidadas)
+            propias.extend(r for r in anidadas if r[3] != SQL_DINAMICO_RESUELTO and r[3] != SQL_DINAMICO_PENDIENTE)
+        elif _PATRON_DINAMICO.search(texto):
+            resuelto = False
+        for referencia in propias:
+            if any(MARCA_DINAMICA in parte for parte in referencia[:3]):
+                resuelto = False  # Una tabla armada con un valor que no se conoce
+            else:
+                referencias.append(tuple(referencia[:4]) + ("dinamico",))
+    referencias.append(("", "", "", SQL_DINAMICO_RESUELTO if resuelto else SQL_DINAMICO_PENDIENTE))
+    return referencias
+
+def referencias_dinamicas(codigo_sql, sentencias, max_caracteres=CARACTERES_SENTENCIA_DEFECTO, profundidad=0):
+    """
+    Referencias del SQL dinámico de un cuerpo ya dividido en sentencias: las tablas
+    de cada variante plegada, (catálogo, esquema, tabla, relación, "dinamico"), y una
+    referencia de estado por sitio. [] si el código no tiene EXEC (...) ni sp_executesql.
+    """
+    if not _PATRON_DINAMICO.search(codigo_sql):
+        return []
+    tokens = [t for tokens_sentencia, _ in sentencias for t in tokens_sentencia]
+    referencias = []
+    estado = {}           # variable -> variantes de su valor
+    bloques = []          # (BEGIN o CASE, condicional) por cada bloque abierto
+    tras_condicion = False  # Tras un IF/ELSE/WHILE, hasta la sentencia que controla
+    parentesis = 0
+    i, n = 0, len(tokens)
+    while i < n:
+        token = tokens[i]
+        tipo = token.token_type
+        condicional = tras_condicion or (bool(bloques) and bloques[-1][1])
+        if tipo == TokenType.L_PAREN:
+            parentesis += 1
+        elif tipo == TokenType.R_PAREN:
+            parentesis = max(0, parentesis - 1)
+        elif ((tipo == TokenType.ELSE and not (bloques and bloques[-1][0] is TokenType.CASE))
+              or (tipo in TOKENS_NOMBRE and token.text.upper() in ("IF", "WHILE"))):
+            tras_condicion = True
+        elif tipo == TokenType.BEGIN:
+            if i + 1 < n and tokens[i + 1].text.upper() in ("TRAN", "TRANSACTION", "DISTRIBUTED"):
+                i += 2
+                continue
+            bloques.append((TokenType.BEGIN, condicional))
+            tras_condicion = False
+        elif tipo == TokenType.CASE:
+            bloques.append((TokenType.CASE, condicional))
+        elif tipo == TokenType.END:
+            if bloques:
+                bloques.pop()
+        elif tipo == TokenType.DECLARE:
+            i += 1
+            while i + 1 < n and tokens[i].token_type == TokenType.PARAMETER and tokens[i + 1].token_type in TOKENS_NOMBRE:
+                variable = tokens[i + 1].text.lower()
+                i += 2
+                if i < n and tokens[i].token_type == TokenType.ALIAS:
+                    i += 1
+                i += 1  # El tipo
+                if i < n and tokens[i].token_type == TokenType.L_PAREN:
+                    i = _fin_parentesis(tokens, i)
+                variantes = [""]
+                if i < n and tokens[i].token_type == TokenType.EQ:
+                    variantes, i = _evaluar(tokens, i + 1, estado)
+                _asignar(estado, variable, variantes, condicional)
+                if i < n and tokens[i].token_type == TokenType.COMMA:
+                    i += 1
+            tras_condicion = False
+            continue
+        elif (tipo == TokenType.SET and i + 2 < n and tokens[i + 1].token_type == TokenType.PARAMETER
+              and tokens[i + 2].token_type in TOKENS_NOMBRE):
+            variable, j = tokens[i + 2].text.lower(), i + 3
+            acumular = j + 1 < n and tokens[j].token_type == TokenType.PLUS and tokens[j + 1].token_type == TokenType.EQ
+            if acumular:
+                j += 2
+            elif j < n and tokens[j].token_type == TokenType.EQ:
+                j += 1
+            else:
+                j = None  # Otro operador (-=, *=...): no es texto
+            if j is not None:
+                variantes, j = _evaluar(tokens, j, estado)
+                _asignar(estado, variable, variantes, condicional, acumular)
+                i = max(j, i + 1)
+            else:
+                i += 3
+            tras_condicion = False
+            continue
+        elif (tipo == TokenType.SELECT and i + 3 < n and tokens[i + 1].token_type == TokenType.PARAMETER
+              and tokens[i + 2].token_type in TOKENS_NOMBRE and tokens[i + 3].token_type == TokenType.EQ):
+            asignadas, j = [], i + 1
+            while (j + 2 < n and tokens[j].token_type == TokenType.PARAMETER
+                   and tokens[j + 1].token_type in TOKENS_NOMBRE and tokens[j + 2].token_type == TokenType.EQ):
+                variable = tokens[j + 1].text.lower()
+                variantes, j = _evaluar(tokens, j + 3, estado)
+                asignadas.append((variable, variantes))
+                if variantes is None or j >= n or tokens[j].token_type != TokenType.COMMA:
+                    break
+                j += 1
+            desde_tabla = j < n and tokens[j].token_type == TokenType.FROM  # Un valor por fila: no se conoce
+            for variable, variantes in asignadas:
+                _asignar(estado, variable, None if desde_tabla else variantes, condicional)
+            tras_condicion = False
+            i = max(j, i + 1)
+            continue
+        elif _es_exec(token):
+            j, variantes, fin = i + 1, None, i + 1
+            if j < n and tokens[j].token_type == TokenType.L_PAREN:
+                variantes, k = _evaluar(tokens, j + 1, estado)
+                if k >= n or tokens[k].token_type != TokenType.R_PAREN:
+                    variantes = None
+                fin = _fin_parentesis(tokens, j)
+            else:
+                procedimiento, k = _procedimiento_en(tokens, j)
+                if procedimiento is None or procedimiento[2].lower() not in PROCEDIMIENTOS_DINAMICOS:
+                    tras_condicion = False
+                    i += 1
+                    continue
+                if (k + 2 < n and tokens[k].token_type == TokenType.PARAMETER
+                        and tokens[k + 1].text.lower() == "stmt" and tokens[k + 2].token_type == TokenType.EQ):
+                    k += 3
+                variantes, fin = _evaluar(tokens, k, estado)
+            referencias.extend(_resolver_sitio(variantes, max_caracteres, profundidad))
+            tras_condicion = False
+            i = max(fin, i + 1)
+            continue
+        elif parentesis == 0 and tipo in TOKENS_INICIO_SENTENCIA:
+            tras_condicion = False  # La sentencia que controlaba el IF no asigna texto
+        i += 1
+    return referencias
+
+def sql_dinamico_de_referencias(referencias):
+    """(sitios de SQL dinámico, sitios pendientes) según las referencias de estado"""
+    estados = [r[3] for r in referencias if r[3] in (SQL_DINAMICO_RESUELTO, SQL_DINAMICO_PENDIENTE)]
+    return len(estados), estados.count(SQL_DINAMICO_PENDIENTE)
+
+def temporales_de_referencias(referencias):
+    """#temporales y variables de tabla que usa el código, en orden de aparición y sin repetir"""
+    return list(dict.fromkeys(r[2] for r in referencias if es_temporal_de_sesion(r[2])))
+
+def aristas_de_referencias(nombre_sp, referencias, tipo_objeto=None, alias_por_base=None):
+    """
+    Aristas que las referencias implican para un objeto: [(origen, destino, relación, temporal, dinámico)].
+    `temporal` marca que la tabla del lado de datos es una XTMP y `dinámico` que la
+    referencia salió de un SQL dinámico plegado. Un EXEC da la arista
+    objeto -> procedimiento con relación "EJECUTA".
+    Las #temporales y variables de tabla se colapsan: lo que entra a ellas ya es
+    lectura del objeto y lo que sale, escritura; el salto objeto -> #t -> objeto
+    solo agregaría un nodo por objeto (ver temporales_de_referencias para anotarlo).
+    """
+    aristas = []
+    for catalogo, esquema, tabla, relacion, *marcas in referencias:
+        if relacion == SQL_DINAMICO_RESUELTO or relacion == SQL_DINAMICO_PENDIENTE or es_temporal_de_sesion(tabla):
+            continue
+        dinamico = bool(marcas)
+        nombre_tabla = nombre_nodo_tabla(catalogo, esquema, tabla, nombre_sp, alias_por_base)
+        if nombre_tabla == nombre_sp:
+            continue  # El propio objeto en su CREATE (o un EXEC recursivo)
+
+        if relacion == "EJECUTA":
+            if tipo_objeto not in TIPOS_CONSULTA:
+                aristas.append((nombre_sp, nombre_tabla, "EJECUTA", False, dinamico))
+        # Vistas y funciones no escriben: todo lo que tocan es lectura
+        elif tipo_objeto in TIPOS_CONSULTA:
+            aristas.append((nombre_tabla, nombre_sp, "LEE", False, dinamico))
+        elif relacion == "ESCRIBE":
+            # FLUJO: SP -> TABLA
+            aristas.append((nombre_sp, nombre_tabla, "ESCRIBE", "XTMP" in nombre_tabla, dinamico))
+        elif relacion == "LEE":
+            # FLUJO: TABLA -> SP (Lectura)
+            aristas.append((nombre_tabla, nombre_sp, "LEE", "XTMP" in nombre_tabla, dinamico))
+    return aristas
+
+def analizar_codigo_sp(nombre_sp, codigo_sql, tipo_objeto=None, alias_por_base=None):
+    """Aristas que el código de un objeto implica (parseo + resolución de nombres)"""
+    return aristas_de_referencias(nombre_sp, referencias_de_codigo(codigo_sql), tipo_objeto, alias_por_base)
+
+# ==============================================
+# EJECUCIÓN EN UN POOL DE PROCESOS CON PRESUPUESTO
+# ==============================================
+# Cada proceso abre el almacén de código (mmap) una vez y recibe bloques de
+# (hash, desde_sentencia): el código no viaja entre procesos, solo la huella de
+# ida y las referencias de vuelta, una respuesta por sentencia. El padre mide el
+# tiempo desde la última respuesta de cada proceso: si una sentencia pasa de
+# `segundos_sentencia`, mata el proceso, anota la sentencia en las incidencias y
+# sigue con la siguiente en un proceso nuevo. Cada cuerpo distinto se parsea una
+# sola vez aunque varios objetos (u otras bases) lo compartan.
+TAM_BLOQUE_DEFECTO = 16         # Objetos por envío a un proceso (reparte SPs grandes y chicos)
+SEGUNDOS_SENTENCIA_DEFECTO = 20  # 0 = sin límite de tiempo
+VISTA_PREVIA_CARACTERES = 120
+
+def _procesar_bloque(almacen, bloque, max_caracteres):
+    """
+    Mensajes del análisis de un bloque [(hash, desde)]: los mismos en un proceso o en este.
+    Cada paso lleva los segundos que tomó, y un error del parser el nombre de su excepción.
+    """
+    for hash_def, desde in bloque:
+        codigo = almacen.obtener(hash_def)
+        if codigo is None:
+            yield ("objeto", hash_def)
+            continue
+        inicio = time.perf_counter()
+        try:
+            sentencias, padre = dividir_modulo(codigo)
+        except Exception as e:
+            yield ("dividido", hash_def, 0, time.perf_counter() - inicio)
+            yield ("sentencia", hash_def, -1, [], "error", len(codigo), "completa", 0.0, type(e).__name__)
+            yield ("objeto", hash_def)
+            continue
+        yield ("dividido", hash_def, len(sentencias), time.perf_counter() - inicio)
+        for i in range(desde, len(sentencias)):
+            tokens, texto = sentencias[i]
+            inicio = time.perf_counter()
+            via, referencias = triar_sentencia(tokens)
+            llamadas = llamadas_de_sentencia(tokens)
+            if via != "completa":
+                yield ("sentencia", hash_def, i, _con_padre(referencias, padre) + llamadas, None, len(texto), via,
+                       time.perf_counter() - inicio, None)
+                continue
+            if len(texto) > max_caracteres:
+                yield ("sentencia", hash_def, i, llamadas, "tamano", len(texto), via, time.perf_counter() - inicio, None)
+                continue
+            try:
+                referencias = _con_padre(referencias_de_sentencia(tokens, codigo), padre) + llamadas
+            except Exception as e:
+                yield ("sentencia", hash_def, i, llamadas, "error", len(texto), via,
+                       time.perf_counter() - inicio, getattr(e, "clase", type(e).__name__))
+            else:
+                yield ("sentencia", hash_def, i, referencias, None, len(texto), via, time.perf_counter() - inicio, None)
+        # El SQL dinámico va como una sentencia más, la última (índice = número de sentencias)
+        if desde <= len(sentencias):
+            inicio = time.perf_counter()
+            dinamicas = referencias_dinamicas(codigo, sentencias, max_caracteres)
+            if dinamicas:
+                yield ("dinamico", hash_def, len(sentencias), dinamicas, time.perf_counter() - inicio)
+        yield ("objeto", hash_def)
+    yield ("bloque",)
+
+def _bucle_worker(conexion, directorio_almacen, max_caracteres):
+    almacen = AlmacenCodigo(directorio_almacen)
+    conexion.send(("listo",))  # El arranque (imports, mmap) no cuenta para el presupuesto
+    while True:
+        bloque = conexion.recv()
+        if bloque is None:
+            break
+        for mensaje in _procesar_bloque(almacen, bloque, max_caracteres):
+            conexion.send(mensaje)
+    almacen.cerrar()
+
+class _Worker:
+    """Un proceso del pool, con el bloque que está procesando y por dónde va"""
+    def __init__(self, contexto, directorio_almacen, max_caracteres):
+        self.conexion, extremo_hijo = contexto.Pipe()
+        self.proceso = contexto.Process(target=_bucle_worker, daemon=True,
+                                        args=(extremo_hijo, directorio_almacen, max_caracteres))
+        self.proceso.start()
+        extremo_hijo.close()
+        self.listo = False
+        self.bloque = None
+        self.actual = None  # (hash, sentencia en curso)
+        self.ultimo_mensaje = None
+
+    def asignar(self, bloque):
+        self.bloque = deque(bloque)
+        self.actual = None
+        self.ultimo_mensaje = time.perf_counter()
+        self.conexion.send(bloque)
+
+    def terminar(self, matar=False):
+        if matar:
+            self.proceso.kill()
+        else:
+            try:
+                self.conexion.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.proceso.join()
+        self.conexion.close()
+
+class _Resultados:
+    """Referencias por hash y sentencia, incidencias (tiempo, tamaño, error) y telemetría por hash"""
+    def __init__(self):
+        self.por_sentencia = {}
+        self.incidencias = []
+        self.telemetria = {}
+        self.sentencias = 0
+        self.por_via = {"omitida": 0, "rapida": 0, "completa": 0}
+
+    def de_hash(self, hash_def):
+        """Telemetría de un cuerpo: segundos y sentencias por vía, fallidas y cortadas por presupuesto"""
+        return self.telemetria.setdefault(hash_def, {"segundos": 0.0, "sentencias": 0, "parseadas": 0,
+                                                     "errores": 0, "cortadas": 0, "clases_error": {}})
+
+    def registrar(self, mensaje):
+        tipo = mensaje[0]
+        if tipo == "dividido":
+            _, hash_def, sentencias, segundos = mensaje
+            self.por_sentencia.setdefault(hash_def, {})
+            # Al retomar tras un corte se vuelve a dividir: el tiempo suma, las sentencias no
+            telemetria = self.de_hash(hash_def)
+            telemetria["segundos"] += segundos
+            telemetria["sentencias"] = sentencias
+        elif tipo == "sentencia":
+            _, hash_def, indice, referencias, motivo, caracteres, via, segundos, clase_error = mensaje
+            self.por_sentencia.setdefault(hash_def, {})[indice] = referencias
+            self.sentencias += 1
+            self.por_via[via] += 1
+            telemetria = self.de_hash(hash_def)
+            telemetria["segundos"] += segundos
+            telemetria["parseadas"] += via == "completa" and indice >= 0
+            if motivo == "error":
+                telemetria["errores"] += 1
+                telemetria["clases_error"][clase_error] = telemetria["clases_error"].get(clase_error, 0) + 1
+            elif motivo is not None:
+                telemetria["cortadas"] += 1
+            if motivo is not None:
+                self.incidencias.append({"hash": hash_def, "sentencia": indice, "motivo": motivo,
+                                         "caracteres": caracteres, "segundos": None})
+        elif tipo == "dinamico":
+            _, hash_def, indice, referencias, segundos = mensaje
+            self.por_sentencia.setdefault(hash_def, {})[indice] = referencias
+            self.de_hash(hash_def)["segundos"] += segundos
+
+    def referencias(self):
+        return {h: [r for i in sorted(partes) for r in partes[i]] for h, partes in self.por_sentencia.items()}
+
+def _vista_previa(almacen, incidencia):
+    """Inicio del texto de la sentencia de una incidencia (se vuelve a dividir solo para el reporte)"""
+    codigo = almacen.obtener(incidencia["hash"], "")
+    if incidencia["sentencia"] >= 0:
+        try:
+            codigo = dividir_sentencias(codigo)[incidencia["sentencia"]][1]
+        except Exception:
+            pass
+    return " ".join(codigo[:VISTA_PREVIA_CARACTERES * 2].split())[:VISTA_PREVIA_CARACTERES]
+
+def analizar_huellas(huellas, directorio_almacen, workers=None, tam_bloque=TAM_BLOQUE_DEFECTO,
+                     segundos_sentencia=SEGUNDOS_SENTENCIA_DEFECTO, max_caracteres=CARACTERES_SENTENCIA_DEFECTO):
+    """
+    Parsea el código de cada huella sentencia por sentencia en `workers` procesos.
+    Sin límite de tiempo y con 1 worker corre en este proceso. Retorna
+    ({hash: referencias}, métricas, incidencias, {hash: telemetría}); las huellas
+    sin código en el almacén no aparecen y las que tuvieron incidencias traen lo
+    que sí se pudo parsear. El resultado no depende de qué proceso termine primero;
+    los segundos de la telemetría sí varían entre corridas.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    pendientes = deque([(h, 0) for h in huellas[i:i + tam_bloque]] for i in range(0, len(huellas), tam_bloque))
+    bloques = len(pendientes)
+    resultados = _Resultados()
+    reiniciados = 0
+    inicio = time.perf_counter()
+
+    if not segundos_sentencia and (workers == 1 or bloques <= 1):
+        almacen = AlmacenCodigo(directorio_almacen)
+        for bloque in pendientes:
+            for mensaje in _procesar_bloque(almacen, bloque, max_caracteres):
+                resultados.registrar(mensaje)
+        workers = 1
+    else:
+        workers = min(workers, max(1, bloques))
+        contexto = multiprocessing.get_context()
+        activos = [_Worker(contexto, directorio_almacen, max_caracteres) for _ in range(workers)]
+        try:
+            while pendientes or any(w.bloque is not None for w in activos):
+                for w in activos:
+                    if w.listo and w.bloque is None and pendientes:
+                        w.asignar(pendientes.popleft())
+                ocupados = {w.conexion: w for w in activos if w.bloque is not None or not w.listo}
+                espera = min(1.0, segundos_sentencia / 4) if segundos_sentencia else 1.0
+                for conexion in wait(list(ocupados), timeout=espera):
+                    w = ocupados[conexion]
+                    try:
+                        while conexion.poll():
+                            mensaje = conexion.recv()
+                            if mensaje[0] == "listo":
+                                w.listo = True
+                                continue
+                            w.ultimo_mensaje = time.perf_counter()
+                            resultados.registrar(mensaje)
+                            if mensaje[0] == "dividido":
+                                w.actual = (mensaje[1], w.bloque[0][1])
+                            elif mensaje[0] == "sentencia":
+                                w.actual = (mensaje[1], mensaje[2] + 1)
+                            elif mensaje[0] == "objeto":
+                                w.bloque.popleft()
+                                w.actual = None
+                            elif mensaje[0] == "bloque":
+                                w.bloque = None
+                                break
+                    except (EOFError, OSError):
+                        if not w.listo:
+                            raise RuntimeError("Un proceso de parseo no pudo arrancar")
+                        w.ultimo_mensaje = None  # El proceso murió: se trata como un exceso de tiempo
+
+                ahora = time.perf_counter()
+                for i, w in enumerate(activos):
+                    if w.bloque is None:
+                        continue
+                    murio = w.ultimo_mensaje is None
+                    if not murio and not (segundos_sentencia and ahora - w.ultimo_mensaje > segundos_sentencia):
+                        continue
+                    if w.bloque:
+                        # Presupuesto agotado (o proceso caído): se mata y se retoma en la sentencia siguiente
+                        hash_def, indice = w.actual if w.actual else (w.bloque[0][0], -1)
+                        resultados.incidencias.append({
+                            "hash": hash_def, "sentencia": indice, "motivo": "caida" if murio else "tiempo",
+                            "caracteres": None,
+                            "segundos": None if murio else round(ahora - w.ultimo_mensaje, 2)})
+                        resultados.por_sentencia.setdefault(hash_def, {})
+                        telemetria = resultados.de_hash(hash_def)
+                        telemetria["cortadas"] += 1
+                        if not murio:
+                            telemetria["segundos"] += ahora - w.ultimo_mensaje
+                        resto = list(w.bloque)[1:]
+                        if indice >= 0:
+                            resto.insert(0, (hash_def, indice + 1))
+                        if resto:
+                            pendientes.appendleft(resto)
+                    elif not murio:
+                        continue  # Bloque terminado, falta solo el aviso de fin
+                    w.terminar(matar=True)
+                    activos[i] = _Worker(contexto, directorio_almacen, max_caracteres)
+                    reiniciados += 1
+        finally:
+            for w in activos:
+                w.terminar(matar=w.bloque is not None)
+
+    segundos = time.perf_counter() - inicio
+    if resultados.incidencias:
+        almacen = AlmacenCodigo(directorio_almacen)
+        for incidencia in resultados.incidencias:
+            incidencia["inicio_sentencia"] = _vista_previa(almacen, incidencia)
+    referencias = resultados.referencias()
+    motivos = [i["motivo"] for i in resultados.incidencias]
+    return referencias, {
+        "parseados": len(referencias),
+        "sentencias": resultados.sentencias,
+        "workers": workers,
+        "bloques": bloques,
+        "segundos": round(segundos, 3),
+        "objetos_por_segundo": round(len(referencias) / segundos, 1) if segundos > 0 else None,
+        "sentencias_por_segundo": round(resultados.sentencias / segundos, 1) if segundos > 0 else None,
+        "sentencias_omitidas": resultados.por_via["omitida"],
+        "sentencias_rapidas": resultados.por_via["rapida"],
+        "sentencias_parseadas": resultados.por_via["completa"],
+        "fraccion_sin_parser": (round((resultados.por_via["omitida"] + resultados.por_via["rapida"])
+                                      / resultados.sentencias, 3) if resultados.sentencias else None),
+        "presupuesto_tiempo": motivos.count("tiempo"),
+        "presupuesto_tamano": motivos.count("tamano"),
+        "errores_sentencia": motivos.count("error"),
+        "procesos_reiniciados": reiniciados
+    }, resultados.incidencias, {h: t for h, t in resultados.telemetria.items() if h in referencias}
@@ -0,0 +1,85 @@
+# src/cache_parsing.py
+import json
+import time
+import pandas as pd
+import sqlglot
+
+from capa_datos import cargar_tabla, guardar_tabla, existe_tabla
+from analisis_sql import VERSION_EXTRACTOR
+
+# ==============================================
+# CACHÉ DE PARSING EN DISCO
+# ==============================================
+# Resultado del parseo (referencias_de_codigo) por (Hash_Definicion, versión de
+# sqlglot, versión del extractor): un SP que no cambió no se vuelve a parsear
+# mientras no cambie el parser ni la lógica de extracción. Es una tabla de la capa
+# de datos (Parquet/CSV) con las referencias serializadas en JSON y la fecha de
+# último uso, que sirve para desalojar por antigüedad y, si pasa del tamaño
+# máximo, las menos usadas recientemente.
+NOMBRE_CACHE = "cache_parsing"
+CACHE_DIAS_DEFECTO = 30
+CACHE_MB_DEFECTO = 256
+COLUMNAS_CACHE = ["Hash_Definicion", "Version_Sqlglot", "Version_Extractor", "Referencias",
+                  "Creado", "Ultimo_Uso"]
+
+class CacheParsing:
+    """Referencias por huella de código para la versión actual de sqlglot y del extractor"""
+    def __init__(self, directorio, dias_max=CACHE_DIAS_DEFECTO, mb_max=CACHE_MB_DEFECTO):
+        self.directorio = directorio
+        self.dias_max = dias_max
+        self.mb_max = mb_max
+        self.version = (sqlglot.__version__, VERSION_EXTRACTOR)
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojados = 0
+        self._ahora = int(time.time())
+        self._filas = {}  # (hash, version_sqlglot, version_extractor) -> fila
+        if existe_tabla(directorio, NOMBRE_CACHE):
+            df = cargar_tabla(directorio, NOMBRE_CACHE)
+            for fila in df.astype({"Version_Sqlglot": str, "Version_Extractor": str}).to_dict("records"):
+                self._filas[(fila["Hash_Definicion"], fila["Version_Sqlglot"], fila["Version_Extractor"])] = fila
+
+    def obtener(self, hash_def):
+        """Referencias cacheadas del código o None (cuenta acierto/fallo)"""
+        fila = self._filas.get((hash_def, *self.version))
+        if fila is None:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        fila["Ultimo_Uso"] = self._ahora
+        return [tuple(r) for r in json.loads(fila["Referencias"])]
+
+    def agregar(self, hash_def, referencias):
+        self._filas[(hash_def, *self.version)] = {
+            "Hash_Definicion": hash_def, "Version_Sqlglot": self.version[0],
+            "Version_Extractor": self.version[1],
+            "Referencias": json.dumps(referencias, ensure_ascii=False, separators=(",", ":")),
+            "Creado": self._ahora, "Ultimo_Uso": self._ahora
+        }
+
+    def desalojar(self):
+        """Quita lo no usado en `dias_max` días y, si pasa de `mb_max`, lo usado hace más tiempo"""
+        limite = self._ahora - self.dias_max * 86400
+        vigentes = {k: f for k, f in self._filas.items() if int(f["Ultimo_Uso"]) >= limite}
+        bytes_max = self.mb_max * 1024 ** 2
+        total = sum(len(f["Referencias"]) + len(f["Hash_Definicion"]) for f in vigentes.values())
+        if total > bytes_max:
+            for clave, fila in sorted(vigentes.items(), key=lambda kv: int(kv[1]["Ultimo_Uso"])):
+                if total <= bytes_max:
+                    break
+                total -= len(fila["Referencias"]) + len(fila["Hash_Definicion"])
+                del vigentes[clave]
+        self.desalojados += len(self._filas) - len(vigentes)
+        self._filas = vigentes
+
+    def guardar(self):
+        self.desalojar()
+        guardar_tabla(pd.DataFrame(list(self._filas.values()), columns=COLUMNAS_CACHE),
+                      self.directorio, NOMBRE_CACHE)
+
+    def resumen(self):
+        consultas = self.aciertos + self.fallos
+        return {"aciertos": self.aciertos, "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else None,
+                "entradas": len(self._filas), "desalojadas": self.desalojados,
+                "version_sqlglot": self.version[0], "version_extractor": self.version[1]}
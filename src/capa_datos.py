@@ -0,0 +1,268 @@
+# src/capa_datos.py
+import os
+import json
+import pandas as pd
+
+# ==============================================
+# FORMATO DE LAS CAPAS RAW / PROCESSED
+# ==============================================
+# Parquet (columnar, tipado y comprimido) si pyarrow está instalado.
+# Si no, se mantiene el CSV de siempre. Se puede forzar con LINAJE_FORMATO=csv|parquet.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+FORMATO = os.getenv("LINAJE_FORMATO", "parquet" if PARQUET_DISPONIBLE else "csv").lower()
+if FORMATO == "parquet" and not PARQUET_DISPONIBLE:
+    print("⚠️ LINAJE_FORMATO=parquet pero 'pyarrow' no está instalado. Se usará CSV.")
+    print("💡 Instálalo con: pip install pyarrow")
+    FORMATO = "csv"
+
+COMPRESION_PARQUET = "zstd"
+EXTENSIONES = {"parquet": ".parquet", "csv": ".csv"}
+
+# ==============================================
+# RUTAS
+# ==============================================
+def ruta_tabla(directorio, nombre, formato=None):
+    """Ruta del archivo de una tabla lógica (nombre sin extensión) en el formato indicado"""
+    return os.path.join(directorio, nombre + EXTENSIONES[formato or FORMATO])
+
+def ruta_existente(directorio, nombre):
+    """Ruta del archivo que existe para la tabla (Parquet primero, luego CSV) o None"""
+    formatos = ["parquet", "csv"] if PARQUET_DISPONIBLE else ["csv"]
+    for formato in formatos:
+        ruta = ruta_tabla(directorio, nombre, formato)
+        if os.path.exists(ruta):
+            return ruta
+    return None
+
+def existe_tabla(directorio, nombre):
+    return ruta_existente(directorio, nombre) is not None
+
+def _quitar_otros_formatos(directorio, nombre, formato):
+    """Evita que quede una copia vieja en otro formato que el cargador pueda preferir"""
+    for otro in EXTENSIONES:
+        if otro != formato:
+            ruta = ruta_tabla(directorio, nombre, otro)
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+# ==============================================
+# LECTURA / ESCRITURA
+# ==============================================
+def cargar_tabla(directorio, nombre, columnas=None):
+    """
+    Carga una tabla de la capa indicada. Lee Parquet si existe (solo las
+    columnas pedidas) y si no, el CSV. Lanza FileNotFoundError si no hay ninguno.
+    """
+    ruta = ruta_existente(directorio, nombre)
+    if ruta is None:
+        raise FileNotFoundError(2, "No existe la tabla", ruta_tabla(directorio, nombre))
+    if ruta.endswith(".parquet"):
+        return pd.read_parquet(ruta, columns=columnas)
+    return pd.read_csv(ruta, usecols=columnas)
+
+def columnas_tabla(directorio, nombre):
+    """Nombres de columna de la tabla sin cargar los datos"""
+    ruta = ruta_existente(directorio, nombre)
+    if ruta is None:
+        raise FileNotFoundError(2, "No existe la tabla", ruta_tabla(directorio, nombre))
+    if ruta.endswith(".parquet"):
+        return list(pq.read_schema(ruta).names)
+    return list(pd.read_csv(ruta, nrows=0).columns)
+
+def leer_por_lotes(directorio, nombre, tam_lote=50000):
+    """Recorre la tabla en DataFrames de hasta `tam_lote` filas sin cargarla completa"""
+    ruta = ruta_existente(directorio, nombre)
+    if ruta is None:
+        raise FileNotFoundError(2, "No existe la tabla", ruta_tabla(directorio, nombre))
+    if ruta.endswith(".parquet"):
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=tam_lote):
+            yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(ruta, chunksize=tam_lote)
+
+def guardar_tabla(df, directorio, nombre):
+    """Guarda el DataFrame en el formato configurado y retorna la ruta escrita"""
+    ruta = ruta_tabla(directorio, nombre)
+    if FORMATO == "parquet":
+        df.to_parquet(ruta, index=False, compression=COMPRESION_PARQUET)
+    else:
+        df.to_csv(ruta, index=False)
+    _quitar_otros_formatos(directorio, nombre, FORMATO)
+    return ruta
+
+class EscritorTabla:
+    """
+    Escritura incremental (lote a lote) de una tabla, para la extracción en streaming.
+    Escribe a un archivo parcial y lo publica con confirmar(); si no se confirma,
+    descartar() lo borra y la versión anterior de la tabla queda intacta.
+    """
+    def __init__(self, directorio, nombre, columnas):
+        self.directorio = directorio
+        self.nombre = nombre
+        self.columnas = list(columnas)
+        self.ruta_final = ruta_tabla(directorio, nombre)
+        self.ruta_parcial = self.ruta_final + ".parcial"
+        self._writer = None
+        self._esquema = None
+        self._archivo = None
+        if FORMATO == "csv":
+            self._archivo = open(self.ruta_parcial, 'w', encoding='utf-8', newline='')
+            # Cabecera aunque la consulta no devuelva filas
+            pd.DataFrame(columns=self.columnas).to_csv(self._archivo, index=False)
+
+    def escribir(self, df_lote):
+        if FORMATO == "csv":
+            df_lote.to_csv(self._archivo, index=False, header=False)
+            return
+        tabla = pa.Table.from_pandas(df_lote, preserve_index=False)
+        if self._writer is None:
+            # Columnas sin valores en el primer lote: se tipan como texto
+            campos = [pa.field(c.name, pa.string()) if pa.types.is_null(c.type) else c for c in tabla.schema]
+            self._esquema = pa.schema(campos)
+            self._writer = pq.ParquetWriter(self.ruta_parcial, self._esquema, compression=COMPRESION_PARQUET)
+        self._writer.write_table(tabla.cast(self._esquema))
+
+    def confirmar(self):
+        if FORMATO == "csv":
+            self._archivo.close()
+        else:
+            if self._writer is None:
+                # Consulta sin filas: tabla vacía con las columnas esperadas
+                pd.DataFrame(columns=self.columnas).to_parquet(self.ruta_parcial, index=False)
+            else:
+                self._writer.close()
+        os.replace(self.ruta_parcial, self.ruta_final)
+        _quitar_otros_formatos(self.directorio, self.nombre, FORMATO)
+
+    def descartar(self):
+        try:
+            if self._archivo is not None:
+                self._archivo.close()
+            if self._writer is not None:
+                self._writer.close()
+        finally:
+            if os.path.exists(self.ruta_parcial):
+                os.remove(self.ruta_parcial)
+
+# ==============================================
+# CAPA RAW MULTI-BASE (un subdirectorio por base)
+# ==============================================
+# Con varias bases, la ingesta escribe cada una en RAW_DIR/<alias>/ junto con un
+# destino.json que la identifica. Los consumidores leen la capa RAW con
+# cargar_tabla_raw(), que une todas las bases y califica los nombres como
+# base.esquema.objeto para que no choquen objetos homónimos (od_*, XTMP_*).
+ARCHIVO_ESPACIO = "destino.json"
+ESQUEMA_DEFECTO = "dbo"
+
+# Columnas de nombre a calificar por tabla RAW: (columna, columna_base, columna_esquema).
+# Si la columna de base no existe o viene vacía se usa la base del subdirectorio.
+# La "base" del nombre calificado es el alias del espacio (por defecto, el nombre de
+# la base), así dos bases homónimas en servidores distintos no se mezclan.
+COLUMNAS_A_CALIFICAR = {
+    "dependencias_sql": [("Origen_SP", None, "Esquema_SP"), ("Destino_Tabla", "Base_Tabla", "Esquema_Tabla")],
+    "dependencias_columnas": [("Origen_SP", None, "Esquema_SP"), ("Destino_Tabla", None, "Esquema_Tabla")],
+    "codigo_fuente": [("Nombre_Objeto", None, "Esquema"), ("Objeto_Padre", None, "Esquema")],
+    "hashes_codigo": [("Nombre_Objeto", None, "Esquema")],
+    "metadata_tablas": [("Tabla", None, "Esquema")],
+    "volumen_tablas": [("Tabla", None, "Esquema")],
+    "estadisticas_sp": [("Nombre_SP", None, "Esquema")],
+}
+
+def calificar_nombre(nombre, base, esquema=None):
+    """Nombre completo base.esquema.objeto (esquema dbo si no se conoce)"""
+    if pd.isna(esquema) or not esquema:
+        esquema = ESQUEMA_DEFECTO
+    return f"{base}.{esquema}.{nombre}"
+
+def base_de_nombre(nombre):
+    """Base de datos de un nombre calificado (None si no viene calificado)"""
+    partes = str(nombre).split(".")
+    return partes[0] if len(partes) >= 3 else None
+
+def registrar_espacio_raw(directorio, alias, servidor, base_datos):
+    """Marca un subdirectorio de la capa RAW como el espacio de una base"""
+    with open(os.path.join(directorio, ARCHIVO_ESPACIO), 'w', encoding='utf-8') as f:
+        json.dump({"alias": alias, "servidor": servidor, "base_datos": base_datos}, f,
+                  indent=2, ensure_ascii=False)
+
+def espacios_raw(directorio):
+    """
+    Espacios por base bajo la capa RAW, ordenados por alias:
+    [{"alias", "servidor", "base_datos", "directorio"}]. Lista vacía si la capa
+    RAW es de una sola base (archivos directamente en el directorio).
+    """
+    if not os.path.isdir(directorio):
+        return []
+    espacios = []
+    for entrada in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, entrada, ARCHIVO_ESPACIO)
+        if not os.path.isfile(ruta):
+            continue
+        with open(ruta, 'r', encoding='utf-8') as f:
+            espacio = json.load(f)
+        espacio.setdefault("alias", entrada)
+        espacio.setdefault("base_datos", entrada)
+        espacio["directorio"] = os.path.join(directorio, entrada)
+        espacios.append(espacio)
+    return espacios
+
+def existe_tabla_raw(directorio, nombre):
+    espacios = espacios_raw(directorio)
+    if not espacios:
+        return existe_tabla(directorio, nombre)
+    return any(existe_tabla(e["directorio"], nombre) for e in espacios)
+
+def mapa_alias_por_base(espacios):
+    """{base_datos: alias} para resolver referencias entre bases (solo bases sin homónimas)"""
+    conteo = {}
+    for e in espacios:
+        conteo[e["base_datos"]] = conteo.get(e["base_datos"], 0) + 1
+    return {e["base_datos"]: e["alias"] for e in espacios if conteo[e["base_datos"]] == 1}
+
+def _calificar_tabla(df, nombre, alias, alias_por_base):
+    for columna, columna_base, columna_esquema in COLUMNAS_A_CALIFICAR.get(nombre, []):
+        if columna not in df.columns:
+            continue
+        bases = df[columna_base] if columna_base in df.columns else pd.Series(None, index=df.index)
+        bases = bases.map(lambda b: alias_por_base.get(b, b) if pd.notna(b) and b else alias)
+        esquemas = df[columna_esquema] if columna_esquema in df.columns else pd.Series(None, index=df.index)
+        df[columna] = [calificar_nombre(n, b, e) if pd.notna(n) else n
+                       for n, b, e in zip(df[columna], bases, esquemas)]
+    return df
+
+def cargar_tabla_raw(directorio, nombre, columnas=None):
+    """
+    Carga una tabla de la capa RAW. Con una sola base equivale a cargar_tabla().
+    Con varias, concatena la tabla de cada espacio con los nombres calificados
+    (alias.esquema.objeto) y una columna Base_Datos con el alias de origen.
+    """
+    espacios = espacios_raw(directorio)
+    if not espacios:
+        return cargar_tabla(directorio, nombre, columnas)
+    alias_por_base = mapa_alias_por_base(espacios)
+
+    partes = []
+    for espacio in espacios:
+        if not existe_tabla(espacio["directorio"], nombre):
+            continue
+        leer = None
+        if columnas is not None:
+            # Además de las pedidas, las columnas de base/esquema que hacen falta para calificar
+            auxiliares = [c for _, b, e in COLUMNAS_A_CALIFICAR.get(nombre, []) for c in (b, e) if c]
+            disponibles = columnas_tabla(espacio["directorio"], nombre)
+            leer = [c for c in dict.fromkeys(columnas + auxiliares) if c in disponibles]
+        df = cargar_tabla(espacio["directorio"], nombre, leer)
+        df = _calificar_tabla(df, nombre, espacio["alias"], alias_por_base)
+        df["Base_Datos"] = espacio["alias"]
+        partes.append(df)
+
+    if not partes:
+        raise FileNotFoundError(2, "No existe la tabla en ninguna base", ruta_tabla(directorio, nombre))
+    df = pd.concat(partes, ignore_index=True)
+    return df[columnas] if columnas is not None else df
@@ -12,6 +12,8 @@ RAW_DIR = os.path.join(DATA_DIR, "01_raw")
 PROCESSED_DIR = os.path.join(DATA_DIR, "02_processed")
 KNOWLEDGE_DIR = os.path.join(DATA_DIR, "03_knowledge")
 GOLD_DIR = os.path.join(DATA_DIR, "04_gold")
+# Cachés reconstruibles (resultados de parsing por huella de código)
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
 
 # --- RUTAS DE REPORTES (OUTPUTS) ---
 REPORTS_DIR = os.path.join(BASE_DIR, "reports")
@@ -23,6 +25,9 @@ EDA_DIR = os.path.join(REPORTS_DIR, "eda")
 EDA_SALUD_DIR = os.path.join(EDA_DIR, "01_salud_sistema")
 EDA_PROFUNDO_DIR = os.path.join(EDA_DIR, "02_profundo_codigo")
 
+# Telemetría de ejecución (tiempos, memoria, volúmenes) de cada corrida
+TELEMETRIA_DIR = os.path.join(REPORTS_DIR, "telemetria")
+
 # --- CONFIGURACIÓN ---
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
 API_KEY_FILE = os.path.join(CONFIG_DIR, "api_key.txt")
@@ -32,7 +37,8 @@ def ensure_directories():
     """Crea las carpetas clave si no existen"""
     rutas_clave = [
         RAW_DIR, PROCESSED_DIR, KNOWLEDGE_DIR, GOLD_DIR, 
-        IMG_DIR, DOCS_DIR, EDA_SALUD_DIR, EDA_PROFUNDO_DIR, CONFIG_DIR
+        IMG_DIR, DOCS_DIR, EDA_SALUD_DIR, EDA_PROFUNDO_DIR, CONFIG_DIR,
+        TELEMETRIA_DIR, CACHE_DIR
     ]
     for d in rutas_clave:
         os.makedirs(d, exist_ok=True)
@@ -0,0 +1,249 @@
+# src/fuentes_catalogo.py
+import os
+import re
+import sqlite3
+import hashlib
+
+# ==============================================
+# FUENTES DEL CATÁLOGO (ADAPTADORES)
+# ==============================================
+# La ingesta solo necesita una conexión estilo DB-API (cursor, execute, fetchmany,
+# description) sobre la que correr sus consultas a sys.*. La fuente se elige con
+# LINAJE_FUENTE (o --fuente en 01_ingestion_sql.py):
+#   sqlserver            -> SQL Server real por ODBC (por defecto)
+#   sqlite:<ruta>        -> catálogo local SQLite que emula las vistas sys.*
+#                           (<ruta> es un .db, o una carpeta con un <base>.db por base)
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+FUENTE_DEFECTO = "sqlserver"
+DRIVER_ODBC = "ODBC Driver 17 for SQL Server"
+
+class FuenteSQLServer:
+    """SQL Server real vía pyodbc (ODBC Driver 17)"""
+    tipo = "sqlserver"
+
+    def __init__(self, servidor, base, usuario, password):
+        self.servidor = servidor
+        self.base = base
+        self.usuario = usuario
+        self.password = password
+
+    def conectar(self, servidor=None, base=None):
+        if pyodbc is None:
+            raise ImportError("'pyodbc' no está instalado. Instálalo con: pip install pyodbc")
+        connection_string = (
+            f"DRIVER={{{DRIVER_ODBC}}};"
+            f"SERVER={servidor or self.servidor};DATABASE={base or self.base};"
+            f"UID={self.usuario};PWD={self.password};"
+            "TrustServerCertificate=yes;"
+        )
+        return pyodbc.connect(connection_string)
+
+    def descripcion(self):
+        return f"SQL Server ({self.servidor})"
+
+# ==============================================
+# STAND-IN SQLITE (emula sys.*)
+# ==============================================
+# El archivo guarda las tablas base del catálogo y expone vistas con la forma de
+# las de SQL Server (sys.tables, sys.procedures, ...) y una tabla con la forma de
+# las DMV sys.dm_db_partition_stats (volúmenes) y sys.dm_exec_procedure_stats
+# (tiempos de ejecución). Al conectar se adjunta
+# como el esquema "sys", así las consultas de la ingesta corren sin cambios salvo
+# las funciones T-SQL, que se registran en Python (OBJECT_NAME, HASHBYTES, ...).
+DDL_CATALOGO_SQLITE = """
+CREATE TABLE IF NOT EXISTS schemas (
+    schema_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS objects (
+    object_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    schema_id INTEGER NOT NULL DEFAULT 1,
+    type TEXT NOT NULL,
+    type_desc TEXT NOT NULL,
+    create_date TEXT NOT NULL,
+    modify_date TEXT NOT NULL,
+    parent_object_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS types (
+    user_type_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS columns (
+    object_id INTEGER NOT NULL,
+    column_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    user_type_id INTEGER NOT NULL,
+    max_length INTEGER,
+    is_nullable INTEGER,
+    PRIMARY KEY (object_id, column_id)
+);
+CREATE TABLE IF NOT EXISTS sql_modules (
+    object_id INTEGER PRIMARY KEY,
+    definition TEXT
+);
+CREATE TABLE IF NOT EXISTS sql_expression_dependencies (
+    referencing_id INTEGER NOT NULL,
+    referenced_id INTEGER,
+    referenced_minor_id INTEGER NOT NULL DEFAULT 0,
+    referenced_database_name TEXT,
+    referenced_schema_name TEXT,
+    referenced_entity_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_deps_referencing ON sql_expression_dependencies (referencing_id);
+CREATE TABLE IF NOT EXISTS sql_dependencies (
+    object_id INTEGER NOT NULL,
+    referenced_major_id INTEGER NOT NULL,
+    referenced_minor_id INTEGER NOT NULL DEFAULT 0,
+    is_selected INTEGER NOT NULL DEFAULT 0,
+    is_updated INTEGER NOT NULL DEFAULT 0,
+    is_select_all INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_sql_deps_object ON sql_dependencies (object_id);
+CREATE TABLE IF NOT EXISTS dm_db_partition_stats (
+    object_id INTEGER NOT NULL,
+    index_id INTEGER NOT NULL DEFAULT 0,
+    partition_number INTEGER NOT NULL DEFAULT 1,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    reserved_page_count INTEGER NOT NULL DEFAULT 0,
+    used_page_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dm_exec_procedure_stats (
+    database_id INTEGER NOT NULL DEFAULT 1,
+    object_id INTEGER NOT NULL,
+    cached_time TEXT,
+    last_execution_time TEXT,
+    execution_count INTEGER NOT NULL DEFAULT 0,
+    total_elapsed_time INTEGER NOT NULL DEFAULT 0,
+    total_logical_reads INTEGER NOT NULL DEFAULT 0
+);
+CREATE VIEW IF NOT EXISTS tables AS
+    SELECT object_id, name, schema_id, type, type_desc, create_date, modify_date
+    FROM objects WHERE type = 'U';
+CREATE VIEW IF NOT EXISTS procedures AS
+    SELECT object_id, name, schema_id, type, type_desc, create_date, modify_date
+    FROM objects WHERE type = 'P';
+CREATE VIEW IF NOT EXISTS views AS
+    SELECT object_id, name, schema_id, type, type_desc, create_date, modify_date
+    FROM objects WHERE type = 'V';
+CREATE VIEW IF NOT EXISTS triggers AS
+    SELECT object_id, name, parent_object_id AS parent_id, type, type_desc, create_date, modify_date
+    FROM objects WHERE type = 'TR';
+"""
+
+TIPOS_SQL = ["int", "bigint", "varchar", "nvarchar", "decimal", "datetime", "date", "bit"]
+
+# CONVERT(VARCHAR(n), HASHBYTES(...), 2): en el stand-in HASHBYTES ya devuelve el hex
+PATRON_CONVERT_HASH = re.compile(r"CONVERT\(\s*VARCHAR\(\d+\)\s*,\s*(HASHBYTES\([^()]*\))\s*,\s*2\s*\)",
+                                 re.IGNORECASE)
+
+def traducir_tsql(query):
+    """Adapta las pocas construcciones T-SQL de la ingesta que SQLite no entiende"""
+    return PATRON_CONVERT_HASH.sub(r"\1", query)
+
+def _hashbytes(algoritmo, valor):
+    # SQL Server hashea el NVARCHAR como UTF-16LE
+    if valor is None:
+        return None
+    nombre = str(algoritmo).lower().replace("sha2_", "sha")
+    return hashlib.new(nombre, valor.encode("utf-16-le")).hexdigest().upper()
+
+def _datalength(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        return len(valor.encode("utf-16-le"))
+    return len(str(valor).encode("utf-8"))
+
+class _CursorSQLite:
+    """Cursor que traduce el T-SQL antes de ejecutarlo; el resto pasa directo"""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, parametros=()):
+        self._cursor.execute(traducir_tsql(query), parametros)
+        return self
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+class ConexionSQLite:
+    """Conexión DB-API sobre el catálogo SQLite, compartible entre hilos del pool"""
+    def __init__(self, ruta):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute("ATTACH DATABASE ? AS sys", (ruta,))
+        # Nombres y esquemas por object_id (el catálogo no cambia durante una corrida)
+        esquemas = dict(self._conn.execute("SELECT schema_id, name FROM sys.schemas"))
+        self._objetos = {i: (n, esquemas.get(s, "dbo"))
+                         for i, n, s in self._conn.execute("SELECT object_id, name, schema_id FROM sys.objects")}
+        self._conn.create_function("OBJECT_NAME", 1, lambda i: self._objetos.get(i, (None, None))[0],
+                                   deterministic=True)
+        self._conn.create_function("OBJECT_SCHEMA_NAME", 1, lambda i: self._objetos.get(i, (None, None))[1],
+                                   deterministic=True)
+        self._conn.create_function("SCHEMA_NAME", 1, lambda i: esquemas.get(i), deterministic=True)
+        self._conn.create_function("HASHBYTES", 2, _hashbytes, deterministic=True)
+        self._conn.create_function("DATALENGTH", 1, _datalength, deterministic=True)
+        # Un archivo = una base: las DMV del stand-in usan database_id 1
+        self._conn.create_function("DB_ID", 0, lambda: 1, deterministic=True)
+
+    def cursor(self):
+        return _CursorSQLite(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+class FuenteSQLite:
+    """Catálogo local SQLite con la forma de sys.* (pruebas, perfiles y benchmarks sin VPN)"""
+    tipo = "sqlite"
+
+    def __init__(self, ruta, base=None):
+        self.ruta = ruta
+        self.base = base
+
+    def ruta_base(self, base=None):
+        """Con una carpeta, cada base es <carpeta>/<base>.db; con un archivo, siempre ese"""
+        if os.path.isdir(self.ruta):
+            return os.path.join(self.ruta, f"{base or self.base}.db")
+        return self.ruta
+
+    def conectar(self, servidor=None, base=None):
+        ruta = self.ruta_base(base)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(2, "No existe el catálogo SQLite", ruta)
+        return ConexionSQLite(ruta)
+
+    def descripcion(self):
+        return f"catálogo SQLite ({self.ruta})"
+
+def crear_fuente(especificacion, servidor=None, base=None, usuario=None, password=None):
+    """Construye la fuente a partir de 'sqlserver' o 'sqlite:<ruta>'"""
+    especificacion = (especificacion or FUENTE_DEFECTO).strip()
+    tipo, _, ruta = especificacion.partition(":")
+    if tipo.lower() == "sqlite":
+        if not ruta:
+            raise ValueError("La fuente SQLite necesita una ruta: sqlite:<archivo.db | carpeta>")
+        return FuenteSQLite(ruta, base)
+    if tipo.lower() == "sqlserver":
+        return FuenteSQLServer(servidor, base, usuario, password)
+    raise ValueError(f"Fuente desconocida: '{especificacion}' (usa 'sqlserver' o 'sqlite:<ruta>')")
+
+def crear_catalogo_sqlite(ruta):
+    """Crea (o abre) un archivo de catálogo vacío con el esquema de sys.* y lo retorna conectado"""
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conn = sqlite3.connect(ruta)
+    conn.executescript(DDL_CATALOGO_SQLITE)
+    conn.execute("INSERT OR IGNORE INTO schemas VALUES (1, 'dbo')")
+    conn.executemany("INSERT OR IGNORE INTO types VALUES (?, ?)",
+                     [(i, nombre) for i, nombre in enumerate(TIPOS_SQL, 1)])
+    conn.commit()
+    return conn